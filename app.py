@@ -1,9 +1,17 @@
 """Streamlit UI for the RAG Invoice Chat Agent."""
 
+import uuid
+from collections.abc import Iterator
+
+import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
 
-from src.agent.chat_agent import ChatAgent
+from src.agent.chat_agent import ChatAgent, ChatResponse, StreamEvent, StreamStage
+from src.config.settings import get_settings
+from src.telemetry import configure_logging, format_timings
+from src.tools.code_executor import enable_copy_on_write
+from src.ui import ChatHistory, CompactResult, HistoryMessage
 
 # Load environment variables
 load_dotenv()
@@ -56,13 +64,49 @@ The agent will generate code to query the data and provide grounded answers.
 )
 
 
-# Initialize the agent (cached to avoid reloading data)
+# Initialize the agent (cached to avoid reloading data; changed workbooks are
+# picked up by the agent's background refresh)
 @st.cache_resource
 def get_agent() -> ChatAgent:
     """Initialize and cache the chat agent."""
+    settings = get_settings()
+    configure_logging(settings.log_level, settings.log_format)
+    enable_copy_on_write()
     return ChatAgent(data_dir="data")
 
 
+# Decoded results kept across reruns, so that the collapsed expanders of the
+# shown history do not decode their Parquet again on every rerun
+@st.cache_resource(max_entries=64)
+def decoded_result(
+    message_id: str,  # noqa: ARG001 - the cache key
+    _result: CompactResult,
+) -> pd.DataFrame | None:
+    """Decode a stored result once per message (see CompactResult.frame)."""
+    return _result.frame()
+
+
+def render_details(message: HistoryMessage) -> None:
+    """Show an answer's generated code and result below it."""
+    with st.expander("🔍 View Generated Code"):
+        st.code(message.code or "", language=message.language)
+
+    with st.expander("📊 View Raw Results"):
+        if not message.success:
+            st.error(message.error)
+        elif message.result is None:
+            st.caption("Result dropped to keep the chat history small.")
+        elif (frame := decoded_result(message.message_id, message.result)) is not None:
+            st.dataframe(frame)
+        else:
+            st.text(message.result.text)
+        if message.time_to_first_token is not None:
+            st.caption(f"First token after {message.time_to_first_token:.2f}s")
+        if message.timings:
+            st.caption(f"Timing: {format_timings(message.timings)}")
+            st.caption(f"Trace ID: {message.trace_id}")
+
+
 # Sidebar with example questions
 with st.sidebar:
     st.header("📝 Example Questions")
@@ -97,33 +141,36 @@ with st.sidebar:
     All numbers come from actual data - no hallucinations!
     """
     )
+    st.caption(f"Data version {get_agent().data_context.version}")
+
+# Initialize chat history; results are kept compact within a byte budget
+settings = get_settings()
+if "history" not in st.session_state:
+    st.session_state.history = ChatHistory(settings.ui_history_max_mb * 1024**2)
+    st.session_state.history_shown = settings.ui_history_page_size
+# Lets follow-up questions read earlier answers' results
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+history: ChatHistory = st.session_state.history
+
+# Display the latest messages; older ones are drawn on request
+hidden, shown = history.page(st.session_state.history_shown)
+# A fixed key keeps the button the same widget as the hidden count changes
+if hidden and st.button(f"Show earlier messages ({hidden} hidden)", key="earlier"):
+    st.session_state.history_shown += settings.ui_history_page_size
+    st.rerun()
+for message in shown:
+    with st.chat_message(message.role):
+        st.markdown(message.content)
 
-# Initialize chat history
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-
-# Display chat history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-        # Show code and results for assistant messages
-        if message["role"] == "assistant" and "metadata" in message:
-            metadata = message["metadata"]
-
-            with st.expander("🔍 View Generated Code"):
-                st.code(metadata["code"], language="python")
-
-            with st.expander("📊 View Raw Results"):
-                if metadata["success"]:
-                    st.text(metadata["result_str"])
-                else:
-                    st.error(metadata["error"])
+        # Show code and results for answers
+        if message.code is not None:
+            render_details(message)
 
 # Chat input
 if prompt := st.chat_input("Ask a question about the invoice data..."):
     # Add user message to history
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    history.add("user", prompt)
 
     # Display user message
     with st.chat_message("user"):
@@ -131,50 +178,51 @@ if prompt := st.chat_input("Ask a question about the invoice data..."):
 
     # Get agent response
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            try:
-                agent = get_agent()
-                response = agent.ask(prompt)
-
-                # Display the answer
-                st.markdown(response.answer)
-
-                # Store metadata for history
-                metadata = {
-                    "code": response.generated_code,
-                    "success": response.execution_result.success,
-                    "result_str": response.execution_result.to_string(),
-                    "error": response.execution_result.error,
-                }
-
-                # Show expandable details
-                with st.expander("🔍 View Generated Code"):
-                    st.code(response.generated_code, language="python")
-
-                with st.expander("📊 View Raw Results"):
-                    if response.execution_result.success:
-                        st.text(response.execution_result.to_string())
-                    else:
-                        st.error(response.execution_result.error)
-
-                # Add to history
-                st.session_state.messages.append(
-                    {
-                        "role": "assistant",
-                        "content": response.answer,
-                        "metadata": metadata,
-                    }
-                )
+        try:
+            agent = get_agent()
+            final: list[ChatResponse] = []
 
-            except Exception as e:
-                error_msg = f"Error: {e!s}"
-                st.error(error_msg)
-                st.session_state.messages.append(
-                    {"role": "assistant", "content": error_msg}
+            with st.status("Generating code...") as status:
+                events = agent.ask_stream(
+                    prompt, session_id=st.session_state.session_id
                 )
+                # Run until the answer starts streaming, updating the status
+                first_delta: StreamEvent | None = None
+                for event in events:
+                    if event.stage == StreamStage.CODE_GENERATED:
+                        status.update(label="Executing code...")
+                    elif event.stage == StreamStage.EXECUTION_DONE:
+                        status.update(label="Writing answer...")
+                    else:
+                        first_delta = event
+                        break
+                status.update(label="Done", state="complete")
+
+            def answer_tokens() -> Iterator[str]:
+                """Yield answer deltas and keep the final response."""
+                pending = [first_delta] if first_delta is not None else []
+                for event in [*pending, *events]:
+                    if event.stage == StreamStage.ANSWER_DELTA:
+                        yield event.data
+                    elif event.stage == StreamStage.DONE:
+                        final.append(event.data)
+
+            # Display the answer as it streams in
+            st.write_stream(answer_tokens())
+            response = final[0]
+
+            # Add to history and show expandable details from the stored form
+            render_details(history.add_answer(response, agent.executor.language))
+
+        except Exception as e:
+            error_msg = f"Error: {e!s}"
+            st.error(error_msg)
+            history.add("assistant", error_msg)
 
 # Clear chat button
 if st.button("🗑️ Clear Chat"):
-    st.session_state.messages = []
+    del st.session_state.history
+    get_agent().sessions.drop(st.session_state.session_id)
+    st.session_state.session_id = uuid.uuid4().hex
     st.rerun()
 
@@ -1,6 +1,21 @@
 """Agent package for chat orchestration."""
 
-from src.agent.chat_agent import ChatAgent, ChatResponse
+from src.agent.chat_agent import (
+    Attempt,
+    ChatAgent,
+    ChatResponse,
+    StreamEvent,
+    StreamStage,
+)
+from src.agent.session import SessionResults, SessionStore
 
-__all__ = ["ChatAgent", "ChatResponse"]
+__all__ = [
+    "Attempt",
+    "ChatAgent",
+    "ChatResponse",
+    "SessionResults",
+    "SessionStore",
+    "StreamEvent",
+    "StreamStage",
+]
 
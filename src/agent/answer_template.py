@@ -0,0 +1,146 @@
+"""Fill LLM-provided answer templates from execution results.
+
+The code generation call can return an answer template alongside the code.
+Filling it locally from the execution result saves the second (formatting)
+LLM round trip for simple lookups. When the template cannot be filled safely
+the caller falls back to the formatting call.
+"""
+
+import math
+import re
+from numbers import Number
+from typing import Any
+
+import pandas as pd
+
+from src.tools.code_executor import ExecutionResult
+
+# Results larger than this are left to the formatting LLM call
+ANSWER_TEMPLATE_MAX_ROWS = 25
+ANSWER_TEMPLATE_MAX_COLUMNS = 6
+
+# {name} or {name:format_spec}; attribute/index access is deliberately not
+# supported so templates cannot reach into objects
+_PLACEHOLDER = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)(?::([^{}]*))?\}")
+
+
+def fill_answer_template(
+    template: str | None, execution_result: ExecutionResult
+) -> str | None:
+    """Fill an answer template from an execution result.
+
+    Args:
+        template: Template with ``{name}`` / ``{name:spec}`` placeholders.
+        execution_result: Successful execution result providing the values.
+
+    Returns:
+        The filled answer, or None if there is no template, a placeholder is
+        unknown or cannot be formatted, or the result is too complex.
+    """
+    if not template or not execution_result.success:
+        return None
+
+    values = _template_values(execution_result.result)
+    if values is None:
+        return None
+
+    filled: list[str] = []
+    position = 0
+    for match in _PLACEHOLDER.finditer(template):
+        name, spec = match.group(1), match.group(2)
+        if name not in values:
+            return None
+        try:
+            rendered = _format_value(values[name], spec)
+        except (TypeError, ValueError):
+            return None
+        filled.extend((template[position : match.start()], rendered))
+        position = match.end()
+    filled.append(template[position:])
+
+    # Braces left in the literal text mean unsupported placeholder syntax
+    literals = _PLACEHOLDER.sub("", template)
+    if "{" in literals or "}" in literals:
+        return None
+    return "".join(filled)
+
+
+def _template_values(result: Any) -> dict[str, Any] | None:  # noqa: ANN401
+    """Map placeholder names to values, or None if the result is too complex."""
+    if isinstance(result, pd.Series | pd.DataFrame):
+        table = _as_table(result)
+        if (
+            table is None
+            or len(table) > ANSWER_TEMPLATE_MAX_ROWS
+            or len(table.columns) > ANSWER_TEMPLATE_MAX_COLUMNS
+        ):
+            return None
+        return {"table": _render_table(table), "row_count": len(table)}
+
+    if isinstance(result, dict):
+        if not all(_is_scalar(v) for v in result.values()):
+            return None
+        return {str(k): _unwrap(v) for k, v in result.items()}
+
+    if _is_scalar(result):
+        return {"value": _unwrap(result)}
+
+    return None
+
+
+def _as_table(result: pd.Series | pd.DataFrame) -> pd.DataFrame | None:
+    """Turn a result into a table with its index labels as columns.
+
+    Returns:
+        The table, or None if an index level is named like a column.
+    """
+    frame = result.to_frame() if isinstance(result, pd.Series) else result
+    # Group labels live in the index, e.g. after groupby(...).sum()
+    if not isinstance(frame.index, pd.RangeIndex):
+        try:
+            frame = frame.reset_index()
+        except ValueError:
+            return None
+    return frame.set_axis([str(c) for c in frame.columns], axis=1)
+
+
+def _is_scalar(value: Any) -> bool:  # noqa: ANN401
+    """Whether a value can be placed directly into an answer."""
+    return value is None or isinstance(value, str | Number | pd.Timestamp)
+
+
+def _unwrap(value: Any) -> Any:  # noqa: ANN401
+    """Convert numpy scalars to Python scalars so format specs behave."""
+    return value.item() if hasattr(value, "item") else value
+
+
+def _format_value(value: Any, spec: str | None) -> str:  # noqa: ANN401
+    """Format a single placeholder value."""
+    if spec:
+        return format(value, spec)
+    if isinstance(value, float):
+        return "N/A" if math.isnan(value) else f"{value:,.2f}"
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+
+def _render_table(frame: pd.DataFrame) -> str:
+    """Render a small DataFrame as a markdown list or table."""
+    if frame.empty:
+        return "No results found."
+
+    rows = [
+        [_format_value(_unwrap(v), None) for v in row]
+        for row in frame.itertuples(index=False)
+    ]
+    if len(frame.columns) == 1:
+        return "\n".join(f"- {row[0]}" for row in rows)
+
+    header = [str(c) for c in frame.columns]
+    lines = [
+        "| " + " | ".join(header) + " |",
+        "| " + " | ".join("---" for _ in header) + " |",
+    ]
+    lines.extend("| " + " | ".join(row) + " |" for row in rows)
+    return "\n".join(lines)
@@ -1,12 +1,42 @@
 """Chat agent that orchestrates the RAG pipeline."""
 
-from dataclasses import dataclass
+import asyncio
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass, field
+from enum import StrEnum
 from pathlib import Path
+from typing import Any
 
+import pandas as pd
+
+from src.agent.answer_template import fill_answer_template
+from src.agent.session import SessionResults, SessionStore
 from src.config.settings import get_settings
-from src.dataloaders.excel_loader import load_data
-from src.llm.client import OpenAIClient
-from src.tools.code_executor import CodeExecutor, ExecutionResult
+from src.dataloaders.excel_loader import DataContext, load_data
+from src.dataloaders.refresh import DataRefresher
+from src.llm.client import LLMResponse, OpenAIClient
+from src.llm.prompt_builder import PromptBuilder
+from src.llm.transport import Transport
+from src.telemetry.tracing import Trace, iter_in_trace, span, start_trace
+from src.tools.code_executor import (
+    ACCEPT_POLICIES,
+    CandidateRun,
+    CodeExecutor,
+    ExecutionResult,
+)
+from src.tools.engine import ExecutionEngine
+from src.tools.sandbox import SandboxLimits, SandboxPool
+
+
+@dataclass
+class Attempt:
+    """One generated piece of code and the outcome of executing it."""
+
+    code: str
+    # Execution error; None if the code ran successfully
+    error: str | None = None
 
 
 @dataclass
@@ -17,6 +47,43 @@ class ChatResponse:
     generated_code: str
     execution_result: ExecutionResult
     question: str
+    # Seconds from receiving the question to the first answer token; only
+    # measured for streamed answers (ask_stream)
+    time_to_first_token: float | None = None
+    # Whether the answer was filled from the code generation call's template
+    # instead of a separate formatting call
+    answered_from_template: bool = False
+    # Every code attempt in order; the last one produced execution_result
+    attempts: list[Attempt] = field(default_factory=list)
+    # ID of the request's trace, as found in the logs
+    trace_id: str | None = None
+    # Seconds spent per pipeline step (prompt, llm.generate, compile, exec,
+    # encode, llm.format, ...) and in total
+    timings: dict[str, float] = field(default_factory=dict)
+    # Tokens billed for the request's LLM calls
+    usage: dict[str, int] = field(default_factory=dict)
+
+
+class StreamStage(StrEnum):
+    """Stages reported by :meth:`ChatAgent.ask_stream`."""
+
+    CODE_GENERATED = "code_generated"
+    EXECUTION_DONE = "execution_done"
+    ANSWER_DELTA = "answer_delta"
+    DONE = "done"
+
+
+@dataclass
+class StreamEvent:
+    """Progress event emitted while answering a question.
+
+    ``data`` is the generated code for CODE_GENERATED, the ExecutionResult for
+    EXECUTION_DONE, a text delta for ANSWER_DELTA and the final ChatResponse
+    for DONE.
+    """
+
+    stage: StreamStage
+    data: Any
 
 
 class ChatAgent:
@@ -27,78 +94,569 @@ class ChatAgent:
         data_dir: str | Path | None = None,
         openai_api_key: str | None = None,
         model: str | None = None,
+        *,
+        transport: Transport | None = None,
     ) -> None:
         settings = get_settings()
 
         # Load data
-        self.data_context = load_data(data_dir or settings.data_dir)
+        data_path = Path(data_dir or settings.data_dir)
+        self.data_context = load_data(data_path)
+
+        dataframes = self.data_context.get_dataframes_dict()
+
+        # Initialize code executor with loaded dataframes; generated pandas
+        # code runs in a pool of worker processes unless the sandbox is
+        # disabled, generated SQL runs on DuckDB
+        engine: ExecutionEngine | None = None
+        sandbox = None
+        if settings.execution_engine == "duckdb":
+            # Imported lazily: duckdb is an optional dependency
+            from src.tools.duckdb_engine import DuckDBEngine  # noqa: PLC0415
+
+            engine = DuckDBEngine(
+                dataframes,
+                parquet_files=(
+                    self.data_context.snapshot_files
+                    if settings.duckdb_use_parquet
+                    else None
+                ),
+                threads=settings.duckdb_threads,
+                memory_limit=settings.duckdb_memory_limit,
+                timeout_seconds=settings.duckdb_timeout_seconds,
+                max_result_bytes=settings.duckdb_max_result_mb * 1024**2,
+            )
+        elif settings.execution_engine != "pandas":
+            msg = f"Unknown execution engine: {settings.execution_engine!r}"
+            raise ValueError(msg)
+        elif settings.sandbox_enabled:
+            sandbox = SandboxPool(
+                dataframes,
+                workers=settings.sandbox_workers,
+                limits=SandboxLimits(
+                    timeout_seconds=settings.sandbox_timeout_seconds,
+                    cpu_seconds=settings.sandbox_cpu_seconds,
+                    max_rss_bytes=settings.sandbox_max_rss_mb * 1024**2,
+                    max_result_bytes=settings.sandbox_max_result_mb * 1024**2,
+                ),
+            )
+        self.executor = CodeExecutor(
+            dataframes,
+            sandbox=sandbox,
+            max_cost=settings.max_code_cost,
+            indexes=self.data_context.indexes,
+            engine=engine,
+        )
+
+        # Initialize LLM client for the executor's language; the prompt
+        # builder matches questions against the loaded data to prune the
+        # schema
+        prompt_builder = None
+        if settings.schema_pruning_enabled:
+            prompt_builder = PromptBuilder(dataframes)
+        self.llm_client = OpenAIClient(
+            api_key=openai_api_key,
+            model=model or settings.model,
+            prompt_builder=prompt_builder,
+            language=self.executor.language,
+            transport=transport,
+        )
+        self._index_entities(dataframes)
+
+        # Earlier results of each chat session, for follow-up questions
+        self.sessions = SessionStore(
+            settings.session_max_count, settings.session_max_mb * 1024**2
+        )
+
+        # Speculative generation: programs sampled per generation call and
+        # how one of them is accepted
+        if settings.speculative_accept not in ACCEPT_POLICIES:
+            msg = f"Unknown speculative accept policy: {settings.speculative_accept!r}"
+            raise ValueError(msg)
+        self.speculative_candidates = max(settings.speculative_candidates, 1)
+        self.speculative_accept = settings.speculative_accept
+
+        self.max_concurrency = settings.ask_max_concurrency
+        self.result_token_budget = settings.result_token_budget
+
+        # Reload changed workbooks and publish the refreshed data
+        self._schema_pruning = settings.schema_pruning_enabled
+        self._publish_lock = threading.Lock()
+        self.refresher = DataRefresher(
+            data_path, self.data_context, on_refresh=self._publish
+        )
+        if settings.data_refresh_interval_seconds > 0:
+            self.refresher.start(settings.data_refresh_interval_seconds)
+
+    def close(self) -> None:
+        """Stop the data refresh and release the execution engine."""
+        self.refresher.stop()
+        self.executor.close()
+
+    def refresh_data(self) -> bool:
+        """Reload any changed source workbooks now.
+
+        Returns:
+            True if new data was published.
+        """
+        return self.refresher.refresh() is not None
+
+    def _publish(self, context: DataContext) -> None:
+        """Switch the executor and prompt builder to a refreshed context.
+
+        Questions already being answered finish on the previous data; each
+        component switches with a single reference swap.
+        """
+        with self._publish_lock:
+            dataframes = context.get_dataframes_dict()
+            prompt_builder = (
+                PromptBuilder(dataframes) if self._schema_pruning else None
+            )
+            self.executor.update_dataframes(dataframes, context.indexes)
+            self.llm_client.prompt_builder = prompt_builder
+            self._index_entities(dataframes)
+            self.data_context = context
 
-        # Initialize LLM client
-        self.llm_client = OpenAIClient(api_key=openai_api_key, model=model or settings.model)
+    def _index_entities(self, dataframes: dict[str, pd.DataFrame]) -> None:
+        """Recognize the loaded values (clients, countries, ...) as entities.
 
-        # Initialize code executor with loaded dataframes
-        self.executor = CodeExecutor(self.data_context.get_dataframes_dict())
+        Questions differing from answered ones only in such values reuse the
+        answered code.
+        """
+        if self.llm_client.example_index is not None:
+            self.llm_client.example_index.set_dataframes(dataframes)
 
-    def ask(self, question: str) -> ChatResponse:
+    def ask(self, question: str, *, session_id: str | None = None) -> ChatResponse:
         """Answer a question about the invoice data.
 
         Args:
             question: Natural language question.
+            session_id: Chat session the question belongs to. Its earlier
+                results are available to the generated code, and this
+                answer's result is stored for the session's next questions.
 
         Returns:
             ChatResponse with answer and metadata.
         """
-        # Step 1: Generate pandas code
-        code_response = self.llm_client.generate_query_code(question)
-        generated_code = code_response.content
+        return self._answer(question, max_repairs=0, session_id=session_id)
+
+    def ask_stream(
+        self, question: str, *, session_id: str | None = None
+    ) -> Iterator[StreamEvent]:
+        """Answer a question, streaming progress and answer tokens.
 
-        # Step 2: Execute the code
-        execution_result = self.executor.execute(generated_code)
+        Args:
+            question: Natural language question.
+            session_id: Chat session the question belongs to (see
+                :meth:`ask`).
+
+        Yields:
+            StreamEvent for each stage: the generated code, the execution
+            result, every answer delta, and finally the complete ChatResponse.
+        """
+        session = self._session(session_id)
+        with start_trace(activate=False) as trace:
+            events = self._stream_answer(question, session)
+            for event in iter_in_trace(trace, events):
+                if event.stage is StreamStage.DONE:
+                    self._record_turn(session, event.data)
+                    self._finish_trace(trace, event.data)
+                yield event
 
-        # Step 3: Format the response
+    def _stream_answer(
+        self, question: str, session: SessionResults | None
+    ) -> Iterator[StreamEvent]:
+        """Produce the events of :meth:`ask_stream`."""
+        start = time.perf_counter()
+        earlier_results = session.summaries() if session is not None else []
+
+        if self.speculative_candidates > 1:
+            # The accepted candidate is only known once they have run
+            code_response, execution_result, attempts = self._generate_and_run(
+                question, earlier_results, session
+            )
+            generated_code = code_response.content
+            yield StreamEvent(StreamStage.CODE_GENERATED, generated_code)
+        else:
+            code_response = self.llm_client.generate_query_code(
+                question, earlier_results=earlier_results
+            )
+            generated_code = code_response.content
+            yield StreamEvent(StreamStage.CODE_GENERATED, generated_code)
+
+            execution_result = self._execute(generated_code, session)
+            attempts = [Attempt(generated_code, execution_result.error)]
+            if code_response.reused and not execution_result.success:
+                # The reused code did not fit after all; generate fresh code
+                code_response = self.llm_client.generate_query_code(
+                    question, reuse=False, earlier_results=earlier_results
+                )
+                generated_code = code_response.content
+                yield StreamEvent(StreamStage.CODE_GENERATED, generated_code)
+                execution_result = self._execute(generated_code, session)
+                attempts.append(Attempt(generated_code, execution_result.error))
         if execution_result.success:
-            result_str = execution_result.to_string()
-            format_response = self.llm_client.format_response(question, result_str)
-            answer = format_response.content
+            self._remember_code(question, code_response, session)
+        yield StreamEvent(StreamStage.EXECUTION_DONE, execution_result)
+
+        time_to_first_token: float | None = None
+        answer = fill_answer_template(code_response.answer_template, execution_result)
+        answered_from_template = answer is not None
+        if answer is not None:
+            time_to_first_token = time.perf_counter() - start
+            yield StreamEvent(StreamStage.ANSWER_DELTA, answer)
+        elif execution_result.success:
+            stream = self.llm_client.format_response_stream(
+                question, self._encode_result(execution_result)
+            )
+            parts: list[str] = []
+            for delta in stream:
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter() - start
+                parts.append(delta)
+                yield StreamEvent(StreamStage.ANSWER_DELTA, delta)
+            answer = "".join(parts)
         else:
-            # If execution failed, try to provide a helpful error message
-            answer = (
-                f"I encountered an error while processing your question: "
-                f"{execution_result.error}\n\n"
-                f"Please try rephrasing your question."
+            answer = self._error_answer(execution_result)
+            time_to_first_token = time.perf_counter() - start
+            yield StreamEvent(StreamStage.ANSWER_DELTA, answer)
+
+        yield StreamEvent(
+            StreamStage.DONE,
+            ChatResponse(
+                answer=answer,
+                generated_code=generated_code,
+                execution_result=execution_result,
+                question=question,
+                time_to_first_token=time_to_first_token,
+                answered_from_template=answered_from_template,
+                attempts=attempts,
+            ),
+        )
+
+    async def ask_async(
+        self, question: str, *, session_id: str | None = None
+    ) -> ChatResponse:
+        """Answer a question without blocking the event loop.
+
+        The LLM calls go through ``AsyncOpenAI`` and the pandas execution runs
+        in the default thread pool executor.
+
+        Args:
+            question: Natural language question.
+            session_id: Chat session the question belongs to (see
+                :meth:`ask`).
+
+        Returns:
+            ChatResponse with answer and metadata.
+        """
+        session = self._session(session_id)
+        with start_trace() as trace:
+            response = await self._answer_async(question, session)
+            self._record_turn(session, response)
+            return self._finish_trace(trace, response)
+
+    async def _answer_async(
+        self, question: str, session: SessionResults | None
+    ) -> ChatResponse:
+        """Answer a question for :meth:`ask_async`."""
+        earlier_results = session.summaries() if session is not None else []
+        code_response, execution_result, attempts = await self._generate_and_run_async(
+            question, earlier_results, session
+        )
+        generated_code = code_response.content
+        if execution_result.success:
+            self._remember_code(question, code_response, session)
+
+        answer = fill_answer_template(code_response.answer_template, execution_result)
+        answered_from_template = answer is not None
+        if answer is None and execution_result.success:
+            format_response = await self.llm_client.format_response_async(
+                question, self._encode_result(execution_result)
             )
+            answer = format_response.content
+        elif answer is None:
+            answer = self._error_answer(execution_result)
 
         return ChatResponse(
             answer=answer,
             generated_code=generated_code,
             execution_result=execution_result,
             question=question,
+            answered_from_template=answered_from_template,
+            attempts=attempts,
         )
 
-    def ask_with_retry(self, question: str, max_retries: int = 2) -> ChatResponse:
-        """Ask a question with retry on failure.
+    async def ask_many(
+        self,
+        questions: Sequence[str],
+        max_concurrency: int | None = None,
+    ) -> list[ChatResponse | Exception]:
+        """Answer several questions concurrently.
+
+        Args:
+            questions: Natural language questions.
+            max_concurrency: Maximum number of questions in flight at once.
+                If None, uses the ``ask_max_concurrency`` setting.
+
+        Returns:
+            One entry per question, in input order: the ChatResponse, or the
+            exception raised while answering that question.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def bounded(question: str) -> ChatResponse:
+            async with semaphore:
+                return await self.ask_async(question)
+
+        results = await asyncio.gather(
+            *(bounded(question) for question in questions), return_exceptions=True
+        )
+        responses: list[ChatResponse | Exception] = []
+        for result in results:
+            # Cancellation and interrupts must not be swallowed as answers
+            if isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result
+            responses.append(result)
+        return responses
+
+    def _encode_result(self, execution_result: ExecutionResult) -> str:
+        """Render a successful result for the formatting prompt."""
+        with span("encode") as attributes:
+            result_str = execution_result.to_string(self.result_token_budget)
+            attributes["result_chars"] = len(result_str)
+        return result_str
+
+    @staticmethod
+    def _finish_trace(trace: Trace, response: ChatResponse) -> ChatResponse:
+        """Finish the request's trace and attach its timings and usage."""
+        trace.finish(
+            "answered" if response.execution_result.success else "failed",
+            attempts=len(response.attempts),
+            answered_from_template=response.answered_from_template,
+        )
+        response.trace_id = trace.trace_id
+        response.timings = trace.timings()
+        response.usage = trace.usage()
+        return response
+
+    def _error_answer(self, execution_result: ExecutionResult) -> str:
+        """Build the user-facing answer for a failed execution."""
+        return (
+            f"I encountered an error while processing your question: "
+            f"{execution_result.error}\n\n"
+            f"Please try rephrasing your question."
+        )
+
+    def ask_with_retry(
+        self,
+        question: str,
+        max_retries: int = 2,
+        *,
+        session_id: str | None = None,
+    ) -> ChatResponse:
+        """Ask a question, repairing generated code that fails to execute.
+
+        A failure is sent back to the model as a short follow-up turn with
+        the failing code and its error, rather than asking the same question
+        again. The answer is formatted once, from the final result.
 
         Args:
             question: Natural language question.
-            max_retries: Maximum number of retries on execution failure.
+            max_retries: Maximum number of repair attempts on execution
+                failure.
+            session_id: Chat session the question belongs to (see
+                :meth:`ask`).
 
         Returns:
-            ChatResponse with answer and metadata.
+            ChatResponse with answer and metadata; ``attempts`` lists the
+            code of every attempt and its error.
+        """
+        return self._answer(question, max_repairs=max_retries, session_id=session_id)
+
+    def _answer(
+        self, question: str, max_repairs: int, session_id: str | None
+    ) -> ChatResponse:
+        """Answer a question under a new trace."""
+        session = self._session(session_id)
+        with start_trace() as trace:
+            response = self._answer_untraced(question, max_repairs, session)
+            self._record_turn(session, response)
+            return self._finish_trace(trace, response)
+
+    def _answer_untraced(
+        self, question: str, max_repairs: int, session: SessionResults | None
+    ) -> ChatResponse:
+        """Generate and execute code, repair it if needed, and format the answer."""
+        # Step 1: Generate code (pandas or SQL) and execute it, repairing it
+        # on failure
+        code_response, execution_result, attempts = self._generate_and_execute(
+            question, max_repairs, session
+        )
+
+        # Step 2: Format the response, from the answer template if possible
+        answer = fill_answer_template(code_response.answer_template, execution_result)
+        answered_from_template = answer is not None
+        if answer is None and execution_result.success:
+            format_response = self.llm_client.format_response(
+                question, self._encode_result(execution_result)
+            )
+            answer = format_response.content
+        elif answer is None:
+            answer = self._error_answer(execution_result)
+
+        return ChatResponse(
+            answer=answer,
+            generated_code=code_response.content,
+            execution_result=execution_result,
+            question=question,
+            answered_from_template=answered_from_template,
+            attempts=attempts,
+        )
+
+    def _generate_and_execute(
+        self, question: str, max_repairs: int, session: SessionResults | None
+    ) -> tuple[LLMResponse, ExecutionResult, list[Attempt]]:
+        """Generate and execute code, repairing it up to ``max_repairs`` times.
+
+        Returns:
+            The code response and execution result of the last attempt, and
+            every attempt made.
         """
-        last_response = None
+        earlier_results = session.summaries() if session is not None else []
+        code_response, execution_result, attempts = self._generate_and_run(
+            question, earlier_results, session
+        )
 
-        for _ in range(max_retries + 1):
-            response = self.ask(question)
+        # Speculative candidates and a failed reuse are not repairs
+        repairs = 0
+        while not execution_result.success and repairs < max_repairs:
+            repairs += 1
+            failures = [(attempt.code, attempt.error or "") for attempt in attempts]
+            repair = self.llm_client.repair_query_code(
+                question, failures, earlier_results
+            )
+            # Running code that already failed would only fail again
+            if any(attempt.code == repair.content for attempt in attempts):
+                break
+            code_response = repair
+            execution_result = self._execute(code_response.content, session)
+            attempts.append(Attempt(code_response.content, execution_result.error))
 
-            if response.execution_result.success:
-                return response
+        if execution_result.success:
+            self._remember_code(question, code_response, session)
+        return code_response, execution_result, attempts
 
-            last_response = response
+    def _generate_and_run(
+        self,
+        question: str,
+        earlier_results: Sequence[tuple[str, str, str]],
+        session: SessionResults | None,
+    ) -> tuple[LLMResponse, ExecutionResult, list[Attempt]]:
+        """Generate code and execute it.
 
-            # If this isn't the last attempt, we could potentially add
-            # error context to help the LLM generate better code
-            # For now, we just retry with the same question
+        With speculative generation, several candidates come from one call
+        and run in parallel (see :meth:`CodeExecutor.execute_candidates`).
+        Code reused from the example index runs alone; if it fails, fresh code
+        is generated.
 
-        # Return the last response (which has an error)
-        return last_response if last_response else response
+        Returns:
+            The accepted code response and its execution result, and an
+            attempt per candidate that ran, the accepted one last.
+        """
+        candidates = self.llm_client.generate_query_candidates(
+            question, self.speculative_candidates, earlier_results=earlier_results
+        )
+        run = self._execute_candidates(candidates, session)
+        attempts = self._candidate_attempts(candidates, run)
+        if candidates[run.chosen].reused and not run.result.success:
+            # The reused code did not fit after all; generate fresh code
+            candidates = self.llm_client.generate_query_candidates(
+                question,
+                self.speculative_candidates,
+                reuse=False,
+                earlier_results=earlier_results,
+            )
+            run = self._execute_candidates(candidates, session)
+            attempts += self._candidate_attempts(candidates, run)
+        return candidates[run.chosen], run.result, attempts
+
+    async def _generate_and_run_async(
+        self,
+        question: str,
+        earlier_results: Sequence[tuple[str, str, str]],
+        session: SessionResults | None,
+    ) -> tuple[LLMResponse, ExecutionResult, list[Attempt]]:
+        """Async variant of :meth:`_generate_and_run`."""
+        candidates = await self.llm_client.generate_query_candidates_async(
+            question, self.speculative_candidates, earlier_results=earlier_results
+        )
+        # to_thread carries the trace context into the worker thread
+        run = await asyncio.to_thread(self._execute_candidates, candidates, session)
+        attempts = self._candidate_attempts(candidates, run)
+        if candidates[run.chosen].reused and not run.result.success:
+            # The reused code did not fit after all; generate fresh code
+            candidates = await self.llm_client.generate_query_candidates_async(
+                question,
+                self.speculative_candidates,
+                reuse=False,
+                earlier_results=earlier_results,
+            )
+            run = await asyncio.to_thread(self._execute_candidates, candidates, session)
+            attempts += self._candidate_attempts(candidates, run)
+        return candidates[run.chosen], run.result, attempts
+
+    def _execute_candidates(
+        self, candidates: Sequence[LLMResponse], session: SessionResults | None
+    ) -> CandidateRun:
+        """Execute candidate programs with the session's earlier results."""
+        tables = session.tables() if session is not None else None
+        return self.executor.execute_candidates(
+            [candidate.content for candidate in candidates],
+            tables,
+            accept=self.speculative_accept,
+        )
+
+    @staticmethod
+    def _candidate_attempts(
+        candidates: Sequence[LLMResponse], run: CandidateRun
+    ) -> list[Attempt]:
+        """Attempts of the candidates that ran, the accepted one last."""
+        attempts = [
+            Attempt(candidate.content, result.error)
+            for index, (candidate, result) in enumerate(
+                zip(candidates, run.results, strict=True)
+            )
+            if result is not None and index != run.chosen
+        ]
+        attempts.append(Attempt(candidates[run.chosen].content, run.result.error))
+        return attempts
+
+    def _session(self, session_id: str | None) -> SessionResults | None:
+        """The stored results of a chat session, if the question has one."""
+        return self.sessions.get(session_id) if session_id is not None else None
+
+    def _execute(self, code: str, session: SessionResults | None) -> ExecutionResult:
+        """Execute code with the session's earlier results available."""
+        tables = session.tables() if session is not None else None
+        return self.executor.execute(code, tables)
+
+    def _remember_code(
+        self, question: str, code_response: LLMResponse, session: SessionResults | None
+    ) -> None:
+        """Store successful code in the example index.
+
+        Code reading a session's earlier results only makes sense in that
+        session, so it is not stored.
+        """
+        if session is not None and session.touch(code_response.content):
+            return
+        self.llm_client.remember_code(question, code_response)
 
+    @staticmethod
+    def _record_turn(session: SessionResults | None, response: ChatResponse) -> None:
+        """Store the answer's result for the session's next questions."""
+        if session is None:
+            return
+        result = response.execution_result
+        session.record(response.question, result.result if result.success else None)
@@ -0,0 +1,208 @@
+"""Results of earlier turns kept per chat session for follow-up questions.
+
+A follow-up such as "now only the overdue ones" is answered best by filtering
+the previous answer's result, not by re-planning the whole query against the
+full tables. Each session keeps the tabular results of its answered questions
+by name: ``turn_N`` for the N-th question and ``prev_result`` for the latest
+one. They are passed to the executor as extra tables for the session's runs,
+and summarized (shape and columns) in the code generation prompt.
+
+Every session is bounded by a byte budget, evicting its least recently used
+results; the number of sessions is bounded the same way.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import pandas as pd
+
+from src.tools.code_executor import estimate_size
+
+# Name of the latest result; an alias of its turn_N name
+PREV_RESULT = "prev_result"
+
+# Stored results described in the prompt, most recent first; older ones stay
+# available by name
+PROMPT_RESULTS = 5
+# Columns listed per result in the prompt
+PROMPT_COLUMNS = 12
+# Longest question quoted per result in the prompt
+PROMPT_QUESTION_CHARS = 100
+
+_NAME = re.compile(r"\b(prev_result|turn_\d+)\b")
+
+
+@dataclass(frozen=True)
+class StoredResult:
+    """A tabular result of one answered question."""
+
+    name: str
+    question: str
+    frame: pd.DataFrame
+    # Approximate memory footprint in bytes
+    size: int
+
+    def describe(self) -> str:
+        """Summarize the frame's shape and columns in one line."""
+        frame = self.frame
+        columns = [f"{column} ({dtype})" for column, dtype in frame.dtypes.items()]
+        if len(columns) > PROMPT_COLUMNS:
+            hidden = len(columns) - PROMPT_COLUMNS
+            columns = [*columns[:PROMPT_COLUMNS], f"... {hidden} more"]
+        text = f"{len(frame)} rows; columns: {', '.join(columns)}"
+        if not isinstance(frame.index, pd.RangeIndex):
+            names = [str(name) for name in frame.index.names if name is not None]
+            text += f"; index: {', '.join(names) or frame.index.dtype}"
+        return text
+
+
+def _as_frame(result: Any) -> pd.DataFrame | None:  # noqa: ANN401
+    """The result as a DataFrame, or None if it is not tabular."""
+    if isinstance(result, pd.DataFrame):
+        return result
+    if isinstance(result, pd.Series):
+        name = result.name if result.name is not None else "value"
+        return result.to_frame(name=name)
+    return None
+
+
+class SessionResults:
+    """Named results of one chat session, bounded by a byte budget."""
+
+    def __init__(self, max_bytes: int) -> None:
+        """Initialize an empty session.
+
+        Args:
+            max_bytes: Memory budget for the stored results; the least
+                recently used are evicted beyond it.
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # Questions recorded so far; numbers the turns
+        self.turns = 0
+        self._results: OrderedDict[str, StoredResult] = OrderedDict()
+        self._latest: str | None = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of stored results."""
+        return len(self._results)
+
+    def record(self, question: str, result: Any) -> str | None:  # noqa: ANN401
+        """Count an answered question and store its result if it is tabular.
+
+        Args:
+            question: The question answered.
+            result: Its execution result (the value of ``result``), or None
+                if execution failed.
+
+        Returns:
+            The result's ``turn_N`` name, or None if it was not stored (not a
+            DataFrame or Series, or larger than the whole budget).
+        """
+        frame = _as_frame(result)
+        size = estimate_size(frame) if frame is not None else 0
+        with self._lock:
+            self.turns += 1
+            if frame is None or size > self.max_bytes:
+                return None
+            name = f"turn_{self.turns}"
+            self._results[name] = StoredResult(name, question, frame, size)
+            self._latest = name
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._results.popitem(last=False)
+                self.total_bytes -= evicted.size
+            return name
+
+    def tables(self) -> dict[str, pd.DataFrame]:
+        """Stored frames by name, including the ``prev_result`` alias."""
+        with self._lock:
+            tables = {name: stored.frame for name, stored in self._results.items()}
+            latest = self._results.get(self._latest) if self._latest else None
+            if latest is not None:
+                tables[PREV_RESULT] = latest.frame
+        return tables
+
+    def touch(self, code: str) -> bool:
+        """Mark the results a piece of code reads as recently used.
+
+        Returns:
+            Whether the code reads any stored result.
+        """
+        names = set(_NAME.findall(code))
+        with self._lock:
+            if PREV_RESULT in names and self._latest is not None:
+                names.add(self._latest)
+            used = [name for name in names if name in self._results]
+            for name in used:
+                self._results.move_to_end(name)
+        return bool(used)
+
+    def summaries(self) -> list[tuple[str, str, str]]:
+        """Describe the most recent results for the code generation prompt.
+
+        Returns:
+            ``(name, question, description)`` of up to ``PROMPT_RESULTS``
+            results, latest first. The latest is noted as also available as
+            ``prev_result``.
+        """
+        with self._lock:
+            recent = sorted(
+                self._results.values(),
+                key=lambda stored: int(stored.name.removeprefix("turn_")),
+                reverse=True,
+            )[:PROMPT_RESULTS]
+            latest = self._latest
+        summaries = []
+        for stored in recent:
+            question = stored.question
+            if len(question) > PROMPT_QUESTION_CHARS:
+                question = question[:PROMPT_QUESTION_CHARS] + "..."
+            description = stored.describe()
+            if stored.name == latest:
+                description = f"same as `{PREV_RESULT}`; {description}"
+            summaries.append((stored.name, question, description))
+        return summaries
+
+
+class SessionStore:
+    """Sessions by ID, bounded in number by evicting the least recently used."""
+
+    def __init__(self, max_sessions: int, max_bytes_per_session: int) -> None:
+        """Initialize an empty store.
+
+        Args:
+            max_sessions: Sessions kept; the least recently used is dropped
+                beyond it.
+            max_bytes_per_session: Memory budget of each session's results.
+        """
+        self.max_sessions = max_sessions
+        self.max_bytes_per_session = max_bytes_per_session
+        self._sessions: OrderedDict[str, SessionResults] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of sessions."""
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> SessionResults:
+        """Return a session's results, creating the session if needed."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                return session
+            session = SessionResults(self.max_bytes_per_session)
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def drop(self, session_id: str) -> None:
+        """Forget a session and its results."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
@@ -0,0 +1,6 @@
+"""HTTP API package serving the chat agent over ASGI."""
+
+from src.api.coalescing import RequestCoalescer, StreamCoalescer
+from src.api.server import create_app
+
+__all__ = ["RequestCoalescer", "StreamCoalescer", "create_app"]
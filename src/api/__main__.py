@@ -0,0 +1,14 @@
+"""Run the HTTP API with uvicorn: ``python -m src.api``."""
+
+import uvicorn
+
+from src.config.settings import get_settings
+
+if __name__ == "__main__":
+    settings = get_settings()
+    uvicorn.run(
+        "src.api.server:app",
+        host=settings.api_host,
+        port=settings.api_port,
+        log_level=settings.log_level.lower(),
+    )
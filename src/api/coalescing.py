@@ -0,0 +1,169 @@
+"""Coalescing of identical in-flight questions.
+
+Several users (or retries of one tool) often ask the same question at the
+same time. Instead of generating and running code once per request, requests
+for a question that is already being answered wait for that answer. Once it
+is done the next identical question starts a fresh run (which the LLM
+response cache usually makes cheap).
+"""
+
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+
+
+def question_key(question: str, session_id: str | None = None) -> str:
+    """Normalize a question so trivially different spellings coalesce.
+
+    Questions of different chat sessions never coalesce: they may read
+    different earlier results.
+    """
+    key = " ".join(question.split()).casefold()
+    return key if session_id is None else f"{session_id}\x00{key}"
+
+
+class RequestCoalescer[T]:
+    """Shares one awaitable result between identical in-flight requests."""
+
+    def __init__(self) -> None:
+        """Initialize with no requests in flight."""
+        self._tasks: dict[str, asyncio.Task[T]] = {}
+        # Requests that joined a run started by another request
+        self.coalesced = 0
+
+    async def run(self, key: str, start: Callable[[], Awaitable[T]]) -> T:
+        """Return the result for a key, starting a run only if none is in flight.
+
+        A request that is cancelled (e.g. the client disconnected) stops
+        waiting without cancelling the run the other requests wait for.
+
+        Args:
+            key: Identity of the request.
+            start: Starts the run; called at most once per in-flight key.
+
+        Returns:
+            The run's result; its exception is raised to every waiter.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(start())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        """Number of distinct runs in progress."""
+        return len(self._tasks)
+
+
+class _Flight[E]:
+    """Events of one streaming run, kept for every subscriber to replay."""
+
+    def __init__(self) -> None:
+        self.events: list[E] = []
+        self.error: BaseException | None = None
+        self.done = False
+        self.updated = asyncio.Event()
+
+    def push(self, event: E) -> None:
+        self.events.append(event)
+        self._notify()
+
+    def finish(self, error: BaseException | None = None) -> None:
+        self.error = error
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        # Wake the current waiters; later waits use a fresh event
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+
+class StreamCoalescer[E]:
+    """Shares one blocking event stream between identical in-flight requests.
+
+    The stream runs in the default thread pool; its events are buffered, so a
+    request joining late first replays what it missed and then follows live.
+    """
+
+    def __init__(self, max_concurrency: int | None = None) -> None:
+        """Initialize with no streams in flight.
+
+        Args:
+            max_concurrency: Maximum number of streams running at once. None
+                means unbounded.
+        """
+        self._flights: dict[str, _Flight[E]] = {}
+        self._semaphore = (
+            asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        )
+        self._tasks: set[asyncio.Task[None]] = set()
+        # Requests that joined a stream started by another request
+        self.coalesced = 0
+
+    async def subscribe(
+        self, key: str, start: Callable[[], Iterator[E]]
+    ) -> AsyncIterator[E]:
+        """Yield the events for a key, starting a stream only if none is in flight.
+
+        Args:
+            key: Identity of the request.
+            start: Creates the blocking event iterator; called at most once
+                per in-flight key.
+
+        Yields:
+            Every event of the stream, from the first one.
+
+        Raises:
+            Exception: Whatever the stream raised, after its earlier events.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            task = asyncio.create_task(self._produce(key, flight, start))
+            # Keep a reference so the task is not garbage collected mid-run
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self.coalesced += 1
+
+        position = 0
+        while True:
+            while position < len(flight.events):
+                yield flight.events[position]
+                position += 1
+            if flight.done:
+                if flight.error is not None:
+                    raise flight.error
+                return
+            await flight.updated.wait()
+
+    def in_flight(self) -> int:
+        """Number of distinct streams in progress."""
+        return len(self._flights)
+
+    async def _produce(
+        self, key: str, flight: _Flight[E], start: Callable[[], Iterator[E]]
+    ) -> None:
+        """Drain the blocking iterator in a worker thread into the flight."""
+        loop = asyncio.get_running_loop()
+
+        def pump() -> None:
+            for event in start():
+                loop.call_soon_threadsafe(flight.push, event)
+
+        try:
+            if self._semaphore is None:
+                await loop.run_in_executor(None, pump)
+            else:
+                async with self._semaphore:
+                    await loop.run_in_executor(None, pump)
+        except Exception as e:  # re-raised to every subscriber
+            flight.finish(e)
+        else:
+            flight.finish()
+        finally:
+            self._flights.pop(key, None)
@@ -0,0 +1,146 @@
+"""Minimal stand-in for the OpenAI chat completions API.
+
+Runs the HTTP API end to end without network access or an API key: code
+generation requests get a fixed query over the ``invoices`` table (pandas or
+SQL, matching the system prompt) and formatting requests get a short answer
+quoting the data result. Point the agent at it with::
+
+    python -m src.api.fake_openai --port 8001 &
+    OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python -m src.api
+
+Optionally add ``--delay`` seconds per completion to make coalescing and
+streaming observable.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections.abc import AsyncIterator
+from typing import Any
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+PANDAS_REPLY = """```python
+result = invoices.groupby('status').size().to_dict()
+```"""
+
+SQL_REPLY = """```sql
+SELECT status, COUNT(*) AS invoices FROM invoices GROUP BY status ORDER BY status
+```"""
+
+# Words per streamed chunk
+STREAM_CHUNK_WORDS = 3
+
+
+def reply_for(messages: list[dict[str, str]]) -> str:
+    """Return the canned completion for a conversation."""
+    system = messages[0]["content"] if messages else ""
+    if system.startswith("You are a pandas code generator"):
+        return PANDAS_REPLY
+    if system.startswith("You are a DuckDB SQL generator"):
+        return SQL_REPLY
+    prompt = messages[-1]["content"] if messages else ""
+    data = prompt.split("Query Result:", 1)[-1].split("Please provide", 1)[0]
+    return f"Here is what the data shows: {' '.join(data.split()[:40])}"
+
+
+def _usage(
+    messages: list[dict[str, str]], content: str, choices: int = 1
+) -> dict[str, int]:
+    """Approximate token usage (four characters per token)."""
+    prompt = sum(len(m["content"]) for m in messages) // 4
+    completion = len(content) // 4 * choices
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": prompt + completion,
+    }
+
+
+def create_app(delay_seconds: float = 0.0) -> Starlette:
+    """Create the fake API.
+
+    Args:
+        delay_seconds: Time each completion takes before its first token.
+
+    Returns:
+        Starlette application serving ``POST /v1/chat/completions``.
+    """
+
+    async def completions(request: Request) -> Response:
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "fake")
+        content = reply_for(messages)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        await asyncio.sleep(delay_seconds)
+
+        if not body.get("stream"):
+            # Every one of the n sampled choices gets the canned reply
+            choices = max(int(body.get("n") or 1), 1)
+            return JSONResponse(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": index,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }
+                        for index in range(choices)
+                    ],
+                    "usage": _usage(messages, content, choices),
+                }
+            )
+
+        def chunk(choices: list[dict[str, Any]], **extra: Any) -> str:  # noqa: ANN401
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+                **extra,
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def chunks() -> AsyncIterator[str]:
+            words = content.split(" ")
+            for start in range(0, len(words), STREAM_CHUNK_WORDS):
+                text = " ".join(words[start : start + STREAM_CHUNK_WORDS])
+                if start:
+                    text = " " + text
+                delta = {"content": text}
+                yield chunk([{"index": 0, "delta": delta, "finish_reason": None}])
+                await asyncio.sleep(0)
+            yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if body.get("stream_options", {}).get("include_usage"):
+                # Usage arrives in a final chunk without choices
+                yield chunk([], usage=_usage(messages, content))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return Starlette(
+        routes=[Route("/v1/chat/completions", completions, methods=["POST"])]
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.delay), host=args.host, port=args.port)
@@ -0,0 +1,280 @@
+"""ASGI HTTP API around :class:`ChatAgent`.
+
+Endpoints:
+
+- ``GET /health``: liveness; answers as soon as the process serves requests.
+- ``GET /ready``: readiness; 200 once the data is loaded and the agent can
+  answer, 503 while loading or if loading failed.
+- ``POST /ask``: ``{"question": ..., "session_id": ...}`` answered as one
+  JSON document. ``session_id`` is optional; questions sharing one can
+  follow up on each other's results.
+- ``POST /ask/stream``: the same, streamed as server-sent events
+  (``code_generated``, ``execution_done``, ``answer_delta``, ``done``).
+- ``GET /metrics``: request, LLM and execution metrics in the Prometheus
+  text format.
+
+Identical questions in flight at the same time are answered once. Run with
+``python -m src.api`` or any ASGI server (``uvicorn src.api.server:app``).
+"""
+
+import asyncio
+import json
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
+from starlette.routing import Route
+
+from src.agent.chat_agent import ChatAgent, ChatResponse, StreamEvent, StreamStage
+from src.api.coalescing import RequestCoalescer, StreamCoalescer, question_key
+from src.config.settings import get_settings
+from src.telemetry.logs import configure_logging
+from src.telemetry.metrics import REGISTRY
+from src.tools.code_executor import ExecutionResult, enable_copy_on_write
+
+# Longest question accepted, in characters
+MAX_QUESTION_LENGTH = 2000
+# Longest chat session ID accepted, in characters
+MAX_SESSION_ID_LENGTH = 128
+
+# Content type of the Prometheus text exposition format
+METRICS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@dataclass(frozen=True)
+class AskRequest:
+    """A validated question."""
+
+    question: str
+    session_id: str | None = None
+
+    def key(self) -> str:
+        """Coalescing key of the question."""
+        return question_key(self.question, self.session_id)
+
+
+class AgentState:
+    """The agent being served, loaded in the background at start-up."""
+
+    def __init__(self, factory: Callable[[], ChatAgent]) -> None:
+        """Initialize without an agent.
+
+        Args:
+            factory: Builds the agent (loads the data); runs in a thread.
+        """
+        self.factory = factory
+        self.agent: ChatAgent | None = None
+        self.error: str | None = None
+        self.loading: asyncio.Task[None] | None = None
+
+    async def load(self) -> None:
+        """Build the agent, recording the error if that fails."""
+        try:
+            self.agent = await asyncio.to_thread(self.factory)
+        except Exception as e:  # reported by /ready
+            self.error = f"{type(e).__name__}: {e}"
+
+
+def parse_ask_request(body: Any) -> tuple[AskRequest | None, Response | None]:  # noqa: ANN401
+    """Validate a decoded request body.
+
+    Returns:
+        The question, or the error response for a bad request.
+    """
+    question = body.get("question") if isinstance(body, dict) else None
+    if not isinstance(question, str) or not question.strip():
+        return None, JSONResponse({"error": "'question' is required"}, 400)
+    if len(question) > MAX_QUESTION_LENGTH:
+        return None, JSONResponse(
+            {"error": f"question exceeds {MAX_QUESTION_LENGTH} characters"}, 413
+        )
+    session_id = body.get("session_id")
+    if session_id is not None and (
+        not isinstance(session_id, str)
+        or not session_id
+        or len(session_id) > MAX_SESSION_ID_LENGTH
+    ):
+        return None, JSONResponse(
+            {
+                "error": "'session_id' must be a non-empty string of at most "
+                f"{MAX_SESSION_ID_LENGTH} characters"
+            },
+            400,
+        )
+    return AskRequest(question.strip(), session_id), None
+
+
+def execution_to_dict(result: ExecutionResult, max_tokens: int) -> dict[str, Any]:
+    """Serialize an execution result, encoding the data within a token budget."""
+    return {
+        "success": result.success,
+        "result": result.to_string(max_tokens) if result.success else None,
+        "result_type": result.result_type,
+        "error": result.error,
+        "cached": result.cached,
+    }
+
+
+def response_to_dict(response: ChatResponse, max_tokens: int) -> dict[str, Any]:
+    """Serialize a ChatResponse for the JSON and streaming endpoints."""
+    return {
+        "question": response.question,
+        "answer": response.answer,
+        "generated_code": response.generated_code,
+        "execution": execution_to_dict(response.execution_result, max_tokens),
+        "time_to_first_token": response.time_to_first_token,
+        "answered_from_template": response.answered_from_template,
+        "attempts": [asdict(attempt) for attempt in response.attempts],
+        "trace_id": response.trace_id,
+        "timings": response.timings,
+        "usage": response.usage,
+    }
+
+
+def event_to_dict(event: StreamEvent, max_tokens: int) -> dict[str, Any]:
+    """Serialize a StreamEvent's payload."""
+    if event.stage is StreamStage.CODE_GENERATED:
+        return {"code": event.data}
+    if event.stage is StreamStage.EXECUTION_DONE:
+        return execution_to_dict(event.data, max_tokens)
+    if event.stage is StreamStage.ANSWER_DELTA:
+        return {"delta": event.data}
+    return response_to_dict(event.data, max_tokens)
+
+
+def _sse(event: str, data: dict[str, Any]) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def create_app(agent_factory: Callable[[], ChatAgent] | None = None) -> Starlette:
+    """Create the ASGI application.
+
+    Args:
+        agent_factory: Builds the agent. Defaults to ``ChatAgent()`` with the
+            configured data directory and model.
+
+    Returns:
+        Starlette application.
+    """
+    settings = get_settings()
+    configure_logging(settings.log_level, settings.log_format)
+    enable_copy_on_write()
+    state = AgentState(agent_factory or ChatAgent)
+    answers: RequestCoalescer[ChatResponse] = RequestCoalescer()
+    streams: StreamCoalescer[StreamEvent] = StreamCoalescer(
+        settings.ask_max_concurrency
+    )
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:  # noqa: ARG001
+        # Load in the background so /health answers while the data loads
+        state.loading = asyncio.create_task(state.load())
+        try:
+            yield
+        finally:
+            state.loading.cancel()
+            if state.agent is not None:
+                state.agent.close()
+
+    async def health(request: Request) -> Response:  # noqa: ARG001
+        return JSONResponse({"status": "ok"})
+
+    async def ready(request: Request) -> Response:  # noqa: ARG001
+        if state.agent is not None:
+            return JSONResponse(
+                {
+                    "status": "ready",
+                    "data_version": state.agent.data_context.version,
+                    "in_flight": answers.in_flight() + streams.in_flight(),
+                    "coalesced": answers.coalesced + streams.coalesced,
+                }
+            )
+        if state.error is not None:
+            return JSONResponse({"status": "failed", "error": state.error}, 503)
+        return JSONResponse({"status": "loading"}, 503)
+
+    async def metrics(request: Request) -> Response:  # noqa: ARG001
+        return PlainTextResponse(REGISTRY.render(), media_type=METRICS_MEDIA_TYPE)
+
+    async def parse_question(
+        request: Request,
+    ) -> tuple[AskRequest | None, Response | None]:
+        """Return the question, or the error response for a bad request."""
+        if state.agent is None:
+            return None, JSONResponse({"error": "agent is not ready"}, 503)
+        try:
+            body = await request.json()
+        except ValueError:
+            return None, JSONResponse({"error": "body must be JSON"}, 400)
+        return parse_ask_request(body)
+
+    async def ask(request: Request) -> Response:
+        ask_request, error = await parse_question(request)
+        if error is not None:
+            return error
+        agent = state.agent
+        assert agent is not None  # noqa: S101
+        assert ask_request is not None  # noqa: S101
+        try:
+            response = await answers.run(
+                ask_request.key(),
+                lambda: agent.ask_async(
+                    ask_request.question, session_id=ask_request.session_id
+                ),
+            )
+        except Exception as e:  # LLM or transport failure
+            return JSONResponse({"error": f"{type(e).__name__}: {e}"}, 502)
+        return JSONResponse(response_to_dict(response, agent.result_token_budget))
+
+    async def ask_stream(request: Request) -> Response:
+        ask_request, error = await parse_question(request)
+        if error is not None:
+            return error
+        agent = state.agent
+        assert agent is not None  # noqa: S101
+        assert ask_request is not None  # noqa: S101
+
+        async def events() -> AsyncIterator[str]:
+            try:
+                async for event in streams.subscribe(
+                    ask_request.key(),
+                    lambda: agent.ask_stream(
+                        ask_request.question, session_id=ask_request.session_id
+                    ),
+                ):
+                    yield _sse(
+                        event.stage.value,
+                        event_to_dict(event, agent.result_token_budget),
+                    )
+            except Exception as e:  # reported in-stream
+                yield _sse("error", {"error": f"{type(e).__name__}: {e}"})
+
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    return Starlette(
+        routes=[
+            Route("/health", health, methods=["GET"]),
+            Route("/ready", ready, methods=["GET"]),
+            Route("/metrics", metrics, methods=["GET"]),
+            Route("/ask", ask, methods=["POST"]),
+            Route("/ask/stream", ask_stream, methods=["POST"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+app = create_app()
@@ -0,0 +1,18 @@
+"""Offline benchmark suite replaying recorded OpenAI exchanges."""
+
+from src.bench.replay import (
+    AsyncRecordingTransport,
+    Cassette,
+    RecordingTransport,
+    ReplayStandIn,
+)
+from src.bench.runner import compare, run_benchmark
+
+__all__ = [
+    "AsyncRecordingTransport",
+    "Cassette",
+    "RecordingTransport",
+    "ReplayStandIn",
+    "compare",
+    "run_benchmark",
+]
@@ -0,0 +1,195 @@
+"""Offline benchmark: ``python -m src.bench {record,run}``.
+
+Record the OpenAI exchanges of the benchmark questions once (needs an API
+key)::
+
+    python -m src.bench record
+
+Then benchmark against the recording, without network access, and compare
+with (or update) the stored baseline::
+
+    python -m src.bench run --latency 0.05
+    python -m src.bench run --latency 0.05 --update-baseline
+
+``run`` exits with status 1 if a result regressed beyond the tolerance.
+Speculative generation is measured by recording and running with
+``--candidates N`` against a baseline of single-candidate runs: the report
+shows the extra tokens next to the latency and failures saved.
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# Cached answers and reused code would skip the stages being measured, and a
+# refresh thread only adds noise; explicitly set variables still win
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("EXAMPLE_INDEX_ENABLED", "false")
+os.environ.setdefault("DATA_REFRESH_INTERVAL_SECONDS", "0")
+# Per-span debug logging would be measured along with the pipeline
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from src.agent.chat_agent import ChatAgent
+from src.bench.questions import QUESTIONS
+from src.bench.replay import (
+    AsyncRecordingTransport,
+    Cassette,
+    RecordingTransport,
+    ReplayStandIn,
+)
+from src.bench.runner import (
+    compare,
+    format_report,
+    format_tradeoff,
+    run_benchmark,
+    summarize,
+)
+from src.config.settings import get_settings
+from src.llm.transport import Transport
+from src.telemetry.logs import configure_logging
+from src.tools.code_executor import enable_copy_on_write
+
+DEFAULT_CASSETTE = Path("benchmarks/cassette.json")
+DEFAULT_BASELINE = Path("benchmarks/baseline.json")
+
+
+def record(args: argparse.Namespace) -> int:
+    """Answer every question against the real API, recording the exchanges."""
+    settings = get_settings()
+    cassette = Cassette()
+    transport = Transport.from_settings(
+        settings,
+        http_transport=RecordingTransport(cassette),
+        async_http_transport=AsyncRecordingTransport(cassette),
+    )
+    agent = ChatAgent(args.data_dir, transport=transport)
+    if args.candidates is not None:
+        agent.speculative_candidates = args.candidates
+    try:
+        for question in QUESTIONS:
+            agent.ask(question)
+    finally:
+        agent.close()
+    cassette.save(args.cassette)
+    sys.stdout.write(f"Recorded {len(cassette)} exchanges to {args.cassette}\n")
+    return 0
+
+
+def run(args: argparse.Namespace) -> int:
+    """Benchmark against the recording and compare with the baseline."""
+    settings = get_settings()
+    stand_in = ReplayStandIn(
+        Cassette.load(args.cassette),
+        latency_seconds=args.latency,
+        latency_scale=args.latency_scale,
+    )
+
+    def agent_factory() -> ChatAgent:
+        transport = Transport.from_settings(
+            settings,
+            "replay",
+            http_transport=stand_in.transport(),
+            async_http_transport=stand_in.async_transport(),
+        )
+        agent = ChatAgent(args.data_dir, transport=transport)
+        if args.candidates is not None:
+            agent.speculative_candidates = args.candidates
+        return agent
+
+    results = run_benchmark(
+        agent_factory,
+        QUESTIONS,
+        args.data_dir,
+        repeat=args.repeat,
+        concurrency=args.concurrency,
+    )
+    results["replay_latency"] = {"seconds": args.latency, "scale": args.latency_scale}
+    results["replay"] = {
+        "exact_hits": stand_in.stats.exact_hits,
+        "fallback_hits": stand_in.stats.fallback_hits,
+        "misses": stand_in.stats.misses,
+    }
+    results["prompt_tokens"] = {
+        stage: summarize(tokens)
+        for stage, tokens in sorted(stand_in.stats.prompt_tokens.items())
+    }
+    sys.stdout.write(format_report(results) + "\n")
+
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        sys.stdout.write(f"\nBaseline written to {args.baseline}\n")
+        return 0
+    if not args.baseline.exists():
+        sys.stdout.write(f"\nNo baseline at {args.baseline}; nothing to compare\n")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    tradeoff = format_tradeoff(results, baseline)
+    if tradeoff is not None:
+        sys.stdout.write(f"\n{tradeoff}\n")
+    regressions = compare(results, baseline, tolerance=args.tolerance)
+    if not regressions:
+        sys.stdout.write(f"\nNo regressions against {args.baseline}\n")
+        return 0
+    sys.stdout.write(f"\nRegressions against {args.baseline}:\n")
+    sys.stdout.writelines(f"- {regression}\n" for regression in regressions)
+    return 1
+
+
+def main() -> int:
+    """Parse the command line and run the command."""
+    parser = argparse.ArgumentParser(
+        prog="python -m src.bench", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument("--data-dir", default=get_settings().data_dir)
+    parser.add_argument("--cassette", type=Path, default=DEFAULT_CASSETTE)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser.add_argument(
+        "--candidates",
+        type=int,
+        default=None,
+        help="programs per generation call (default: SPECULATIVE_CANDIDATES)",
+    )
+    commands.add_parser("record", help="record the exchanges (needs an API key)")
+
+    run_parser = commands.add_parser("run", help="benchmark against the recording")
+    run_parser.add_argument(
+        "--latency",
+        type=float,
+        default=None,
+        help="fixed seconds per completion (default: the recorded latency)",
+    )
+    run_parser.add_argument("--latency-scale", type=float, default=1.0)
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="questions in flight for throughput (default: ASK_MAX_CONCURRENCY)",
+    )
+    run_parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    run_parser.add_argument("--update-baseline", action="store_true")
+    run_parser.add_argument("--tolerance", type=float, default=0.25)
+    run_parser.add_argument("--output", type=Path, default=None)
+
+    args = parser.parse_args()
+    if args.command == "run" and not args.cassette.exists():
+        parser.error(
+            f"no cassette at {args.cassette}; "
+            "record one first with: python -m src.bench record"
+        )
+    settings = get_settings()
+    configure_logging(settings.log_level, settings.log_format)
+    enable_copy_on_write()
+    return record(args) if args.command == "record" else run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
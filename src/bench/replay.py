@@ -0,0 +1,335 @@
+"""Record real OpenAI exchanges once and replay them without network access.
+
+Recording wraps the HTTP transport of the OpenAI clients, so every chat
+completion the agent sends is stored with its response body and latency in a
+JSON *cassette*. Replaying serves those bodies from an in-process HTTP
+stand-in; the SDK, the rate-limited :class:`~src.llm.transport.Transport`
+and everything above it run unchanged.
+
+Requests are matched by their exact messages (and number of sampled
+completions) first. If that fails (the prompt or the data changed since
+recording) they are matched by stage (generation or formatting),
+conversation length and question, so a replay keeps working, and keeps
+measuring the new prompt, after prompt changes.
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from src.llm.cache import fingerprint
+
+CASSETTE_VERSION = 1
+
+# Characters per prompt token when estimating prompt size
+CHARS_PER_TOKEN = 4
+
+# Status of a replayed request that matches no recorded exchange; a client
+# error, so the transport does not retry it and the run stops with it
+MISS_STATUS = 404
+
+# The question line of code generation prompts (the last one; few-shot
+# examples quote earlier questions)
+_QUESTION = re.compile(r"^Question: (.+)$", re.MULTILINE)
+# Formatting prompts start with the question
+_FORMATTING_PREFIX = "User Question: "
+
+
+@dataclass
+class Exchange:
+    """One recorded chat completion request and its response."""
+
+    key: str
+    # Stage, conversation length, streaming and question; None if the request
+    # has no recognizable question
+    fallback_key: str | None
+    status: int
+    content_type: str
+    body: str
+    latency_seconds: float
+
+
+@dataclass
+class ReplayStats:
+    """Counts of the requests served by a :class:`ReplayStandIn`."""
+
+    exact_hits: int = 0
+    fallback_hits: int = 0
+    misses: int = 0
+    # Estimated prompt tokens of each request, per stage
+    prompt_tokens: dict[str, list[int]] = field(default_factory=dict)
+
+
+def request_keys(body: dict[str, Any]) -> tuple[str, str | None, str]:
+    """Return the exact key, the fallback key and the stage of a request.
+
+    Args:
+        body: JSON body of a chat completion request.
+
+    Returns:
+        The key of the exact messages, the key of the stage, conversation
+        length and question (None if no question is found), and the stage,
+        ``"generate"`` or ``"format"``.
+    """
+    messages = body.get("messages", [])
+    stream = bool(body.get("stream"))
+    parts: list[Any] = [messages, stream]
+    # Speculative generation samples several completions in one request
+    choices = body.get("n") or 1
+    if choices > 1:
+        parts.append(choices)
+    key = fingerprint(json.dumps(parts, sort_keys=True))
+
+    first_user = next(
+        (message["content"] for message in messages if message["role"] == "user"),
+        "",
+    )
+    if first_user.startswith(_FORMATTING_PREFIX):
+        stage = "format"
+        question = first_user.removeprefix(_FORMATTING_PREFIX).split("\n", 1)[0]
+    else:
+        stage = "generate"
+        matches = _QUESTION.findall(first_user)
+        question = matches[-1] if matches else None
+    fallback_key = (
+        None
+        if question is None
+        else f"{stage}|{len(messages)}|{int(stream)}|{question.strip()}"
+    )
+    return key, fallback_key, stage
+
+
+class Cassette:
+    """Recorded exchanges, stored as JSON."""
+
+    def __init__(self, exchanges: list[Exchange] | None = None) -> None:
+        """Initialize from exchanges (later ones win on equal keys)."""
+        self._lock = threading.Lock()
+        self._by_key: dict[str, Exchange] = {}
+        self._by_fallback: dict[str, Exchange] = {}
+        for exchange in exchanges or []:
+            self.add(exchange)
+
+    def __len__(self) -> int:
+        """Number of recorded exchanges."""
+        return len(self._by_key)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Cassette":
+        """Load a cassette written by :meth:`save`.
+
+        Raises:
+            ValueError: If the file has an unsupported version.
+        """
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if data.get("version") != CASSETTE_VERSION:
+            msg = f"Unsupported cassette version: {data.get('version')!r}"
+            raise ValueError(msg)
+        return cls([Exchange(**exchange) for exchange in data["exchanges"]])
+
+    def save(self, path: str | Path) -> None:
+        """Write the cassette as JSON."""
+        with self._lock:
+            exchanges = [asdict(exchange) for exchange in self._by_key.values()]
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps(
+                {"version": CASSETTE_VERSION, "exchanges": exchanges},
+                indent=1,
+                ensure_ascii=False,
+            ),
+            encoding="utf-8",
+        )
+
+    def add(self, exchange: Exchange) -> None:
+        """Store an exchange."""
+        with self._lock:
+            self._by_key[exchange.key] = exchange
+            if exchange.fallback_key is not None:
+                self._by_fallback[exchange.fallback_key] = exchange
+
+    def find(self, key: str, fallback_key: str | None) -> tuple[Exchange | None, bool]:
+        """Look up an exchange by exact key, then by fallback key.
+
+        Returns:
+            The exchange (None if neither key is recorded) and whether it
+            matched exactly.
+        """
+        exchange = self._by_key.get(key)
+        if exchange is not None:
+            return exchange, True
+        if fallback_key is None:
+            return None, False
+        return self._by_fallback.get(fallback_key), False
+
+
+# Headers describing the wire encoding of a body that has been decoded
+_WIRE_HEADERS = frozenset({"content-encoding", "content-length", "transfer-encoding"})
+
+
+def _record(
+    cassette: Cassette,
+    request: httpx.Request,
+    response: httpx.Response,
+    latency: float,
+) -> httpx.Response:
+    """Record a read response and return a copy carrying the decoded body."""
+    recorded = httpx.Response(
+        response.status_code,
+        headers=[
+            (name, value)
+            for name, value in response.headers.items()
+            if name.lower() not in _WIRE_HEADERS
+        ],
+        content=response.content,
+    )
+    if response.is_success and request.url.path.endswith("/chat/completions"):
+        key, fallback_key, _ = request_keys(json.loads(request.content))
+        cassette.add(
+            Exchange(
+                key=key,
+                fallback_key=fallback_key,
+                status=response.status_code,
+                content_type=response.headers.get("content-type", "application/json"),
+                body=response.text,
+                latency_seconds=latency,
+            )
+        )
+    return recorded
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Sends requests over the network and records successful completions."""
+
+    def __init__(self, cassette: Cassette) -> None:
+        """Initialize with the cassette to record into."""
+        self.cassette = cassette
+        self._inner = httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        """Forward a request and record its response."""
+        start = time.perf_counter()
+        response = self._inner.handle_request(request)
+        response.read()
+        response.close()
+        return _record(self.cassette, request, response, time.perf_counter() - start)
+
+    def close(self) -> None:
+        """Close the network transport."""
+        self._inner.close()
+
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    """Async variant of :class:`RecordingTransport`."""
+
+    def __init__(self, cassette: Cassette) -> None:
+        """Initialize with the cassette to record into."""
+        self.cassette = cassette
+        self._inner = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        """Forward a request and record its response."""
+        start = time.perf_counter()
+        response = await self._inner.handle_async_request(request)
+        await response.aread()
+        await response.aclose()
+        return _record(self.cassette, request, response, time.perf_counter() - start)
+
+    async def aclose(self) -> None:
+        """Close the network transport."""
+        await self._inner.aclose()
+
+
+class ReplayStandIn:
+    """In-process stand-in for the OpenAI API serving recorded completions."""
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        *,
+        latency_seconds: float | None = None,
+        latency_scale: float = 1.0,
+    ) -> None:
+        """Initialize the stand-in.
+
+        Args:
+            cassette: Recorded exchanges to serve.
+            latency_seconds: Fixed latency of every response. If None, each
+                response takes its recorded latency.
+            latency_scale: Factor applied to the latency.
+        """
+        self.cassette = cassette
+        self.latency_seconds = latency_seconds
+        self.latency_scale = latency_scale
+        self.stats = ReplayStats()
+        self._lock = threading.Lock()
+
+    def transport(self) -> httpx.BaseTransport:
+        """HTTP transport for the synchronous OpenAI client."""
+        return httpx.MockTransport(self._handle)
+
+    def async_transport(self) -> httpx.AsyncBaseTransport:
+        """HTTP transport for the async OpenAI client."""
+        return httpx.MockTransport(self._handle_async)
+
+    def _handle(self, request: httpx.Request) -> httpx.Response:
+        exchange, latency = self._lookup(request)
+        time.sleep(latency)
+        return self._response(exchange)
+
+    async def _handle_async(self, request: httpx.Request) -> httpx.Response:
+        exchange, latency = self._lookup(request)
+        await asyncio.sleep(latency)
+        return self._response(exchange)
+
+    def _lookup(self, request: httpx.Request) -> tuple[Exchange | None, float]:
+        """Find the recorded exchange for a request and its latency."""
+        body = json.loads(request.content)
+        key, fallback_key, stage = request_keys(body)
+        exchange, exact = self.cassette.find(key, fallback_key)
+        prompt_chars = sum(len(message["content"]) for message in body["messages"])
+        with self._lock:
+            self.stats.prompt_tokens.setdefault(stage, []).append(
+                prompt_chars // CHARS_PER_TOKEN
+            )
+            if exchange is None:
+                self.stats.misses += 1
+            elif exact:
+                self.stats.exact_hits += 1
+            else:
+                self.stats.fallback_hits += 1
+        if exchange is None:
+            return None, 0.0
+        latency = (
+            exchange.latency_seconds
+            if self.latency_seconds is None
+            else self.latency_seconds
+        )
+        return exchange, latency * self.latency_scale
+
+    @staticmethod
+    def _response(exchange: Exchange | None) -> httpx.Response:
+        if exchange is None:
+            return httpx.Response(
+                MISS_STATUS,
+                json={
+                    "error": {
+                        "message": "No recorded completion matches this request;"
+                        " record the cassette again",
+                        "type": "replay_miss",
+                    }
+                },
+            )
+        return httpx.Response(
+            exchange.status,
+            headers={"content-type": exchange.content_type},
+            content=exchange.body.encode(),
+        )
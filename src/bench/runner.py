@@ -0,0 +1,382 @@
+"""Benchmark the answer pipeline and compare the results with a baseline.
+
+A benchmark run measures:
+
+- ``load``: :func:`~src.dataloaders.excel_loader.load_data` (from the
+  snapshot once it exists).
+- ``stages``: per-question latency of code generation, execution and
+  formatting (including result encoding), and their total, over several
+  sequential passes.
+- ``throughput_qps``: questions answered per second by
+  :meth:`ChatAgent.ask_many` at the configured concurrency.
+- ``peak_memory_mb``: peak Python heap while creating the agent and
+  answering every question once (tracemalloc; worker processes excluded).
+- ``tokens``: prompt and completion tokens billed per question in the
+  latency passes. With speculative generation (``speculative_candidates``
+  above 1) this is the extra cost to weigh against the latency and failures
+  saved; :func:`format_tradeoff` puts them side by side.
+
+Results are plain JSON so they can be stored as a baseline and compared in
+CI.
+"""
+
+import asyncio
+import math
+import platform
+import time
+import tracemalloc
+from collections.abc import Callable, Sequence
+from pathlib import Path
+from typing import Any
+
+from src.agent.answer_template import fill_answer_template
+from src.agent.chat_agent import ChatAgent
+from src.dataloaders.excel_loader import load_data
+from src.tools.code_executor import ResultMemo
+
+RESULTS_VERSION = 1
+
+STAGES = ("generate", "execute", "format", "total")
+
+# Token kinds counted per question
+TOKEN_KINDS = ("prompt", "completion")
+
+# Timings closer than this to the baseline are never regressions (noise)
+MIN_SECONDS_DELTA = 0.005
+# Memory growth below this is never a regression
+MIN_MEMORY_DELTA_MB = 1.0
+
+
+def summarize(values: Sequence[float]) -> dict[str, float]:
+    """Summarize samples as mean, percentiles (linear interpolation) and max."""
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+
+    def percentile(q: float) -> float:
+        position = (len(ordered) - 1) * q
+        lower = math.floor(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        weight = position - lower
+        return ordered[lower] * (1 - weight) + ordered[upper] * weight
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": percentile(0.50),
+        "p90": percentile(0.90),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "max": ordered[-1],
+    }
+
+
+def time_pipeline(
+    agent: ChatAgent, question: str
+) -> tuple[dict[str, float], bool, dict[str, int]]:
+    """Answer a question stage by stage, as :meth:`ChatAgent.ask` does.
+
+    Returns:
+        Seconds spent per stage (see :data:`STAGES`), whether the generated
+        code executed successfully, and the tokens billed per kind (see
+        :data:`TOKEN_KINDS`).
+    """
+    start = time.perf_counter()
+    candidates = agent.llm_client.generate_query_candidates(
+        question, agent.speculative_candidates
+    )
+    generated = time.perf_counter()
+    run = agent.executor.execute_candidates(
+        [candidate.content for candidate in candidates],
+        accept=agent.speculative_accept,
+    )
+    code_response, execution_result = candidates[run.chosen], run.result
+    executed = time.perf_counter()
+    # The first candidate carries the generation call's usage
+    responses = [candidates[0]]
+    answer = fill_answer_template(code_response.answer_template, execution_result)
+    if answer is None and execution_result.success:
+        result_str = execution_result.to_string(agent.result_token_budget)
+        responses.append(agent.llm_client.format_response(question, result_str))
+    formatted = time.perf_counter()
+    tokens = {
+        kind: sum(response.usage.get(f"{kind}_tokens", 0) for response in responses)
+        for kind in TOKEN_KINDS
+    }
+    return (
+        {
+            "generate": generated - start,
+            "execute": executed - generated,
+            "format": formatted - executed,
+            "total": formatted - start,
+        },
+        execution_result.success,
+        tokens,
+    )
+
+
+def run_benchmark(
+    agent_factory: Callable[[], ChatAgent],
+    questions: Sequence[str],
+    data_dir: str | Path,
+    *,
+    repeat: int = 3,
+    concurrency: int | None = None,
+) -> dict[str, Any]:
+    """Run the benchmark.
+
+    Args:
+        agent_factory: Creates the agent (loading its data).
+        questions: Questions to answer.
+        data_dir: Data directory, for timing the data load.
+        repeat: Passes over the questions for the latency and throughput
+            measurements.
+        concurrency: Questions in flight during the throughput measurement.
+            If None, uses the ``ask_max_concurrency`` setting.
+
+    Returns:
+        JSON-serializable results.
+    """
+    load_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load_data(data_dir)
+        load_times.append(time.perf_counter() - start)
+
+    # The memory pass also warms up the executor (worker processes, caches)
+    tracemalloc.start()
+    try:
+        agent = agent_factory()
+        # Repeated passes would otherwise time memo hits, not execution
+        agent.executor.memo = ResultMemo(max_bytes=0)
+        failures = sum(not time_pipeline(agent, question)[1] for question in questions)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    try:
+        samples: dict[str, list[float]] = {stage: [] for stage in STAGES}
+        token_samples: dict[str, list[float]] = {kind: [] for kind in TOKEN_KINDS}
+        for _ in range(repeat):
+            for question in questions:
+                timings, _, tokens = time_pipeline(agent, question)
+                for stage, seconds in timings.items():
+                    samples[stage].append(seconds)
+                for kind, count in tokens.items():
+                    token_samples[kind].append(count)
+
+        batch = list(questions) * repeat
+        start = time.perf_counter()
+        responses = asyncio.run(agent.ask_many(batch, concurrency))
+        elapsed = time.perf_counter() - start
+        errors = sum(isinstance(response, Exception) for response in responses)
+        concurrency = concurrency or agent.max_concurrency
+    finally:
+        agent.close()
+
+    return {
+        "version": RESULTS_VERSION,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "language": agent.executor.language,
+        },
+        "questions": len(questions),
+        "repeat": repeat,
+        "failures": failures,
+        "load": summarize(load_times),
+        "stages": {stage: summarize(values) for stage, values in samples.items()},
+        "throughput": {
+            "concurrency": concurrency,
+            "questions": len(batch),
+            "errors": errors,
+            "qps": len(batch) / elapsed,
+        },
+        "peak_memory_mb": peak_bytes / 1024**2,
+        "speculative_candidates": agent.speculative_candidates,
+        "tokens": {kind: summarize(values) for kind, values in token_samples.items()},
+    }
+
+
+def compare(
+    current: dict[str, Any],
+    baseline: dict[str, Any],
+    *,
+    tolerance: float = 0.25,
+    prompt_tolerance: float = 0.05,
+) -> list[str]:
+    """List the regressions of a benchmark run against a baseline.
+
+    Args:
+        current: Results of the run.
+        baseline: Results it should not be worse than.
+        tolerance: Allowed relative slowdown, throughput loss or memory
+            growth.
+        prompt_tolerance: Allowed relative prompt growth (prompts are
+            deterministic, so this can be tight).
+
+    Returns:
+        One message per regression; empty if there are none.
+    """
+    # Results measured under other settings are not comparable
+    regressions = [
+        f"{setting} differs from the baseline "
+        f"({current.get(setting)!r} vs {baseline.get(setting)!r});"
+        " record a new baseline"
+        for setting in ("questions", "replay_latency")
+        if current.get(setting) != baseline.get(setting)
+    ]
+    if regressions:
+        return regressions
+
+    def check(
+        name: str,
+        value: float,
+        reference: float,
+        allowed: float,
+        min_delta: float = 0.0,
+    ) -> None:
+        if value > reference * (1 + allowed) and value - reference > min_delta:
+            regressions.append(f"{name}: {value:.4g} vs baseline {reference:.4g}")
+
+    check(
+        "load p50",
+        current["load"]["p50"],
+        baseline["load"]["p50"],
+        tolerance,
+        MIN_SECONDS_DELTA,
+    )
+    for stage in STAGES:
+        for statistic in ("p50", "p95"):
+            check(
+                f"{stage} {statistic}",
+                current["stages"][stage].get(statistic, 0.0),
+                baseline["stages"][stage].get(statistic, 0.0),
+                tolerance,
+                MIN_SECONDS_DELTA,
+            )
+    check(
+        "peak memory (MB)",
+        current["peak_memory_mb"],
+        baseline["peak_memory_mb"],
+        tolerance,
+        MIN_MEMORY_DELTA_MB,
+    )
+    # Speculation trades tokens for latency; compare with format_tradeoff
+    if current.get("speculative_candidates", 1) == baseline.get(
+        "speculative_candidates", 1
+    ):
+        for kind, tokens in current.get("tokens", {}).items():
+            reference = baseline.get("tokens", {}).get(kind)
+            if reference is not None and "mean" in reference:
+                check(
+                    f"{kind} tokens per question",
+                    tokens.get("mean", 0.0),
+                    reference["mean"],
+                    prompt_tolerance,
+                )
+    for stage, tokens in current.get("prompt_tokens", {}).items():
+        reference = baseline.get("prompt_tokens", {}).get(stage)
+        if reference is not None:
+            check(
+                f"{stage} prompt tokens",
+                tokens["mean"],
+                reference["mean"],
+                prompt_tolerance,
+            )
+
+    qps, reference_qps = current["throughput"]["qps"], baseline["throughput"]["qps"]
+    if qps < reference_qps * (1 - tolerance):
+        regressions.append(
+            f"throughput: {qps:.3g} q/s vs baseline {reference_qps:.3g} q/s"
+        )
+    if current["failures"] > baseline["failures"]:
+        regressions.append(
+            f"failed questions: {current['failures']} vs baseline "
+            f"{baseline['failures']}"
+        )
+    return regressions
+
+
+def format_tradeoff(current: dict[str, Any], baseline: dict[str, Any]) -> str | None:
+    """Compare the token cost and latency of two runs with different speculation.
+
+    Returns:
+        A short report, or None if both runs used the same number of
+        candidates (or the baseline predates token counts).
+    """
+    candidates = current.get("speculative_candidates", 1)
+    reference_candidates = baseline.get("speculative_candidates", 1)
+    if candidates == reference_candidates or "tokens" not in baseline:
+        return None
+
+    def change(value: float, reference: float) -> str:
+        if not reference:
+            return f"{value:.4g} vs {reference:.4g}"
+        return f"{value:.4g} vs {reference:.4g} ({(value / reference - 1) * 100:+.0f}%)"
+
+    lines = [
+        f"{candidates} candidates per generation call vs {reference_candidates} "
+        "in the baseline:"
+    ]
+    lines.extend(
+        f"- {kind} tokens per question: "
+        + change(current["tokens"][kind]["mean"], baseline["tokens"][kind]["mean"])
+        for kind in TOKEN_KINDS
+    )
+    lines.extend(
+        f"- total {statistic} ms: "
+        + change(
+            current["stages"]["total"][statistic] * 1000,
+            baseline["stages"]["total"][statistic] * 1000,
+        )
+        for statistic in ("p50", "p95", "p99")
+    )
+    lines.append(f"- failed questions: {current['failures']} vs {baseline['failures']}")
+    return "\n".join(lines)
+
+
+def format_report(results: dict[str, Any]) -> str:
+    """Render benchmark results as a short plain-text report."""
+    lines = [
+        f"{results['questions']} questions x {results['repeat']} passes, "
+        f"{results['failures']} failed",
+        "",
+        f"{'stage':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    ]
+    rows = [("load", results["load"])] + [
+        (stage, results["stages"][stage]) for stage in STAGES
+    ]
+    lines.extend(
+        f"{name:<10}"
+        + "".join(
+            f"{summary.get(statistic, 0.0) * 1000:>10.1f}"
+            for statistic in ("p50", "p95", "p99", "max")
+        )
+        for name, summary in rows
+    )
+    throughput = results["throughput"]
+    lines += [
+        "",
+        f"throughput: {throughput['qps']:.2f} questions/s at concurrency "
+        f"{throughput['concurrency']} ({throughput['errors']} errors)",
+        f"peak memory: {results['peak_memory_mb']:.1f} MB",
+    ]
+    if "tokens" in results:
+        tokens = results["tokens"]
+        lines.append(
+            f"tokens per question: {tokens['prompt'].get('mean', 0.0):.0f} prompt, "
+            f"{tokens['completion'].get('mean', 0.0):.0f} completion; candidates "
+            f"per generation call: {results['speculative_candidates']}"
+        )
+    for stage, tokens in results.get("prompt_tokens", {}).items():
+        lines.append(
+            f"{stage} prompt: {tokens['mean']:.0f} tokens mean, {tokens['max']:.0f} max"
+        )
+    if "replay" in results:
+        replay = results["replay"]
+        lines.append(
+            f"replay: {replay['exact_hits']} exact, {replay['fallback_hits']} "
+            f"by question, {replay['misses']} missed"
+        )
+    return "\n".join(lines)
@@ -23,7 +23,87 @@ class EnvironmentConfig(ModelConfig):
     """Development/production overrides."""
 
     data_dir: str = Field(default="data")
+    # Seconds between checks of data_dir for changed workbooks; 0 disables
+    # automatic refresh
+    data_refresh_interval_seconds: float = Field(default=5.0)
     log_level: str = Field(default="DEBUG")
+    # "console" (human-readable) or "json" (one object per line)
+    log_format: str = Field(default="console")
+    ask_max_concurrency: int = Field(default=8)
+    # Results of earlier turns kept per chat session for follow-up questions:
+    # memory budget per session, and number of sessions kept
+    session_max_mb: int = Field(default=32)
+    session_max_count: int = Field(default=100)
+    # Streamlit chat history: memory budget for the stored results of one
+    # browser session, and messages shown before "Show earlier messages"
+    ui_history_max_mb: int = Field(default=16)
+    ui_history_page_size: int = Field(default=20)
+    # Fill answers from a template returned with the code when possible,
+    # skipping the response formatting call
+    answer_templates_enabled: bool = Field(default=True)
+    # Speculative code generation: candidate programs requested in the one
+    # generation call (1 disables), sampled at speculative_temperature and run
+    # in parallel. "first" accepts the first candidate that succeeds,
+    # "majority" the one whose result most candidates agree on
+    speculative_candidates: int = Field(default=1)
+    speculative_temperature: float = Field(default=0.7)
+    speculative_accept: str = Field(default="first")
+    # Send only the schema parts a question needs with each code generation call
+    schema_pruning_enabled: bool = Field(default=True)
+    # Approximate token budget for execution results sent to the LLM
+    result_token_budget: int = Field(default=2000)
+
+    # HTTP API (python -m src.api)
+    api_host: str = Field(default="127.0.0.1")
+    api_port: int = Field(default=8000)
+
+    # Process-pool sandbox for generated code
+    sandbox_enabled: bool = Field(default=True)
+    sandbox_workers: int = Field(default=2)
+    sandbox_timeout_seconds: float = Field(default=30.0)
+    sandbox_cpu_seconds: float = Field(default=30.0)
+    sandbox_max_rss_mb: int = Field(default=2048)
+    sandbox_max_result_mb: int = Field(default=64)
+
+    # Engine running generated queries: "pandas" (Python code) or "duckdb"
+    # (SQL). The DuckDB engine needs the optional duckdb extra
+    execution_engine: str = Field(default="pandas")
+    duckdb_threads: int | None = Field(default=None)
+    duckdb_memory_limit: str | None = Field(default=None)
+    duckdb_timeout_seconds: float = Field(default=30.0)
+    duckdb_max_result_mb: int = Field(default=64)
+    # Read the base tables from the Parquet load snapshot instead of memory
+    duckdb_use_parquet: bool = Field(default=False)
+
+    # Generated code estimated to cost more than this is refused
+    max_code_cost: float = Field(default=1e9)
+
+    # OpenAI transport: client-side rate limits matching the model's quota
+    # (0 disables a limit), ceiling of the adaptive concurrency limit, retries
+    # with exponential backoff, and the keep-alive connection pool
+    llm_rpm_limit: int = Field(default=0)
+    llm_tpm_limit: int = Field(default=0)
+    llm_max_concurrency: int = Field(default=16)
+    llm_max_retries: int = Field(default=5)
+    llm_backoff_base_seconds: float = Field(default=0.5)
+    llm_backoff_max_seconds: float = Field(default=30.0)
+    llm_pool_connections: int = Field(default=20)
+    llm_keepalive_seconds: float = Field(default=30.0)
+    llm_timeout_seconds: float = Field(default=120.0)
+
+    # Index of answered questions: code is reused for the same question with
+    # other entity values, similar questions become few-shot examples
+    example_index_enabled: bool = Field(default=True)
+    example_index_path: str = Field(default=".cache/examples.sqlite3")
+    example_index_max_entries: int = Field(default=5000)
+    example_few_shot_count: int = Field(default=3)
+    example_few_shot_min_similarity: float = Field(default=0.5)
+
+    # Persistent LLM response cache
+    llm_cache_enabled: bool = Field(default=True)
+    llm_cache_path: str = Field(default=".cache/llm_responses.sqlite3")
+    llm_cache_ttl_seconds: int = Field(default=7 * 24 * 3600)
+    llm_cache_max_entries: int = Field(default=10_000)
 
 
 def get_settings() -> EnvironmentConfig:
@@ -1,6 +1,6 @@
 """Data loaders package for loading and managing Excel data."""
 
 from src.dataloaders.excel_loader import DataContext, load_data
+from src.dataloaders.refresh import DataRefresher
 
-__all__ = ["DataContext", "load_data"]
-
+__all__ = ["DataContext", "DataRefresher", "load_data"]
@@ -0,0 +1,91 @@
+"""Materialized revenue aggregates built once at load time.
+
+Most aggregate questions are revenue grouped by client, country, service or
+month for some year. Pre-computing those groupings turns the generated code
+into a filter on a frame of a few dozen rows instead of a regroup of
+``merged``.
+"""
+
+import pandas as pd
+
+# Names of the aggregate frames, as exposed to generated code
+AGGREGATE_TABLES = (
+    "revenue_by_client",
+    "revenue_by_country",
+    "revenue_by_service",
+    "revenue_by_month",
+)
+
+
+def add_line_totals(merged: pd.DataFrame) -> pd.DataFrame:
+    """Add ``line_total`` (quantity * unit_price * (1 + tax_rate)) and its USD value.
+
+    Args:
+        merged: Pre-joined frame with line item and invoice columns.
+
+    Returns:
+        The same frame, modified in place.
+    """
+    merged["line_total"] = (
+        merged["quantity"] * merged["unit_price"] * (1 + merged["tax_rate"])
+    )
+    return add_usd_totals(merged)
+
+
+def add_usd_totals(merged: pd.DataFrame) -> pd.DataFrame:
+    """Add ``line_total_usd`` (line total converted with the invoice's FX rate).
+
+    Args:
+        merged: Pre-joined frame with ``line_total`` and ``fx_rate_to_usd``.
+
+    Returns:
+        The same frame, modified in place.
+    """
+    merged["line_total_usd"] = merged["line_total"] * merged["fx_rate_to_usd"]
+    return merged
+
+
+def build_aggregates(merged: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """Build the revenue aggregates from the pre-joined frame.
+
+    Every aggregate has a ``year`` column plus ``total`` (sum of line totals
+    in invoice currency, including tax) and ``total_usd``. Clients without
+    invoices do not appear.
+
+    Args:
+        merged: Pre-joined frame with ``line_total`` and ``line_total_usd``.
+
+    Returns:
+        Dict mapping aggregate names to DataFrames.
+    """
+    billed = merged.dropna(subset=["invoice_date", "line_total"])
+    billed = billed.assign(
+        year=billed["invoice_date"].dt.year,
+        month=billed["invoice_date"].dt.to_period("M").dt.to_timestamp(),
+    )
+    totals = {
+        "total": pd.NamedAgg("line_total", "sum"),
+        "total_usd": pd.NamedAgg("line_total_usd", "sum"),
+        "invoice_count": pd.NamedAgg("invoice_id", "nunique"),
+        "line_count": pd.NamedAgg("line_id", "count"),
+    }
+
+    def cube(keys: list[str], **extra: pd.NamedAgg) -> pd.DataFrame:
+        return (
+            billed.groupby(keys, sort=True, observed=True)
+            .agg(**totals, **extra)
+            .reset_index()
+        )
+
+    return {
+        "revenue_by_client": cube(
+            ["client_id", "client_name", "industry", "country", "year"]
+        ),
+        "revenue_by_country": cube(
+            ["country", "year"], client_count=pd.NamedAgg("client_id", "nunique")
+        ),
+        "revenue_by_service": cube(
+            ["service_name", "year"], quantity=pd.NamedAgg("quantity", "sum")
+        ),
+        "revenue_by_month": cube(["year", "month"]),
+    }
@@ -1,9 +1,42 @@
 """Excel data loader for invoice data."""
 
-from dataclasses import dataclass
+import multiprocessing
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+from openpyxl import load_workbook
+from pandas.api.extensions import ExtensionDtype
+
+from src.dataloaders.aggregates import add_line_totals, build_aggregates
+from src.dataloaders.indexes import TableIndexes
+from src.dataloaders.snapshot import (
+    SOURCE_FILES,
+    SnapshotCache,
+    SnapshotFile,
+    fingerprint_file,
+)
+
+# Default snapshot location, relative to the data directory
+SNAPSHOT_DIRNAME = ".snapshot"
+
+# Source workbook -> table it holds
+SOURCE_TABLES = {
+    "Clients.xlsx": "clients",
+    "Invoices.xlsx": "invoices",
+    "InvoiceLineItems.xlsx": "line_items",
+}
+
+# Rows converted to typed columns at a time when streaming a worksheet
+STREAM_CHUNK_ROWS = 10_000
+
+# Workbooks are parsed in worker processes only when at least two of them are
+# this large; openpyxl holds the GIL, and starting a worker costs more than
+# parsing a small workbook
+PARALLEL_READ_MIN_BYTES = 4 * 1024**2
 
 
 @dataclass
@@ -15,6 +48,19 @@ class DataContext:
     line_items: pd.DataFrame
     # Pre-merged master dataframe for complex queries
     merged: pd.DataFrame
+    # Materialized revenue aggregates (revenue_by_client, ...)
+    aggregates: dict[str, pd.DataFrame] = field(default_factory=dict)
+    # Increases by one with every refresh of the loaded data
+    version: int = 0
+    # Primary-key, foreign-key and date indexes over the tables
+    indexes: TableIndexes | None = field(default=None, init=False, repr=False)
+    # Snapshot files holding exactly these tables, as this load read or wrote
+    # them; empty if the snapshot is off or could not be saved
+    snapshot_files: dict[str, SnapshotFile] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self) -> None:
+        """Build the indexes for the loaded tables."""
+        self.indexes = TableIndexes.build(self.get_dataframes_dict())
 
     def get_dataframes_dict(self) -> dict[str, pd.DataFrame]:
         """Return a dict of dataframes for code execution context."""
@@ -23,28 +69,248 @@ class DataContext:
             "invoices": self.invoices,
             "line_items": self.line_items,
             "merged": self.merged,
+            **self.aggregates,
         }
 
 
-def load_data(data_dir: str | Path) -> DataContext:
+def load_data(
+    data_dir: str | Path,
+    snapshot_dir: str | Path | None = None,
+    *,
+    use_snapshot: bool = True,
+) -> DataContext:
     """Load all Excel files and create DataContext.
 
+    The loaded tables are cached as a Parquet snapshot; later loads read the
+    snapshot instead of re-parsing Excel as long as the source files are
+    unchanged.
+
     Args:
         data_dir: Path to the directory containing Excel files.
+        snapshot_dir: Directory for the Parquet snapshot. Defaults to
+            ``<data_dir>/.snapshot``.
+        use_snapshot: Whether to read and write the snapshot at all.
 
     Returns:
         DataContext with all loaded and processed dataframes.
     """
     data_path = Path(data_dir)
 
-    # Load individual tables
-    clients = pd.read_excel(data_path / "Clients.xlsx")
-    invoices = pd.read_excel(data_path / "Invoices.xlsx")
-    line_items = pd.read_excel(data_path / "InvoiceLineItems.xlsx")
+    if not use_snapshot:
+        return build_context(*_read_tables(data_path))
+
+    cache = SnapshotCache(snapshot_dir or data_path / SNAPSHOT_DIRNAME)
+    loaded = cache.load_with_files(data_path)
+    if loaded is not None:
+        tables, files = loaded
+        return DataContext(
+            clients=tables["clients"],
+            invoices=tables["invoices"],
+            line_items=tables["line_items"],
+            merged=tables["merged"],
+            aggregates=build_aggregates(tables["merged"]),
+            snapshot_files=files,
+        )
+
+    # Fingerprint before reading so an edit racing the load invalidates it
+    sources = {name: fingerprint_file(data_path / name) for name in SOURCE_FILES}
+    context = build_context(*_read_tables(data_path))
+    context.snapshot_files = cache.save(sources, context.get_dataframes_dict())
+    return context
+
+
+def _read_tables(data_path: Path) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Parse the source workbooks, in parallel processes if they are large.
+
+    Args:
+        data_path: Directory containing the Excel files.
+
+    Returns:
+        Tuple of (clients, invoices, line_items) DataFrames.
+    """
+    large = [
+        name
+        for name in SOURCE_FILES
+        if (data_path / name).stat().st_size >= PARALLEL_READ_MIN_BYTES
+    ]
+    if len(large) < 2:  # noqa: PLR2004
+        clients, invoices, line_items = (
+            read_source(data_path, n) for n in SOURCE_FILES
+        )
+        return clients, invoices, line_items
+
+    # Spawned workers: forking a process that runs threads (the HTTP API,
+    # the refresh poller) can deadlock the child
+    with ProcessPoolExecutor(
+        max_workers=len(large), mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        futures = {name: pool.submit(read_source, data_path, name) for name in large}
+        tables = {
+            name: futures[name].result()
+            if name in futures
+            else read_source(data_path, name)
+            for name in SOURCE_FILES
+        }
+    clients, invoices, line_items = (tables[name] for name in SOURCE_FILES)
+    return clients, invoices, line_items
+
 
-    # Ensure date columns are proper datetime types
-    invoices["invoice_date"] = pd.to_datetime(invoices["invoice_date"])
-    invoices["due_date"] = pd.to_datetime(invoices["due_date"])
+def read_source(data_path: Path, file_name: str) -> pd.DataFrame:
+    """Parse one source workbook into its table.
+
+    Args:
+        data_path: Directory containing the Excel files.
+        file_name: Workbook to read, one of ``SOURCE_FILES``.
+
+    Returns:
+        The table, with date columns converted to datetimes.
+    """
+    table = read_excel_streaming(data_path / file_name)
+    if SOURCE_TABLES[file_name] == "invoices":
+        # Ensure date columns are proper datetime types
+        table["invoice_date"] = pd.to_datetime(table["invoice_date"])
+        table["due_date"] = pd.to_datetime(table["due_date"])
+    return table
+
+
+def read_excel_streaming(
+    path: str | Path, chunk_rows: int = STREAM_CHUNK_ROWS
+) -> pd.DataFrame:
+    """Read the first worksheet of a workbook in bounded chunks.
+
+    Unlike ``pd.read_excel``, the workbook is opened in openpyxl read-only
+    mode, so cells are never materialized as a full object tree. Every chunk
+    is converted to typed columns as soon as it is read, and its columns are
+    copied out so the chunk itself is freed. Column dtypes are inferred from
+    the first chunk; a later chunk that does not fit (e.g. blanks in an
+    integer column) widens the column's dtype for every chunk, never just its
+    own. The chunks are stitched together one column at a time, keeping peak
+    memory close to the size of the final DataFrame.
+
+    Args:
+        path: Workbook to read. The first row is the header.
+        chunk_rows: Maximum number of raw rows held in memory at once.
+
+    Returns:
+        DataFrame with the worksheet contents.
+    """
+    chunks = _iter_typed_chunks(Path(path), chunk_rows)
+    header = next(chunks, None)
+    if header is None:
+        return pd.DataFrame()
+
+    columns: dict[str, list[pd.Series]] = {name: [] for name in header.columns}
+    dtypes: dict[str, np.dtype | ExtensionDtype] = {}
+    for chunk in chunks:
+        for name in header.columns:
+            values = chunk[name]
+            dtypes[name] = (
+                _common_dtype(dtypes[name], values) if name in dtypes else values.dtype
+            )
+            # A copy, so the chunk's 2-D blocks are not kept alive by views
+            columns[name].append(values.copy())
+        del chunk
+
+    if not dtypes:
+        return header
+
+    data: dict[str, pd.Series] = {}
+    for name in header.columns:
+        parts = [part.astype(dtypes[name]) for part in columns.pop(name)]
+        data[name] = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        # Drop the chunk copies as soon as each column is assembled
+        del parts
+    return pd.DataFrame(data, copy=False)
+
+
+def _common_dtype(
+    dtype: np.dtype | ExtensionDtype, values: pd.Series
+) -> np.dtype | ExtensionDtype:
+    """Widen a column's dtype, if needed, to also hold a chunk's values.
+
+    Args:
+        dtype: Dtype of the column so far.
+        values: The column's values in the next chunk.
+
+    Returns:
+        The dtype every chunk of the column is cast to.
+    """
+    if values.dtype == dtype:
+        return dtype
+    if values.isna().all():
+        # Blanks only: missing values need a float column instead of ints
+        if dtype.kind in "iu":
+            return np.dtype("float64")
+        return np.dtype(object) if dtype.kind == "b" else dtype
+    other = values.dtype
+    if (
+        isinstance(dtype, np.dtype)
+        and isinstance(other, np.dtype)
+        and dtype.kind in "iuf"
+        and other.kind in "iuf"
+    ):
+        return np.result_type(dtype, other)
+    return np.dtype(object)
+
+
+def _iter_typed_chunks(path: Path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yield an empty header frame followed by typed chunks of worksheet rows.
+
+    Args:
+        path: Workbook to read.
+        chunk_rows: Maximum number of rows per chunk.
+
+    Yields:
+        First an empty DataFrame carrying the column names, then one
+        DataFrame per chunk of non-empty rows.
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header_row = next(rows, None)
+        if header_row is None:
+            return
+        header = [str(name) for name in header_row]
+        padding = (None,) * len(header)
+        yield pd.DataFrame(columns=header)
+
+        buffer: list[tuple[object, ...]] = []
+        for row in rows:
+            # Read-only mode can report trailing rows that are entirely blank
+            if all(value is None for value in row):
+                continue
+            # Trailing blank cells may be left out of a row
+            buffer.append((*row, *padding)[: len(header)])
+            if len(buffer) >= chunk_rows:
+                yield pd.DataFrame.from_records(buffer, columns=header)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame.from_records(buffer, columns=header)
+    finally:
+        workbook.close()
+
+
+def build_context(
+    clients: pd.DataFrame,
+    invoices: pd.DataFrame,
+    line_items: pd.DataFrame,
+    version: int = 0,
+) -> DataContext:
+    """Derive the pre-computed views and assemble the DataContext.
+
+    Args:
+        clients: Clients table.
+        invoices: Invoices table.
+        line_items: Line items table.
+        version: Version of the resulting context.
+
+    Returns:
+        DataContext with the derived ``merged`` frame and aggregates.
+    """
+    # Invoices are kept in date order so date ranges are binary searches
+    invoices = invoices.sort_values(
+        ["invoice_date", "invoice_id"], kind="stable", ignore_index=True
+    )
 
     # Create pre-merged master dataframe for complex queries
     merged = (
@@ -53,14 +319,13 @@ def load_data(data_dir: str | Path) -> DataContext:
     )
 
     # Pre-compute line_total column (quantity * unit_price * (1 + tax_rate))
-    merged["line_total"] = (
-        merged["quantity"] * merged["unit_price"] * (1 + merged["tax_rate"])
-    )
+    add_line_totals(merged)
 
     return DataContext(
         clients=clients,
         invoices=invoices,
         line_items=line_items,
         merged=merged,
+        aggregates=build_aggregates(merged),
+        version=version,
     )
-
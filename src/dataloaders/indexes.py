@@ -0,0 +1,101 @@
+"""Primary-key, foreign-key and date indexes over the loaded tables.
+
+The DataFrames exposed to generated code keep their RangeIndex so ordinary
+pandas code (column access, merges) behaves as usual; the indexes are kept
+alongside and map keys to row positions, so single-entity lookups and date
+ranges avoid full boolean-mask scans.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Tables the indexes are built from, with the columns they need
+INDEXED_COLUMNS: dict[str, tuple[str, ...]] = {
+    "clients": ("client_id", "client_name"),
+    "invoices": ("invoice_id", "client_id", "invoice_date"),
+    "merged": ("invoice_id", "line_id"),
+}
+INDEXED_TABLES = tuple(INDEXED_COLUMNS)
+
+
+def _positions(
+    frame: pd.DataFrame, column: str, keep: pd.Series | None = None
+) -> dict[str, np.ndarray]:
+    """Map each key of a column to the (ascending) row positions holding it.
+
+    Rows where ``keep`` is False are left out; the positions still refer to
+    rows of the whole frame.
+    """
+    if keep is None:
+        groups = frame.groupby(column, sort=False).indices
+        return {str(key): np.asarray(rows) for key, rows in groups.items()}
+    kept = np.flatnonzero(keep.to_numpy(dtype=bool))
+    groups = frame[keep].groupby(column, sort=False).indices
+    return {str(key): kept[rows] for key, rows in groups.items()}
+
+
+@dataclass(frozen=True)
+class TableIndexes:
+    """Key to row-position maps for clients, invoices and merged line items."""
+
+    # Primary keys
+    client_by_id: dict[str, int]
+    invoice_by_id: dict[str, int]
+    # Lower-cased client_name -> client_id
+    client_id_by_name: dict[str, str]
+    # Foreign keys
+    invoices_by_client: dict[str, np.ndarray]
+    merged_by_invoice: dict[str, np.ndarray]
+    # Invoice positions ordered by invoice_date, each position's rank in that
+    # order, and the dates in that order
+    invoice_date_order: np.ndarray
+    invoice_date_rank: np.ndarray
+    sorted_invoice_dates: np.ndarray
+
+    @classmethod
+    def build(cls, dataframes: dict[str, pd.DataFrame]) -> "TableIndexes | None":
+        """Build the indexes.
+
+        Args:
+            dataframes: Loaded DataFrames by name.
+
+        Returns:
+            TableIndexes, or None if any of the indexed tables or columns is
+            missing (generated code then falls back to plain pandas).
+        """
+        if any(
+            name not in dataframes or not set(columns) <= set(dataframes[name].columns)
+            for name, columns in INDEXED_COLUMNS.items()
+        ):
+            return None
+        clients = dataframes["clients"]
+        invoices = dataframes["invoices"]
+        merged = dataframes["merged"]
+
+        dates = invoices["invoice_date"].to_numpy(dtype="datetime64[ns]")
+        # load_data sorts invoices by date, making this the identity; the
+        # stable sort keeps it correct for any other row order
+        order = np.argsort(dates, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        return cls(
+            client_by_id={str(k): i for i, k in enumerate(clients["client_id"])},
+            invoice_by_id={str(k): i for i, k in enumerate(invoices["invoice_id"])},
+            client_id_by_name={
+                str(name).lower(): str(client_id)
+                for name, client_id in zip(
+                    clients["client_name"], clients["client_id"], strict=True
+                )
+            },
+            invoices_by_client=_positions(invoices, "client_id"),
+            # The left merge gives invoices without line items one row with
+            # no line_id; those rows are not line items
+            merged_by_invoice=_positions(
+                merged, "invoice_id", keep=merged["line_id"].notna()
+            ),
+            invoice_date_order=order,
+            invoice_date_rank=rank,
+            sorted_invoice_dates=dates[order],
+        )
@@ -0,0 +1,310 @@
+"""Incremental refresh of the loaded data.
+
+The source directory is polled for changed workbooks; only those are parsed
+again. When rows were only appended at the end of the invoice and line item
+workbooks (the usual way the data grows), the new rows are merged on their own
+and appended to ``merged`` instead of re-running both merges over every row.
+Anything else (edited, moved or deleted rows, changed clients) rebuilds the
+derived frames from the tables.
+
+Every refresh produces a new :class:`DataContext` with a higher version. The
+old context is never modified, so requests already running on it finish on
+consistent data while the new one is published.
+"""
+
+import threading
+from collections.abc import Callable
+from pathlib import Path
+
+import pandas as pd
+import structlog
+
+from src.dataloaders.aggregates import add_line_totals, build_aggregates
+from src.dataloaders.excel_loader import (
+    SNAPSHOT_DIRNAME,
+    SOURCE_TABLES,
+    DataContext,
+    build_context,
+    read_source,
+)
+from src.dataloaders.snapshot import (
+    SOURCE_FILES,
+    SnapshotCache,
+    fingerprint_file,
+    revalidate_file,
+)
+
+logger = structlog.get_logger(__name__)
+
+# Tables refreshed incrementally -> (key column, row order kept in memory;
+# None for the workbook order)
+APPEND_TABLES: dict[str, tuple[str, list[str] | None]] = {
+    "invoices": ("invoice_id", ["invoice_date", "invoice_id"]),
+    "line_items": ("line_id", None),
+}
+
+
+def appended_rows(
+    old: pd.DataFrame,
+    new: pd.DataFrame,
+    key: str,
+    sort_by: list[str] | None = None,
+) -> pd.DataFrame | None:
+    """Return the rows appended at the end of a workbook's table.
+
+    Args:
+        old: Table as previously loaded.
+        new: Table as read now, in workbook order.
+        key: Unique key column.
+        sort_by: Columns ``old`` was (stably) sorted by after loading, or
+            None if it is in workbook order.
+
+    Returns:
+        The rows after the previously loaded ones, or None if any previously
+        loaded row was changed, moved or removed, or a new row reuses a key.
+    """
+    rows = len(old)
+    if list(old.columns) != list(new.columns) or len(new) < rows:
+        return None
+    try:
+        head = new.iloc[:rows].astype(old.dtypes.to_dict())
+    except (TypeError, ValueError):
+        return None
+    if sort_by is not None:
+        head = head.sort_values(sort_by, kind="stable", ignore_index=True)
+    if not head.reset_index(drop=True).equals(old.reset_index(drop=True)):
+        return None
+    added = new.iloc[rows:].reset_index(drop=True)
+    if added[key].duplicated().any() or old[key].isin(added[key]).any():
+        return None
+    return added
+
+
+def extend_merged(
+    context: DataContext,
+    line_items: pd.DataFrame,
+    new_invoices: pd.DataFrame,
+    new_line_items: pd.DataFrame,
+) -> pd.DataFrame:
+    """Append the rows for new invoices and line items to ``merged``.
+
+    The result has the same rows as merging the updated tables from scratch
+    (clients left-joined to invoices left-joined to line items), though not
+    in the same order.
+
+    Args:
+        context: Context holding the previous tables and ``merged``.
+        line_items: Updated line items table.
+        new_invoices: Invoices appended since ``context`` was built.
+        new_line_items: Line items appended since ``context`` was built.
+
+    Returns:
+        New pre-joined frame; ``context.merged`` is left untouched.
+    """
+    clients = context.clients
+    merged = context.merged
+    parts = []
+    if len(new_invoices):
+        # New invoices with all their line items, old or new
+        parts.append(
+            clients.merge(new_invoices, on="client_id").merge(
+                line_items, on="invoice_id", how="left"
+            )
+        )
+    items_of_old_invoices = new_line_items[
+        ~new_line_items["invoice_id"].isin(new_invoices["invoice_id"])
+    ]
+    if len(items_of_old_invoices):
+        parts.append(
+            clients.merge(context.invoices, on="client_id").merge(
+                items_of_old_invoices, on="invoice_id"
+            )
+        )
+    if not parts:
+        return merged
+
+    # Left joins left a placeholder row for clients without invoices and for
+    # invoices without line items; drop those that now have rows
+    placeholders = (
+        merged["invoice_id"].isna()
+        & merged["client_id"].isin(new_invoices["client_id"])
+    ) | (
+        merged["line_id"].isna()
+        & merged["invoice_id"].isin(items_of_old_invoices["invoice_id"])
+    )
+    added = add_line_totals(pd.concat(parts, ignore_index=True))
+    extended = pd.concat(
+        [merged[~placeholders], added.reindex(columns=merged.columns)],
+        ignore_index=True,
+    )
+    # Placeholders made integer columns float; without them, merging from
+    # scratch would keep the tables' dtypes
+    dtypes = {**context.invoices.dtypes.to_dict(), **line_items.dtypes.to_dict()}
+    restored = {
+        column: dtype
+        for column, dtype in dtypes.items()
+        if column in extended
+        and extended[column].dtype != dtype
+        and extended[column].notna().all()
+    }
+    return extended.astype(restored) if restored else extended
+
+
+class DataRefresher:
+    """Watches the source workbooks and publishes refreshed DataContexts."""
+
+    def __init__(
+        self,
+        data_dir: str | Path,
+        context: DataContext,
+        on_refresh: Callable[[DataContext], None] | None = None,
+        snapshot_dir: str | Path | None = None,
+        *,
+        use_snapshot: bool = True,
+    ) -> None:
+        """Initialize the refresher.
+
+        Args:
+            data_dir: Directory containing the Excel files.
+            context: Context currently loaded from them.
+            on_refresh: Called with every newly published context.
+            snapshot_dir: Directory for the Parquet snapshot. Defaults to
+                ``<data_dir>/.snapshot``.
+            use_snapshot: Whether to rewrite the snapshot after a refresh.
+        """
+        self.data_path = Path(data_dir)
+        self.on_refresh = on_refresh
+        self._cache = (
+            SnapshotCache(snapshot_dir or self.data_path / SNAPSHOT_DIRNAME)
+            if use_snapshot
+            else None
+        )
+        self._context = context
+        self._sources = {
+            name: fingerprint_file(self.data_path / name) for name in SOURCE_FILES
+        }
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def context(self) -> DataContext:
+        """The most recently published context."""
+        return self._context
+
+    def changed_sources(self) -> list[str]:
+        """Return the source files whose contents changed since the last load."""
+        return [
+            name
+            for name, fingerprint in self._sources.items()
+            if revalidate_file(self.data_path / name, fingerprint) is None
+        ]
+
+    def refresh(self) -> DataContext | None:
+        """Reload the changed workbooks and publish a new context.
+
+        Returns:
+            The new context, or None if no source file changed.
+
+        Raises:
+            OSError: If a changed workbook cannot be read.
+        """
+        with self._lock:
+            changed = self.changed_sources()
+            if not changed:
+                return None
+
+            # Fingerprint before reading so an edit racing the load is
+            # picked up by the next refresh
+            sources = dict(self._sources)
+            sources.update(
+                {name: fingerprint_file(self.data_path / name) for name in changed}
+            )
+            tables = {
+                SOURCE_TABLES[name]: read_source(self.data_path, name)
+                for name in changed
+            }
+            context = self._build(self._context, tables)
+
+            self._context = context
+            self._sources = sources
+            if self.on_refresh is not None:
+                self.on_refresh(context)
+            if self._cache is not None:
+                self._cache.save(sources, context.get_dataframes_dict())
+            return context
+
+    def start(self, interval_seconds: float) -> None:
+        """Poll for changes in a background thread.
+
+        Args:
+            interval_seconds: Time between checks.
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._poll,
+            args=(interval_seconds,),
+            name="data-refresher",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the polling thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _poll(self, interval_seconds: float) -> None:
+        """Refresh every interval until stopped."""
+        while not self._stop.wait(interval_seconds):
+            try:
+                self.refresh()
+            except Exception:
+                # A workbook mid-save is unreadable, and a malformed one may
+                # fail anywhere in parsing; keep serving the current data and
+                # retry on the next tick
+                logger.exception("data refresh failed")
+
+    @staticmethod
+    def _build(old: DataContext, tables: dict[str, pd.DataFrame]) -> DataContext:
+        """Build the next context from the old one and the re-read tables."""
+        version = old.version + 1
+        clients = tables.get("clients", old.clients)
+        invoices = tables.get("invoices", old.invoices)
+        line_items = tables.get("line_items", old.line_items)
+        if "clients" in tables:
+            return build_context(clients, invoices, line_items, version=version)
+
+        appended = {
+            name: appended_rows(getattr(old, name), table, *APPEND_TABLES[name])
+            for name, table in tables.items()
+        }
+        if any(rows is None for rows in appended.values()):
+            return build_context(clients, invoices, line_items, version=version)
+
+        empty = {name: getattr(old, name).iloc[:0] for name in APPEND_TABLES}
+        new_invoices = appended.get("invoices", empty["invoices"])
+        new_line_items = appended.get("line_items", empty["line_items"])
+        if len(new_invoices):
+            # Keep invoices in date order (see build_context)
+            invoices = pd.concat([old.invoices, new_invoices]).sort_values(
+                ["invoice_date", "invoice_id"], kind="stable", ignore_index=True
+            )
+        else:
+            invoices = old.invoices
+        if not len(new_line_items):
+            line_items = old.line_items
+
+        merged = extend_merged(old, line_items, new_invoices, new_line_items)
+        return DataContext(
+            clients=old.clients,
+            invoices=invoices,
+            line_items=line_items,
+            merged=merged,
+            aggregates=build_aggregates(merged),
+            version=version,
+        )
@@ -0,0 +1,311 @@
+"""Columnar snapshot cache for loaded Excel data.
+
+Parsing the source workbooks is the slowest part of start-up, so the loaded
+tables (and the derived ``merged`` frame) are written to Parquet next to a
+manifest describing the source files they came from. A snapshot is reused
+only while every source file still matches its recorded size, mtime and
+content hash.
+
+The manifest is written last and records the identity of every table file, so
+a reader in another process never mixes tables from two different saves. The
+same identities tell a consumer of the files themselves (DuckDB) whether they
+still hold the tables one load read or wrote.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+SOURCE_FILES = ("Clients.xlsx", "Invoices.xlsx", "InvoiceLineItems.xlsx")
+SNAPSHOT_TABLES = ("clients", "invoices", "line_items", "merged")
+# Bump whenever the stored frames change (2: merged.line_total_usd,
+# 3: invoices sorted by invoice_date, 4: manifest records the table files)
+SNAPSHOT_FORMAT_VERSION = 4
+MANIFEST_NAME = "manifest.json"
+
+_HASH_CHUNK_BYTES = 1 << 20
+
+
+@dataclass(frozen=True)
+class SourceFingerprint:
+    """Identity of a source file at the time a snapshot was written."""
+
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+def _parse_fingerprint(recorded: object) -> SourceFingerprint | None:
+    """Read a fingerprint from the manifest; None if it is malformed."""
+    if not isinstance(recorded, dict):
+        return None
+    try:
+        return SourceFingerprint(
+            size=int(recorded["size"]),
+            mtime_ns=int(recorded["mtime_ns"]),
+            sha256=str(recorded["sha256"]),
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _file_identity(stat: os.stat_result) -> list[int]:
+    """Identify one written version of a file (replacing it changes this)."""
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+
+@dataclass(frozen=True)
+class SnapshotFile:
+    """A table file of the snapshot, as one load read or wrote it."""
+
+    path: Path
+    # Inode, size and mtime of the file when it was read or written
+    identity: tuple[int, ...]
+
+    def is_current(self) -> bool:
+        """Whether the file on disk is still the one read or written."""
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return False
+        return tuple(_file_identity(stat)) == self.identity
+
+
+def hash_file(path: Path) -> str:
+    """Compute the SHA-256 of a file without reading it into memory at once.
+
+    Args:
+        path: File to hash.
+
+    Returns:
+        Hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(_HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint_file(path: Path) -> SourceFingerprint:
+    """Build the fingerprint (size, mtime and content hash) of a file.
+
+    Args:
+        path: File to fingerprint.
+
+    Returns:
+        SourceFingerprint for the current file contents.
+    """
+    stat = path.stat()
+    return SourceFingerprint(
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        sha256=hash_file(path),
+    )
+
+
+def revalidate_file(
+    path: Path, expected: SourceFingerprint
+) -> SourceFingerprint | None:
+    """Check whether a file still matches a fingerprint.
+
+    Size and mtime are compared first; the content hash is only computed
+    when the mtime changed but the size did not.
+
+    Args:
+        path: File on disk.
+        expected: Fingerprint taken earlier.
+
+    Returns:
+        The current fingerprint if the contents are unchanged, otherwise None.
+    """
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    if stat.st_size != expected.size:
+        return None
+    if stat.st_mtime_ns == expected.mtime_ns:
+        return expected
+    if hash_file(path) != expected.sha256:
+        return None
+    return SourceFingerprint(
+        size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha256=expected.sha256
+    )
+
+
+class SnapshotCache:
+    """Parquet snapshot of the loaded tables keyed on source fingerprints."""
+
+    def __init__(self, snapshot_dir: str | Path) -> None:
+        """Initialize the cache.
+
+        Args:
+            snapshot_dir: Directory holding the Parquet files and manifest.
+        """
+        self.snapshot_dir = Path(snapshot_dir)
+
+    @property
+    def manifest_path(self) -> Path:
+        """Path of the manifest file."""
+        return self.snapshot_dir / MANIFEST_NAME
+
+    def load(self, data_path: Path) -> dict[str, pd.DataFrame] | None:
+        """Load the snapshot if it is still valid for the source files.
+
+        Args:
+            data_path: Directory containing the source Excel files.
+
+        Returns:
+            Dict of table name to DataFrame, or None if the snapshot is
+            missing, stale or unreadable.
+        """
+        loaded = self.load_with_files(data_path)
+        return loaded[0] if loaded is not None else None
+
+    def load_with_files(
+        self, data_path: Path
+    ) -> tuple[dict[str, pd.DataFrame], dict[str, SnapshotFile]] | None:
+        """Load the snapshot like :meth:`load`, with the files it came from.
+
+        Args:
+            data_path: Directory containing the source Excel files.
+
+        Returns:
+            The tables and the file each was read from, or None if the
+            snapshot is missing, stale or unreadable.
+        """
+        manifest = self._read_manifest()
+        if manifest is None:
+            return None
+
+        recorded = manifest.get("sources")
+        files = manifest.get("tables")
+        if not isinstance(recorded, dict) or not isinstance(files, dict):
+            return None
+        expected: dict[str, SourceFingerprint] = {}
+        refreshed: dict[str, SourceFingerprint] = {}
+        for name in SOURCE_FILES:
+            fingerprint = _parse_fingerprint(recorded.get(name))
+            current = fingerprint and revalidate_file(data_path / name, fingerprint)
+            if fingerprint is None or current is None:
+                return None
+            expected[name] = fingerprint
+            refreshed[name] = current
+
+        tables = self._read_tables(files)
+        if tables is None:
+            return None
+
+        # Sources were touched but not modified; record the new mtimes so the
+        # next load can skip hashing again.
+        if refreshed != expected:
+            self._write_manifest(refreshed, files)
+
+        return tables, self._snapshot_files(files)
+
+    def save(
+        self,
+        sources: dict[str, SourceFingerprint],
+        tables: dict[str, pd.DataFrame],
+    ) -> dict[str, SnapshotFile]:
+        """Write a new snapshot for the given tables.
+
+        Failures are swallowed: a snapshot is an optimization and must never
+        prevent the data from loading.
+
+        Args:
+            sources: Fingerprints of the source files, taken before they were
+                read so a concurrent edit can never be recorded as loaded.
+            tables: Dict of table name to DataFrame to persist.
+
+        Returns:
+            The file written for every table, or an empty dict if the save
+            failed (old files may then be left behind).
+        """
+        try:
+            self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+            # Invalidate first so a crash mid-write never leaves a manifest
+            # pointing at a mix of old and new tables.
+            self.manifest_path.unlink(missing_ok=True)
+            files: dict[str, list[int]] = {}
+            for table in SNAPSHOT_TABLES:
+                target = self.snapshot_dir / f"{table}.parquet"
+                tmp = target.with_suffix(f".parquet.{os.getpid()}.tmp")
+                tables[table].to_parquet(tmp, index=False)
+                files[table] = _file_identity(tmp.stat())
+                tmp.replace(target)
+
+            self._write_manifest(sources, files)
+        except (OSError, ValueError):
+            return {}
+        return self._snapshot_files(files)
+
+    def _read_tables(
+        self, files: dict[str, list[int]]
+    ) -> dict[str, pd.DataFrame] | None:
+        """Read the table files, checking each against the manifest.
+
+        Args:
+            files: Identity of every table file recorded in the manifest.
+
+        Returns:
+            Dict of table name to DataFrame, or None if a file is unreadable
+            or was written by another save.
+        """
+        tables = {}
+        for table in SNAPSHOT_TABLES:
+            try:
+                with (self.snapshot_dir / f"{table}.parquet").open("rb") as f:
+                    # A save in progress replaces the files one by one
+                    if _file_identity(os.fstat(f.fileno())) != files.get(table):
+                        return None
+                    tables[table] = pd.read_parquet(f)
+            except (OSError, ValueError):
+                return None
+        return tables
+
+    def _snapshot_files(self, files: dict[str, list[int]]) -> dict[str, SnapshotFile]:
+        """Describe the table files with the given identities."""
+        return {
+            table: SnapshotFile(self.snapshot_dir / f"{table}.parquet", tuple(identity))
+            for table, identity in files.items()
+        }
+
+    def _read_manifest(self) -> dict[str, Any] | None:
+        """Read the manifest, returning None if absent or incompatible."""
+        try:
+            manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(manifest, dict):
+            return None
+        if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            return None
+        return manifest
+
+    def _write_manifest(
+        self, sources: dict[str, SourceFingerprint], files: dict[str, list[int]]
+    ) -> None:
+        """Atomically write the manifest.
+
+        Args:
+            sources: Fingerprints of the source files.
+            files: Identity of every table file, as written.
+        """
+        payload = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "sources": {name: asdict(fp) for name, fp in sources.items()},
+            "tables": files,
+        }
+        tmp = self.manifest_path.with_suffix(f".json.{os.getpid()}.tmp")
+        try:
+            tmp.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+            tmp.replace(self.manifest_path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
@@ -1,18 +1,40 @@
 """LLM package for OpenAI integration."""
 
-from src.llm.client import OpenAIClient
+from src.llm.cache import ResponseCache
+from src.llm.client import LLMResponse, LLMStream, OpenAIClient
+from src.llm.example_index import ExampleIndex
 from src.llm.prompt import (
     CODE_GENERATION_SYSTEM_PROMPT,
+    CODE_GENERATION_WITH_TEMPLATE_SYSTEM_PROMPT,
     RESPONSE_FORMATTING_SYSTEM_PROMPT,
+    SQL_GENERATION_SYSTEM_PROMPT,
+    SQL_GENERATION_WITH_TEMPLATE_SYSTEM_PROMPT,
     get_code_generation_prompt,
+    get_code_repair_prompt,
     get_response_formatting_prompt,
+    get_sql_generation_prompt,
 )
+from src.llm.prompt_builder import PromptBuilder, SchemaSelection
+from src.llm.transport import CallStats, Transport
 
 __all__ = [
-    "OpenAIClient",
     "CODE_GENERATION_SYSTEM_PROMPT",
+    "CODE_GENERATION_WITH_TEMPLATE_SYSTEM_PROMPT",
     "RESPONSE_FORMATTING_SYSTEM_PROMPT",
+    "SQL_GENERATION_SYSTEM_PROMPT",
+    "SQL_GENERATION_WITH_TEMPLATE_SYSTEM_PROMPT",
+    "CallStats",
+    "ExampleIndex",
+    "LLMResponse",
+    "LLMStream",
+    "OpenAIClient",
+    "PromptBuilder",
+    "ResponseCache",
+    "SchemaSelection",
+    "Transport",
     "get_code_generation_prompt",
+    "get_code_repair_prompt",
     "get_response_formatting_prompt",
+    "get_sql_generation_prompt",
 ]
 
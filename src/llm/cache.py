@@ -0,0 +1,227 @@
+"""Persistent response cache for LLM completions."""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+
+def fingerprint(text: str) -> str:
+    """Return a short stable fingerprint of a text (e.g. a system prompt)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def make_cache_key(**parts: object) -> str:
+    """Build a cache key from JSON-serializable request parts.
+
+    Args:
+        **parts: Everything that influences the completion (model, messages,
+            temperature, prompt fingerprint, ...).
+
+    Returns:
+        Hex digest identifying the request.
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """Running hit/miss counters for a cache instance."""
+
+    hits: int = 0
+    misses: int = 0
+
+
+class ResponseCache:
+    """SQLite-backed key/value cache with TTL and LRU eviction.
+
+    Values are JSON documents. Concurrent lookups of the same missing key are
+    coalesced: only the first caller computes the value, the others wait for
+    its result.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 10_000,
+    ) -> None:
+        """Open (or create) the cache database.
+
+        Args:
+            path: SQLite file. ``":memory:"`` keeps the cache in process.
+            ttl_seconds: Entries older than this are treated as missing.
+            max_entries: Least recently used entries beyond this are evicted.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._inflight: dict[str, Future[dict[str, Any]]] = {}
+        self._inflight_async: dict[str, asyncio.Task[dict[str, Any]]] = {}
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access"
+                " ON responses (last_access)"
+            )
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Return the cached value for a key, or None if missing or expired."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(row[0])  # type: ignore[no-any-return]
+
+    def put(self, key: str, value: dict[str, Any]) -> None:
+        """Store a value and evict expired and least recently used entries."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?",
+                (now - self.ttl_seconds,),
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_access DESC"
+                " LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def get_or_compute(
+        self, key: str, compute: Callable[[], dict[str, Any]]
+    ) -> tuple[dict[str, Any], bool]:
+        """Return the cached value, computing and storing it on a miss.
+
+        Args:
+            key: Cache key.
+            compute: Produces the value on a miss. Called at most once per key
+                among concurrent callers.
+
+        Returns:
+            Tuple of (value, hit) where ``hit`` is True if no computation was
+            needed by this caller.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.record(hit=True)
+            return cached, True
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if future is None:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            # Another caller is already computing this key
+            value = future.result()
+            self.record(hit=True)
+            return value, True
+
+        try:
+            # A previous leader may have stored the value since our first lookup
+            cached = self.get(key)
+            value = cached if cached is not None else compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            if cached is None:
+                self.put(key, value)
+            future.set_result(value)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+        self.record(hit=cached is not None)
+        return value, cached is not None
+
+    async def get_or_compute_async(
+        self, key: str, compute: Callable[[], Awaitable[dict[str, Any]]]
+    ) -> tuple[dict[str, Any], bool]:
+        """Async variant of :meth:`get_or_compute`.
+
+        Concurrent callers on the same event loop share one computation. The
+        SQLite lookups run in a worker thread, off the event loop.
+
+        Args:
+            key: Cache key.
+            compute: Coroutine factory producing the value on a miss.
+
+        Returns:
+            Tuple of (value, hit).
+        """
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            self.record(hit=True)
+            return cached, True
+
+        loop = asyncio.get_running_loop()
+        task = self._inflight_async.get(key)
+        if task is not None and task.get_loop() is loop:
+            # Shield so a cancelled follower does not cancel the leader
+            value = await asyncio.shield(task)
+            self.record(hit=True)
+            return value, True
+
+        async def run() -> dict[str, Any]:
+            try:
+                value = await compute()
+                await asyncio.to_thread(self.put, key, value)
+                return value
+            finally:
+                # Another loop's computation of the key may have replaced ours
+                if self._inflight_async.get(key) is asyncio.current_task():
+                    del self._inflight_async[key]
+
+        task = loop.create_task(run())
+        self._inflight_async[key] = task
+        value = await asyncio.shield(task)
+        self.record(hit=False)
+        return value, False
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def record(self, *, hit: bool) -> None:
+        """Update the running hit/miss counters."""
+        with self._lock:
+            if hit:
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
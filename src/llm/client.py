@@ -1,17 +1,53 @@
 """OpenAI client wrapper for code generation and response formatting."""
 
 import re
-from dataclasses import dataclass
+import time
+from collections.abc import Callable, Iterator, Sequence
+from dataclasses import dataclass, field, replace
+from typing import Any, cast
 
-from openai import OpenAI
+from openai.types.chat import ChatCompletionMessageParam
 
 from src.config.settings import get_settings
+from src.llm.cache import ResponseCache, fingerprint, make_cache_key
+from src.llm.example_index import ExampleIndex
 from src.llm.prompt import (
     CODE_GENERATION_SYSTEM_PROMPT,
+    CODE_GENERATION_WITH_TEMPLATE_SYSTEM_PROMPT,
     RESPONSE_FORMATTING_SYSTEM_PROMPT,
+    SCHEMA_DESCRIPTION,
+    SQL_GENERATION_SYSTEM_PROMPT,
+    SQL_GENERATION_WITH_TEMPLATE_SYSTEM_PROMPT,
     get_code_generation_prompt,
+    get_code_repair_prompt,
     get_response_formatting_prompt,
+    get_sql_generation_prompt,
 )
+from src.llm.prompt_builder import PromptBuilder
+from src.llm.transport import CallStats, Transport, estimate_tokens
+from src.telemetry.metrics import LLM_CALLS, LLM_RETRIES, LLM_TOKENS
+from src.telemetry.tracing import USAGE_ATTRIBUTES, span
+
+# Length of the prompt fingerprint sent as the provider's prompt cache key
+PROMPT_CACHE_KEY_LENGTH = 16
+
+# Longest execution error sent back to the model when repairing code
+MAX_REPAIR_ERROR_CHARS = 1500
+
+# Generated language -> (system prompt, system prompt asking for an answer
+# template, user prompt builder)
+GENERATION_PROMPTS: dict[str, tuple[str, str, Callable[..., str]]] = {
+    "python": (
+        CODE_GENERATION_SYSTEM_PROMPT,
+        CODE_GENERATION_WITH_TEMPLATE_SYSTEM_PROMPT,
+        get_code_generation_prompt,
+    ),
+    "sql": (
+        SQL_GENERATION_SYSTEM_PROMPT,
+        SQL_GENERATION_WITH_TEMPLATE_SYSTEM_PROMPT,
+        get_sql_generation_prompt,
+    ),
+}
 
 
 @dataclass
@@ -20,7 +56,75 @@ class LLMResponse:
 
     content: str
     model: str
+    # Token counts; prompt tokens are split into cached_prompt_tokens (served
+    # from the provider's prompt cache) and uncached_prompt_tokens
     usage: dict[str, int]
+    # Whether the completion was served from the response cache
+    cache_hit: bool = False
+    # Answer template returned alongside generated code, if requested
+    answer_template: str | None = None
+    # Seconds the call waited for rate limits, concurrency and retry backoff
+    queue_seconds: float = 0.0
+    # Failed attempts that were retried
+    retries: int = 0
+    # Whether the code was reused from a similar answered question (no API
+    # call was made)
+    reused: bool = False
+    # Every completion sampled when several were requested in one call;
+    # content is the first
+    choices: list[str] = field(default_factory=list)
+
+
+def _chat_messages(
+    messages: list[dict[str, str]],
+) -> list[ChatCompletionMessageParam]:
+    """Type plain role/content dicts as the SDK's message parameters."""
+    return cast("list[ChatCompletionMessageParam]", messages)
+
+
+def _record_call(
+    attributes: dict[str, Any], response: LLMResponse, purpose: str
+) -> None:
+    """Annotate an LLM call's span and update the LLM metrics."""
+    source = "cache" if response.cache_hit else "api"
+    attributes.update(
+        source=source,
+        model=response.model,
+        retries=response.retries,
+        queue_ms=round(response.queue_seconds * 1000, 1),
+    )
+    LLM_CALLS.inc(purpose=purpose, source=source)
+    for name in USAGE_ATTRIBUTES:
+        tokens = response.usage.get(name, 0)
+        attributes[name] = tokens
+        if tokens:
+            LLM_TOKENS.inc(tokens, purpose=purpose, kind=name.removesuffix("_tokens"))
+    if response.retries:
+        LLM_RETRIES.inc(response.retries, purpose=purpose)
+
+
+class LLMStream:
+    """Iterator over streamed completion deltas.
+
+    ``response`` (the full completion) and ``time_to_first_token`` are filled
+    in while the stream is consumed.
+    """
+
+    def __init__(self, produce: Callable[["LLMStream"], Iterator[str]]) -> None:
+        """Initialize the stream.
+
+        Args:
+            produce: Builds the delta iterator; receives the stream so it can
+                record the final response and timing on it.
+        """
+        self.response: LLMResponse | None = None
+        # Seconds from the API call to the first content delta
+        self.time_to_first_token: float | None = None
+        self._deltas = produce(self)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over content deltas."""
+        return self._deltas
 
 
 class OpenAIClient:
@@ -30,52 +134,237 @@ class OpenAIClient:
         self,
         api_key: str | None = None,
         model: str | None = None,
+        cache: ResponseCache | None = None,
+        prompt_builder: PromptBuilder | None = None,
+        language: str = "python",
+        *,
+        example_index: ExampleIndex | None = None,
+        transport: Transport | None = None,
     ) -> None:
         """Initialize the OpenAI client.
 
         Args:
             api_key: OpenAI API key. If None, uses OPENAI_API_KEY env var.
             model: Model to use for completions. If None, uses settings default.
+            cache: Response cache. If None, one is created from settings
+                (unless caching is disabled there).
+            prompt_builder: Prunes the schema sent with each question. If
+                None, every question gets the full schema.
+            language: Language of the generated code, "python" (pandas) or
+                "sql" (DuckDB).
+            example_index: Index of answered questions used to reuse code and
+                pick few-shot examples. If None, one is created from settings
+                (unless disabled there).
+            transport: Sends the API calls. If None, one is created from
+                settings.
+
+        Raises:
+            ValueError: If the language is not supported.
         """
+        if language not in GENERATION_PROMPTS:
+            msg = f"Unsupported code generation language: {language!r}"
+            raise ValueError(msg)
         settings = get_settings()
-        self.client = OpenAI(api_key=api_key)
+        self.transport = transport or Transport.from_settings(settings, api_key)
+        self.client = self.transport.client
+        self.async_client = self.transport.async_client
         self.model = model or settings.model
         self._settings = settings
+        if cache is None and settings.llm_cache_enabled:
+            cache = ResponseCache(
+                settings.llm_cache_path,
+                ttl_seconds=settings.llm_cache_ttl_seconds,
+                max_entries=settings.llm_cache_max_entries,
+            )
+        self.cache = cache
+        # Ask for an answer template with the code so formatting can be skipped
+        self.answer_templates = settings.answer_templates_enabled
+        self.prompt_builder = prompt_builder
+        self.language = language
+        # Changing the prompts must invalidate every cached completion
+        self._prompt_fingerprint = fingerprint(
+            GENERATION_PROMPTS[language][0] + SCHEMA_DESCRIPTION
+        )
+        if example_index is None and settings.example_index_enabled:
+            # Stored code stays valid as long as the schema does
+            example_index = ExampleIndex(
+                settings.example_index_path,
+                f"{language}:{fingerprint(SCHEMA_DESCRIPTION)}",
+                max_entries=settings.example_index_max_entries,
+                few_shot_count=settings.example_few_shot_count,
+                few_shot_min_similarity=settings.example_few_shot_min_similarity,
+            )
+        self.example_index = example_index
+
+    def generate_query_code(
+        self,
+        question: str,
+        *,
+        reuse: bool = True,
+        earlier_results: Sequence[tuple[str, str, str]] = (),
+    ) -> LLMResponse:
+        """Generate code (pandas or SQL) to answer a question.
 
-    def generate_query_code(self, question: str) -> LLMResponse:
-        """Generate pandas code to answer a question.
+        Code answering the same question with other entity values is reused
+        from the example index without an API call; similar answered
+        questions are sent along as few-shot examples.
 
         Args:
             question: Natural language question about the data.
+            reuse: Whether code may be reused from the example index.
+            earlier_results: ``(name, question, description)`` of the chat
+                session's stored results, which the code may read.
 
         Returns:
             LLMResponse containing the generated code.
         """
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": CODE_GENERATION_SYSTEM_PROMPT},
-                {"role": "user", "content": get_code_generation_prompt(question)},
-            ],
-            temperature=self._settings.temperature,
-            max_completion_tokens=self._settings.max_completion_tokens,
+        reused = self._reuse_code(question, earlier_results) if reuse else None
+        if reused is not None:
+            return reused
+        messages = self._prompt(
+            "generate",
+            lambda: self._code_generation_messages(question, earlier_results),
         )
+        response = self._traced_complete("generate", messages)
+        return self._parse_code_response(response)
 
-        content = response.choices[0].message.content or ""
-        # Extract code from markdown code blocks if present
-        content = self._extract_code(content)
+    async def generate_query_code_async(
+        self,
+        question: str,
+        *,
+        reuse: bool = True,
+        earlier_results: Sequence[tuple[str, str, str]] = (),
+    ) -> LLMResponse:
+        """Async variant of :meth:`generate_query_code`.
 
-        return LLMResponse(
-            content=content,
-            model=response.model,
-            usage={
-                "prompt_tokens": response.usage.prompt_tokens if response.usage else 0,
-                "completion_tokens": (
-                    response.usage.completion_tokens if response.usage else 0
-                ),
-                "total_tokens": response.usage.total_tokens if response.usage else 0,
-            },
+        Args:
+            question: Natural language question about the data.
+            reuse: Whether code may be reused from the example index.
+            earlier_results: ``(name, question, description)`` of the chat
+                session's stored results, which the code may read.
+
+        Returns:
+            LLMResponse containing the generated code.
+        """
+        reused = self._reuse_code(question, earlier_results) if reuse else None
+        if reused is not None:
+            return reused
+        messages = self._prompt(
+            "generate",
+            lambda: self._code_generation_messages(question, earlier_results),
+        )
+        response = await self._traced_complete_async("generate", messages)
+        return self._parse_code_response(response)
+
+    def generate_query_candidates(
+        self,
+        question: str,
+        count: int,
+        *,
+        reuse: bool = True,
+        earlier_results: Sequence[tuple[str, str, str]] = (),
+    ) -> list[LLMResponse]:
+        """Generate several alternative programs for a question in one call.
+
+        The completions are sampled at the ``speculative_temperature``
+        setting so they differ; the prompt is sent and billed once. Code
+        reused from the example index is the only candidate.
+
+        Args:
+            question: Natural language question about the data.
+            count: Completions to request.
+            reuse: Whether code may be reused from the example index.
+            earlier_results: ``(name, question, description)`` of the chat
+                session's stored results, which the code may read.
+
+        Returns:
+            One LLMResponse per distinct program, in the order sampled. The
+            first carries the call's token usage, the others none.
+        """
+        reused = self._reuse_code(question, earlier_results) if reuse else None
+        if reused is not None:
+            return [reused]
+        messages = self._prompt(
+            "generate",
+            lambda: self._code_generation_messages(question, earlier_results),
+        )
+        response = self._traced_complete("generate", messages, count)
+        return self._split_candidates(response)
+
+    async def generate_query_candidates_async(
+        self,
+        question: str,
+        count: int,
+        *,
+        reuse: bool = True,
+        earlier_results: Sequence[tuple[str, str, str]] = (),
+    ) -> list[LLMResponse]:
+        """Async variant of :meth:`generate_query_candidates`."""
+        reused = self._reuse_code(question, earlier_results) if reuse else None
+        if reused is not None:
+            return [reused]
+        messages = self._prompt(
+            "generate",
+            lambda: self._code_generation_messages(question, earlier_results),
+        )
+        response = await self._traced_complete_async("generate", messages, count)
+        return self._split_candidates(response)
+
+    def remember_code(self, question: str, response: LLMResponse) -> None:
+        """Store code that answered a question successfully in the example index.
+
+        Args:
+            question: Natural language question.
+            response: Code generation response whose code executed
+                successfully.
+        """
+        if self.example_index is not None and not response.reused:
+            self.example_index.add(
+                question, response.content, response.answer_template
+            )
+
+    def repair_query_code(
+        self,
+        question: str,
+        failures: Sequence[tuple[str, str]],
+        earlier_results: Sequence[tuple[str, str, str]] = (),
+    ) -> LLMResponse:
+        """Ask the model to fix generated code that failed to execute.
+
+        The original generation messages are sent unchanged (so the provider
+        serves them from its prompt cache), followed by a short turn for each
+        failure: the code as the model's reply and the error as a follow-up.
+
+        Args:
+            question: Natural language question the code answers.
+            failures: (code, execution error) of every failed attempt so far,
+                oldest first.
+            earlier_results: The session's stored results, as passed to
+                :meth:`generate_query_code`.
+
+        Returns:
+            LLMResponse containing the corrected code.
+        """
+        messages = self._prompt(
+            "repair",
+            lambda: self._repair_messages(question, failures, earlier_results),
         )
+        response = self._traced_complete("repair", messages)
+        return self._parse_code_response(response)
+
+    async def repair_query_code_async(
+        self,
+        question: str,
+        failures: Sequence[tuple[str, str]],
+        earlier_results: Sequence[tuple[str, str, str]] = (),
+    ) -> LLMResponse:
+        """Async variant of :meth:`repair_query_code`."""
+        messages = self._prompt(
+            "repair",
+            lambda: self._repair_messages(question, failures, earlier_results),
+        )
+        response = await self._traced_complete_async("repair", messages)
+        return self._parse_code_response(response)
 
     def format_response(self, question: str, data_result: str) -> LLMResponse:
         """Format query results into a natural language response.
@@ -87,45 +376,492 @@ class OpenAIClient:
         Returns:
             LLMResponse containing the formatted answer.
         """
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": RESPONSE_FORMATTING_SYSTEM_PROMPT},
+        messages = self._prompt(
+            "format", lambda: self._formatting_messages(question, data_result)
+        )
+        return self._traced_complete("format", messages)
+
+    async def format_response_async(
+        self, question: str, data_result: str
+    ) -> LLMResponse:
+        """Async variant of :meth:`format_response`.
+
+        Args:
+            question: Original user question.
+            data_result: String representation of query results.
+
+        Returns:
+            LLMResponse containing the formatted answer.
+        """
+        messages = self._prompt(
+            "format", lambda: self._formatting_messages(question, data_result)
+        )
+        return await self._traced_complete_async("format", messages)
+
+    def format_response_stream(self, question: str, data_result: str) -> LLMStream:
+        """Stream the formatted answer as it is generated.
+
+        Cache hits are replayed as a single delta; misses are streamed from the
+        API and stored in the cache once complete.
+
+        Args:
+            question: Original user question.
+            data_result: String representation of query results.
+
+        Returns:
+            LLMStream yielding answer text deltas.
+        """
+        messages = self._prompt(
+            "format", lambda: self._formatting_messages(question, data_result)
+        )
+        return LLMStream(lambda stream: self._traced_stream(messages, stream))
+
+    def _traced_stream(
+        self, messages: list[dict[str, str]], stream: LLMStream
+    ) -> Iterator[str]:
+        """Stream completion deltas in an ``llm.format`` span."""
+        with span("llm.format", stream=True) as attributes:
+            yield from self._stream_deltas(messages, stream)
+            if stream.response is not None:
+                _record_call(attributes, stream.response, "format")
+
+    def _stream_deltas(
+        self, messages: list[dict[str, str]], stream: LLMStream
+    ) -> Iterator[str]:
+        """Yield completion deltas and record the final response on the stream."""
+        start = time.perf_counter()
+        key = self._cache_key(messages) if self.cache is not None else None
+        if self.cache is not None and key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache.record(hit=True)
+                stream.time_to_first_token = time.perf_counter() - start
+                stream.response = self._to_response(cached, cache_hit=True)
+                yield stream.response.content
+                return
+
+        stats = CallStats()
+        tokens = estimate_tokens(messages, self._settings.max_completion_tokens)
+        chunks = self.transport.stream(
+            lambda: self.client.chat.completions.create(
+                model=self.model,
+                messages=_chat_messages(messages),
+                temperature=self._settings.temperature,
+                max_completion_tokens=self._settings.max_completion_tokens,
+                prompt_cache_key=self._prompt_cache_key(messages),
+                stream=True,
+                stream_options={"include_usage": True},
+            ),
+            tokens,
+            stats,
+        )
+        parts: list[str] = []
+        model = self.model
+        usage = self._usage_to_dict(None)
+        for chunk in chunks:
+            model = chunk.model or model
+            if chunk.usage is not None:
+                usage = self._usage_to_dict(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if stream.time_to_first_token is None:
+                    stream.time_to_first_token = time.perf_counter() - start
+                parts.append(delta)
+                yield delta
+
+        self.transport.settle(tokens, usage["total_tokens"])
+        payload = {"content": "".join(parts), "model": model, "usage": usage}
+        if self.cache is not None and key is not None:
+            self.cache.put(key, payload)
+            self.cache.record(hit=False)
+        stream.response = self._to_response(payload, cache_hit=False, stats=stats)
+
+    def _code_generation_messages(
+        self,
+        question: str,
+        earlier_results: Sequence[tuple[str, str, str]] = (),
+    ) -> list[dict[str, str]]:
+        """Build the chat messages for code generation.
+
+        The system prompt is identical for every question so the provider can
+        serve it from its prompt cache; the (pruned) schema and the session's
+        earlier results go into the user message.
+        """
+        schema = None
+        if self.prompt_builder is not None:
+            schema = self.prompt_builder.schema_for(
+                question, follow_up=bool(earlier_results)
+            )
+        examples = []
+        if self.example_index is not None:
+            examples = [
+                (example.question, example.code)
+                for example in self.example_index.examples(question)
+            ]
+        system_prompt, template_system_prompt, build_prompt = GENERATION_PROMPTS[
+            self.language
+        ]
+        if self.answer_templates:
+            return [
+                {"role": "system", "content": template_system_prompt},
                 {
                     "role": "user",
-                    "content": get_response_formatting_prompt(question, data_result),
+                    "content": build_prompt(
+                        question,
+                        with_answer_template=True,
+                        schema=schema,
+                        examples=examples,
+                        earlier_results=earlier_results,
+                    ),
                 },
-            ],
-            temperature=self._settings.temperature,
-            max_completion_tokens=self._settings.max_completion_tokens,
-        )
+            ]
+        return [
+            {"role": "system", "content": system_prompt},
+            {
+                "role": "user",
+                "content": build_prompt(
+                    question,
+                    schema=schema,
+                    examples=examples,
+                    earlier_results=earlier_results,
+                ),
+            },
+        ]
+
+    def _reuse_code(
+        self, question: str, earlier_results: Sequence[tuple[str, str, str]]
+    ) -> LLMResponse | None:
+        """Reuse code from the example index, if a stored question fits.
 
+        Questions asked after earlier results may be follow-ups about them,
+        which the stored standalone code would answer from the full tables.
+        """
+        if self.example_index is None or earlier_results:
+            return None
+        with span("reuse") as attributes:
+            reuse = self.example_index.reuse(question)
+            attributes["hit"] = reuse is not None
+        if reuse is None:
+            return None
+        LLM_CALLS.inc(purpose="generate", source="reused")
+        usage = self._usage_to_dict(None)
+        usage["cache_hits"] = 0
+        usage["cache_misses"] = 0
         return LLMResponse(
-            content=response.choices[0].message.content or "",
-            model=response.model,
-            usage={
-                "prompt_tokens": response.usage.prompt_tokens if response.usage else 0,
-                "completion_tokens": (
-                    response.usage.completion_tokens if response.usage else 0
-                ),
-                "total_tokens": response.usage.total_tokens if response.usage else 0,
+            content=reuse.code,
+            model=self.model,
+            usage=usage,
+            answer_template=reuse.answer_template,
+            reused=True,
+        )
+
+    def _repair_messages(
+        self,
+        question: str,
+        failures: Sequence[tuple[str, str]],
+        earlier_results: Sequence[tuple[str, str, str]] = (),
+    ) -> list[dict[str, str]]:
+        """Build the chat messages for repairing failed code."""
+        messages = self._code_generation_messages(question, earlier_results)
+        for code, error in failures:
+            reported = error
+            if len(reported) > MAX_REPAIR_ERROR_CHARS:
+                reported = reported[:MAX_REPAIR_ERROR_CHARS] + "..."
+            reply = f"```{self.language}\n{code}\n```"
+            follow_up = get_code_repair_prompt(
+                reported, with_answer_template=self.answer_templates
+            )
+            messages.append({"role": "assistant", "content": reply})
+            messages.append({"role": "user", "content": follow_up})
+        return messages
+
+    def _parse_code_response(self, response: LLMResponse) -> LLMResponse:
+        """Split a code generation completion into code and answer template."""
+        raw = response.content
+        response.answer_template = self._extract_answer_template(raw)
+        # Extract code from markdown code blocks if present
+        response.content = self._extract_code(raw)
+        return response
+
+    def _split_candidates(self, response: LLMResponse) -> list[LLMResponse]:
+        """Parse every sampled completion of a call into its own response."""
+        no_usage = dict.fromkeys(response.usage, 0)
+        candidates: list[LLMResponse] = []
+        seen: set[str] = set()
+        for index, content in enumerate(response.choices or [response.content]):
+            candidate = self._parse_code_response(
+                replace(
+                    response,
+                    content=content,
+                    usage=response.usage if index == 0 else dict(no_usage),
+                    choices=[],
+                )
+            )
+            if candidate.content not in seen:
+                seen.add(candidate.content)
+                candidates.append(candidate)
+        return candidates
+
+    def _formatting_messages(
+        self, question: str, data_result: str
+    ) -> list[dict[str, str]]:
+        """Build the chat messages for response formatting."""
+        return [
+            {"role": "system", "content": RESPONSE_FORMATTING_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": get_response_formatting_prompt(question, data_result),
             },
+        ]
+
+    @staticmethod
+    def _prompt(
+        purpose: str, build: Callable[[], list[dict[str, str]]]
+    ) -> list[dict[str, str]]:
+        """Build the messages of a call in a ``prompt`` span."""
+        with span("prompt", purpose=purpose) as attributes:
+            messages = build()
+            attributes["prompt_chars"] = sum(
+                len(message["content"]) for message in messages
+            )
+        return messages
+
+    def _traced_complete(
+        self, purpose: str, messages: list[dict[str, str]], candidates: int = 1
+    ) -> LLMResponse:
+        """Run :meth:`_complete` in an ``llm.<purpose>`` span."""
+        with span(f"llm.{purpose}") as attributes:
+            if candidates > 1:
+                attributes["candidates"] = candidates
+            response = self._complete(messages, candidates)
+            _record_call(attributes, response, purpose)
+        return response
+
+    async def _traced_complete_async(
+        self, purpose: str, messages: list[dict[str, str]], candidates: int = 1
+    ) -> LLMResponse:
+        """Async variant of :meth:`_traced_complete`."""
+        with span(f"llm.{purpose}") as attributes:
+            if candidates > 1:
+                attributes["candidates"] = candidates
+            response = await self._complete_async(messages, candidates)
+            _record_call(attributes, response, purpose)
+        return response
+
+    def _complete(
+        self, messages: list[dict[str, str]], candidates: int = 1
+    ) -> LLMResponse:
+        """Run a chat completion, going through the response cache if enabled.
+
+        Args:
+            messages: Chat messages to send.
+            candidates: Completions to sample; more than one are returned in
+                ``choices``.
+
+        Returns:
+            LLMResponse with the raw completion text. Cache hits report zero
+            tokens (nothing was spent) and ``cache_hits`` of 1 in ``usage``.
+        """
+        stats = CallStats()
+        if self.cache is None:
+            payload = self._request(messages, stats, candidates)
+            return self._to_response(payload, cache_hit=False, stats=stats)
+
+        payload, hit = self.cache.get_or_compute(
+            self._cache_key(messages, candidates),
+            lambda: self._request(messages, stats, candidates),
+        )
+        return self._to_response(payload, cache_hit=hit, stats=stats)
+
+    async def _complete_async(
+        self, messages: list[dict[str, str]], candidates: int = 1
+    ) -> LLMResponse:
+        """Async variant of :meth:`_complete` built on ``AsyncOpenAI``."""
+        stats = CallStats()
+        if self.cache is None:
+            payload = await self._request_async(messages, stats, candidates)
+            return self._to_response(payload, cache_hit=False, stats=stats)
+
+        payload, hit = await self.cache.get_or_compute_async(
+            self._cache_key(messages, candidates),
+            lambda: self._request_async(messages, stats, candidates),
+        )
+        return self._to_response(payload, cache_hit=hit, stats=stats)
+
+    def _cache_key(self, messages: list[dict[str, str]], candidates: int = 1) -> str:
+        """Build the response cache key for a request."""
+        parts: dict[str, Any] = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self._settings.temperature,
+            "max_completion_tokens": self._settings.max_completion_tokens,
+            "prompt_fingerprint": self._prompt_fingerprint,
+        }
+        if candidates > 1:
+            parts["candidates"] = candidates
+            parts["temperature"] = self._settings.speculative_temperature
+        return make_cache_key(**parts)
+
+    def _sampling(self, candidates: int) -> dict[str, Any]:
+        """Sampling parameters of a request for the given number of completions."""
+        if candidates > 1:
+            return {
+                "temperature": self._settings.speculative_temperature,
+                "n": candidates,
+            }
+        return {"temperature": self._settings.temperature}
+
+    def _request(
+        self, messages: list[dict[str, str]], stats: CallStats, candidates: int = 1
+    ) -> dict[str, Any]:
+        """Call the API through the transport and return a completion payload.
+
+        Args:
+            messages: Chat messages to send.
+            stats: Filled in with the call's queueing delay and retries.
+            candidates: Completions to sample.
+
+        Returns:
+            JSON-serializable completion payload.
+        """
+        tokens = estimate_tokens(
+            messages, self._settings.max_completion_tokens * candidates
+        )
+        response = self.transport.call(
+            lambda: self.client.chat.completions.create(
+                model=self.model,
+                messages=_chat_messages(messages),
+                max_completion_tokens=self._settings.max_completion_tokens,
+                prompt_cache_key=self._prompt_cache_key(messages),
+                **self._sampling(candidates),
+            ),
+            tokens,
+            stats,
+        )
+        payload = self._to_payload(response)
+        self.transport.settle(tokens, payload["usage"]["total_tokens"])
+        return payload
+
+    async def _request_async(
+        self, messages: list[dict[str, str]], stats: CallStats, candidates: int = 1
+    ) -> dict[str, Any]:
+        """Async variant of :meth:`_request`."""
+        tokens = estimate_tokens(
+            messages, self._settings.max_completion_tokens * candidates
+        )
+        response = await self.transport.call_async(
+            lambda: self.async_client.chat.completions.create(
+                model=self.model,
+                messages=_chat_messages(messages),
+                max_completion_tokens=self._settings.max_completion_tokens,
+                prompt_cache_key=self._prompt_cache_key(messages),
+                **self._sampling(candidates),
+            ),
+            tokens,
+            stats,
+        )
+        payload = self._to_payload(response)
+        self.transport.settle(tokens, payload["usage"]["total_tokens"])
+        return payload
+
+    @staticmethod
+    def _to_payload(response: Any) -> dict[str, Any]:  # noqa: ANN401
+        """Convert a chat completion into a JSON-serializable payload."""
+        payload = {
+            "content": response.choices[0].message.content or "",
+            "model": response.model,
+            "usage": OpenAIClient._usage_to_dict(response.usage),
+        }
+        if len(response.choices) > 1:
+            payload["choices"] = [
+                choice.message.content or "" for choice in response.choices
+            ]
+        return payload
+
+    @staticmethod
+    def _usage_to_dict(usage: Any) -> dict[str, int]:  # noqa: ANN401
+        """Convert API token usage into a dict, splitting cached prompt tokens."""
+        if usage is None:
+            return {
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0,
+                "cached_prompt_tokens": 0,
+                "uncached_prompt_tokens": 0,
+            }
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        return {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens,
+            "cached_prompt_tokens": cached,
+            "uncached_prompt_tokens": usage.prompt_tokens - cached,
+        }
+
+    @staticmethod
+    def _prompt_cache_key(messages: list[dict[str, str]]) -> str:
+        """Key routing requests with the same system prompt to the same cache."""
+        return fingerprint(messages[0]["content"])[:PROMPT_CACHE_KEY_LENGTH]
+
+    def _to_response(
+        self,
+        payload: dict[str, Any],
+        *,
+        cache_hit: bool,
+        stats: CallStats | None = None,
+    ) -> LLMResponse:
+        """Build an LLMResponse from a completion payload."""
+        if cache_hit:
+            usage = dict.fromkeys(payload["usage"], 0)
+        else:
+            usage = dict(payload["usage"])
+        # Entries cached before the prompt token split was recorded
+        usage.setdefault("cached_prompt_tokens", 0)
+        usage.setdefault("uncached_prompt_tokens", usage.get("prompt_tokens", 0))
+        usage["cache_hits"] = int(cache_hit)
+        usage["cache_misses"] = int(not cache_hit and self.cache is not None)
+        return LLMResponse(
+            content=payload["content"],
+            model=payload["model"],
+            usage=usage,
+            cache_hit=cache_hit,
+            queue_seconds=stats.queue_seconds if stats is not None else 0.0,
+            retries=stats.retries if stats is not None else 0,
+            choices=list(payload.get("choices", [])),
         )
 
     def _extract_code(self, content: str) -> str:
-        """Extract Python code from markdown code blocks.
+        """Extract Python or SQL code from markdown code blocks.
 
         Args:
             content: Raw LLM output that may contain markdown.
 
         Returns:
-            Clean Python code.
+            Clean code.
         """
-        # Try to extract from ```python ... ``` blocks
-        pattern = r"```(?:python)?\s*\n?(.*?)```"
+        # The answer template block is not code
+        content = re.sub(r"```answer\b.*?```", "", content, flags=re.DOTALL)
+        # Try to extract from ```python ... ``` or ```sql ... ``` blocks
+        pattern = r"```(?:python|sql)?\s*\n?(.*?)```"
         matches = re.findall(pattern, content, re.DOTALL)
         if matches:
             return matches[0].strip()
         # If no code blocks, return as-is (might already be clean code)
         return content.strip()
 
+    def _extract_answer_template(self, content: str) -> str | None:
+        """Extract the answer template from an ```answer block, if present.
+
+        Args:
+            content: Raw LLM output.
+
+        Returns:
+            The template text, or None if there is no answer block.
+        """
+        match = re.search(r"```answer[ \t]*\n?(.*?)```", content, re.DOTALL)
+        if match is None:
+            return None
+        return match.group(1).strip() or None
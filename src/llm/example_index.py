@@ -0,0 +1,527 @@
+"""Persistent similarity index of answered questions and their code.
+
+Most questions are small variants of earlier ones: another client, month or
+country. Every question is reduced to a *skeleton* in which the entities it
+mentions (values found in the tables, dates, years, months and numbers) are
+replaced by typed placeholders::
+
+    "Total billed to Acme Corp in 2024?"
+    -> "total billed to <clients.client_name> in <year>"
+
+A new question with the same skeleton as a stored one reuses the stored code,
+with the entity literals in it replaced by the new question's values, without
+calling the LLM. Code is only reused when every changed entity can be found
+in it. Questions whose skeletons are merely similar (TF-IDF over character
+n-grams) get the closest stored pairs as few-shot examples instead.
+
+Only code that executed successfully is stored. Entries live in SQLite, so
+the index survives restarts; they are tied to the generated language and the
+schema they were written against.
+"""
+
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+
+from src.llm.prompt_builder import ValueMatcher, index_values
+
+# Character n-gram sizes used for similarity
+NGRAM_SIZES = (3, 4, 5)
+
+# Refit the IDF weights once the index has grown by this fraction
+REFIT_GROWTH = 0.1
+
+# Words that never change a question's meaning
+FILLER_WORDS = frozenset({"a", "an", "the", "please"})
+
+MONTH_NUMBERS = {
+    "january": 1,
+    "february": 2,
+    "march": 3,
+    "april": 4,
+    "may": 5,
+    "june": 6,
+    "july": 7,
+    "august": 8,
+    "september": 9,
+    "october": 10,
+    "november": 11,
+    "december": 12,
+}
+
+_DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+# Full month names only; "may" only when capitalized (otherwise it is the verb)
+_MONTH = re.compile(
+    r"\b(?i:january|february|march|april|june|july|august|september|october|"
+    r"november|december)\b|\bMay\b"
+)
+_NUMBER = re.compile(r"(?<![\w.])\d+(?![\w.])")
+# Years anywhere in code, including inside date strings
+_CODE_YEAR = re.compile(r"(?<!\d)(?:19|20)\d{2}(?!\d)")
+# Kinds of entity that move the time window of a query
+_TIME_KINDS = frozenset({"date", "year"})
+_TOKEN = re.compile(r"<[a-z_.]+>|[a-z0-9&]+")
+
+
+@dataclass(frozen=True)
+class Entity:
+    """A value mentioned in a question."""
+
+    # "<table>.<column>", "date", "year", "month" or "number"
+    kind: str
+    # The value as it is written in code ("Acme Corp", "2024", "3")
+    value: str
+
+
+@dataclass
+class Example:
+    """A stored question with the code that answered it."""
+
+    question: str
+    code: str
+    answer_template: str | None
+    skeleton: str
+    entities: tuple[Entity, ...]
+
+
+@dataclass
+class Reuse:
+    """Stored code re-parameterized for a new question."""
+
+    code: str
+    answer_template: str | None
+    # The stored question the code was taken from
+    source: str
+
+
+def extract_entities(
+    question: str, matchers: Sequence[ValueMatcher]
+) -> tuple[str, tuple[Entity, ...]]:
+    """Replace the entities in a question with typed placeholders.
+
+    Args:
+        question: Natural language question.
+        matchers: Matchers for the categorical values in the tables.
+
+    Returns:
+        The normalized skeleton and the entities in order of appearance.
+    """
+    lowered = question.lower()
+    spans: list[tuple[int, int, Entity]] = []
+
+    def claim(start: int, end: int, entity: Entity) -> None:
+        if all(end <= other[0] or start >= other[1] for other in spans):
+            spans.append((start, end, entity))
+
+    # Longest values first so "Acme Corp Ltd" wins over "Acme Corp"
+    for matcher in sorted(matchers, key=lambda m: -len(m.value)):
+        for match in matcher.pattern.finditer(lowered):
+            claim(
+                match.start(),
+                match.end(),
+                Entity(f"{matcher.table}.{matcher.column}", matcher.value),
+            )
+    for match in _DATE.finditer(question):
+        claim(match.start(), match.end(), Entity("date", match.group()))
+    for match in _YEAR.finditer(question):
+        claim(match.start(), match.end(), Entity("year", match.group()))
+    for match in _MONTH.finditer(question):
+        month = MONTH_NUMBERS[match.group().lower()]
+        claim(match.start(), match.end(), Entity("month", str(month)))
+    for match in _NUMBER.finditer(question):
+        claim(match.start(), match.end(), Entity("number", match.group()))
+
+    spans.sort(key=lambda span: span[0])
+    parts = []
+    position = 0
+    for start, end, entity in spans:
+        parts.append(lowered[position:start])
+        parts.append(f" <{entity.kind}> ")
+        position = end
+    parts.append(lowered[position:])
+    tokens = [
+        token for token in _TOKEN.findall("".join(parts)) if token not in FILLER_WORDS
+    ]
+    return " ".join(tokens), tuple(entity for _, _, entity in spans)
+
+
+def substitute_entities(
+    code: str, old: Sequence[Entity], new: Sequence[Entity]
+) -> str | None:
+    """Rewrite code written for one set of entities to use another.
+
+    Table values and dates are replaced where they appear as string literals
+    (case-insensitively, keeping the literal's case style), years wherever
+    they appear, and other numbers only if they appear exactly once outside
+    string literals. Months are only substituted when unchanged.
+
+    When a date or year changes, every date and year in the code must come
+    from the question: a bound derived from it (``'2025-01-01'`` ending a
+    "December 2024" window) would otherwise keep its old value and silently
+    change the window's length.
+
+    Args:
+        code: Code that answered the question with the ``old`` entities.
+        old: Entities of that question.
+        new: Entities of the new question, pairwise of the same kinds.
+
+    Returns:
+        The rewritten code, or None if some changed entity cannot be located
+        in the code.
+    """
+    replacements: dict[Entity, Entity] = {}
+    for before, after in zip(old, new, strict=True):
+        if before.value == after.value:
+            continue
+        if replacements.setdefault(before, after) != after:
+            # The same value would have to become two different ones
+            return None
+    if {after.value for after in replacements.values()} & {
+        before.value for before in replacements
+    }:
+        # Swapped or shifted values (2023 -> 2024, 2024 -> 2025) would be
+        # rewritten twice
+        return None
+    if any(before.kind in _TIME_KINDS for before in replacements) and (
+        not _time_literals_covered(code, old)
+    ):
+        return None
+
+    for before, after in replacements.items():
+        rewritten = _substitute(code, before, after.value)
+        if rewritten is None:
+            return None
+        code = rewritten
+    return code
+
+
+def _time_literals_covered(code: str, entities: Sequence[Entity]) -> bool:
+    """Whether every date and year literal in code comes from the entities.
+
+    A date literal is covered if it is one of the dates or its year is one of
+    the years (it is then rewritten with the year); any other year must be one
+    of the years.
+    """
+    years = {entity.value for entity in entities if entity.kind == "year"}
+    dates = {entity.value for entity in entities if entity.kind == "date"}
+    for match in _DATE.finditer(code):
+        if match.group() not in dates and match.group()[:4] not in years:
+            return False
+    outside_dates = _DATE.sub("", code)
+    return all(match.group() in years for match in _CODE_YEAR.finditer(outside_dates))
+
+
+def _substitute(code: str, entity: Entity, value: str) -> str | None:
+    """Replace one entity's value in code; None if it is not found."""
+    if entity.kind == "month":
+        return None
+    if entity.kind == "year":
+        pattern = re.compile(rf"(?<!\d){entity.value}(?!\d)")
+        rewritten, count = pattern.subn(value, code)
+        return rewritten if count else None
+    if entity.kind == "number":
+        outside_strings = re.sub(r"'[^'\n]*'|\"[^\"\n]*\"", "''", code)
+        pattern = re.compile(rf"(?<![\w.]){entity.value}(?![\w.])")
+        if len(pattern.findall(outside_strings)) != 1:
+            return None
+        # The single match outside strings; make sure it is the one replaced
+        if len(pattern.findall(code)) != 1:
+            return None
+        return pattern.sub(value, code)
+
+    # Table values and dates appear as string literals
+    literal = re.compile(rf"(['\"])({re.escape(entity.value)})\1", re.IGNORECASE)
+    found = False
+
+    def replace(match: re.Match[str]) -> str:
+        nonlocal found
+        quote, text = match.group(1), match.group(2)
+        if quote in value:
+            return match.group()
+        found = True
+        if text == entity.value:
+            return f"{quote}{value}{quote}"
+        if text == entity.value.lower():
+            return f"{quote}{value.lower()}{quote}"
+        if text == entity.value.upper():
+            return f"{quote}{value.upper()}{quote}"
+        return f"{quote}{value}{quote}"
+
+    rewritten = literal.sub(replace, code)
+    return rewritten if found and rewritten != code else None
+
+
+def _ngrams(text: str) -> Counter[str]:
+    """Character n-grams of a skeleton, padded at word boundaries."""
+    padded = f" {text} "
+    return Counter(
+        padded[i : i + size]
+        for size in NGRAM_SIZES
+        for i in range(len(padded) - size + 1)
+    )
+
+
+class ExampleIndex:
+    """SQLite-backed index of answered questions with TF-IDF search."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        namespace: str,
+        *,
+        max_entries: int = 5000,
+        few_shot_count: int = 3,
+        few_shot_min_similarity: float = 0.5,
+    ) -> None:
+        """Open (or create) the index and load its entries.
+
+        Args:
+            path: SQLite file. ``":memory:"`` keeps the index in process.
+            namespace: Entries are only shared between indexes with the same
+                namespace (generated language and schema fingerprint).
+            max_entries: Least recently used entries beyond this are evicted.
+            few_shot_count: Maximum number of few-shot examples per question.
+            few_shot_min_similarity: Lowest skeleton similarity (cosine,
+                0..1) for a stored pair to be used as a few-shot example.
+        """
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.few_shot_count = few_shot_count
+        self.few_shot_min_similarity = few_shot_min_similarity
+        self._matchers: list[ValueMatcher] = []
+
+        if str(path) != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS examples ("
+                " namespace TEXT NOT NULL,"
+                " question TEXT NOT NULL,"
+                " code TEXT NOT NULL,"
+                " answer_template TEXT,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (namespace, question))"
+            )
+            rows = self._conn.execute(
+                "SELECT question, code, answer_template FROM examples"
+                " WHERE namespace = ? ORDER BY last_used",
+                (namespace,),
+            ).fetchall()
+        self._rows: dict[str, tuple[str, str | None]] = {
+            question: (code, template) for question, code, template in rows
+        }
+        self._build()
+
+    def __len__(self) -> int:
+        """Number of stored examples."""
+        return len(self._examples)
+
+    def set_dataframes(self, dataframes: dict[str, pd.DataFrame]) -> None:
+        """Recognize the values in these tables as entities from now on."""
+        matchers = index_values(dataframes)
+        with self._lock:
+            self._matchers = matchers
+            self._build()
+
+    def add(self, question: str, code: str, answer_template: str | None) -> None:
+        """Store code that answered a question successfully."""
+        question = question.strip()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO examples VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, question, code, answer_template, time.time()),
+                )
+                self._conn.execute(
+                    "DELETE FROM examples WHERE namespace = ? AND question IN ("
+                    " SELECT question FROM examples WHERE namespace = ?"
+                    " ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.namespace, self.namespace, self.max_entries),
+                )
+            self._rows.pop(question, None)
+            self._rows[question] = (code, answer_template)
+            while len(self._rows) > self.max_entries:
+                del self._rows[next(iter(self._rows))]
+            if question in self._by_question or len(self._examples) >= len(self._rows):
+                # Replaced or evicted entries: rebuild rather than patch
+                self._build()
+                return
+            grams = self._insert(self._example(question, code, answer_template))
+            if len(self._examples) > self._fitted_size * (1 + REFIT_GROWTH):
+                self._refit()
+            else:
+                self._norms.append(self._norm(grams))
+
+    def reuse(self, question: str) -> Reuse | None:
+        """Return stored code re-parameterized for a question, if possible.
+
+        Args:
+            question: Natural language question.
+
+        Returns:
+            The code and answer template for the question, or None if no
+            stored question has the same skeleton or its code cannot be
+            re-parameterized.
+        """
+        with self._lock:
+            skeleton, entities = extract_entities(question, self._matchers)
+            candidates = self._by_skeleton.get(skeleton, [])
+            # Most recently stored first
+            for example in reversed(candidates):
+                code = substitute_entities(example.code, example.entities, entities)
+                if code is None:
+                    continue
+                template = example.answer_template
+                if template is not None:
+                    template = self._substitute_text(
+                        template, example.entities, entities
+                    )
+                self._touch(example.question)
+                return Reuse(code, template, example.question)
+        return None
+
+    def examples(self, question: str) -> list[Example]:
+        """Return the stored pairs most similar to a question.
+
+        Args:
+            question: Natural language question.
+
+        Returns:
+            Up to ``few_shot_count`` examples with a skeleton similarity of
+            at least ``few_shot_min_similarity``, most similar first.
+        """
+        with self._lock:
+            skeleton, _ = extract_entities(question, self._matchers)
+            scored = self._search(skeleton)
+        return [
+            example
+            for example, similarity in scored[: self.few_shot_count]
+            if similarity >= self.few_shot_min_similarity
+        ]
+
+    def clear(self) -> None:
+        """Remove every entry of this namespace."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM examples WHERE namespace = ?", (self.namespace,)
+                )
+            self._rows.clear()
+            self._build()
+
+    def _example(
+        self, question: str, code: str, answer_template: str | None
+    ) -> Example:
+        skeleton, entities = extract_entities(question, self._matchers)
+        return Example(question, code, answer_template, skeleton, entities)
+
+    def _build(self) -> None:
+        """Rebuild every in-memory structure from the stored rows."""
+        self._examples: list[Example] = []
+        self._by_question: dict[str, Example] = {}
+        self._by_skeleton: dict[str, list[Example]] = {}
+        self._grams: list[Counter[str]] = []
+        self._postings: dict[str, list[int]] = {}
+        for question, (code, template) in self._rows.items():
+            self._insert(self._example(question, code, template))
+        self._refit()
+
+    def _insert(self, example: Example) -> Counter[str]:
+        """Add one example to the in-memory structures (without its norm)."""
+        position = len(self._examples)
+        self._examples.append(example)
+        self._by_question[example.question] = example
+        self._by_skeleton.setdefault(example.skeleton, []).append(example)
+        grams = _ngrams(example.skeleton)
+        self._grams.append(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(position)
+        return grams
+
+    def _refit(self) -> None:
+        """Recompute the IDF weights and the example vector norms."""
+        size = len(self._examples)
+        self._idf = {
+            gram: math.log((1 + size) / (1 + len(positions))) + 1
+            for gram, positions in self._postings.items()
+        }
+        self._fitted_size = size
+        self._norms = [self._norm(grams) for grams in self._grams]
+
+    def _weight(self, gram: str, count: int) -> float:
+        # Grams unseen at fit time get the weight of the rarest grams
+        idf = self._idf.get(gram, math.log(1 + self._fitted_size) + 1)
+        return (1 + math.log(count)) * idf
+
+    def _norm(self, grams: Counter[str]) -> float:
+        return math.sqrt(
+            sum(self._weight(gram, count) ** 2 for gram, count in grams.items())
+        )
+
+    def _search(self, skeleton: str) -> list[tuple[Example, float]]:
+        """Rank the examples by cosine similarity of their skeletons."""
+        grams = _ngrams(skeleton)
+        norm = self._norm(grams)
+        if not norm:
+            return []
+        scores: dict[int, float] = {}
+        for gram, count in grams.items():
+            weight = self._weight(gram, count)
+            for position in self._postings.get(gram, ()):
+                scores[position] = scores.get(position, 0.0) + weight * self._weight(
+                    gram, self._grams[position][gram]
+                )
+        return sorted(
+            (
+                (self._examples[position], score / (norm * self._norms[position]))
+                for position, score in scores.items()
+                if self._norms[position]
+            ),
+            key=lambda pair: -pair[1],
+        )
+
+    def _touch(self, question: str) -> None:
+        """Mark an entry as used so eviction keeps it."""
+        self._rows[question] = self._rows.pop(question)
+        with self._conn:
+            self._conn.execute(
+                "UPDATE examples SET last_used = ?"
+                " WHERE namespace = ? AND question = ?",
+                (time.time(), self.namespace, question),
+            )
+
+    @staticmethod
+    def _substitute_text(
+        text: str, old: Sequence[Entity], new: Sequence[Entity]
+    ) -> str | None:
+        """Replace changed table values and years in free text.
+
+        Returns:
+            The rewritten text, or None if it mentions a changed entity that
+            cannot be replaced.
+        """
+        for before, after in zip(old, new, strict=True):
+            if before.value == after.value:
+                continue
+            if before.kind in {"date", "month", "number"}:
+                if before.value in text:
+                    return None
+                continue
+            text = re.sub(
+                rf"(?<![\w]){re.escape(before.value)}(?![\w])",
+                after.value,
+                text,
+                flags=re.IGNORECASE,
+            )
+        return text
@@ -1,75 +1,283 @@
-"""System prompts for the RAG agent."""
+"""System prompts for the RAG agent.
 
-SCHEMA_DESCRIPTION = """
-# Database Schema
+The code generation prompt is split in two: a static system prompt (role,
+rules, examples) that is byte-identical for every question, so provider-side
+prompt caching can reuse it, and a question-specific user message carrying the
+schema and query rules. The schema is described table by table so it can be
+pruned to what a question needs (see ``src.llm.prompt_builder``).
+"""
 
-You have access to three related pandas DataFrames containing business invoice data:
-
-## DataFrame: clients
-Contains information about 20 business clients.
-
-Columns:
-- client_id (string, PRIMARY KEY): Unique identifier (format: C001, C002, etc.)
-- client_name (string): Company name
-- industry (string): Business sector (Manufacturing, Legal, Financial Services, Retail, Logistics, etc.)
-- country (string): Client's country location (USA, UK, Germany, Canada, etc.)
-
-## DataFrame: invoices
-Contains 40 invoices issued to clients.
-
-Columns:
-- invoice_id (string, PRIMARY KEY): Unique identifier (format: I1001, I1002, etc.)
-- client_id (string, FOREIGN KEY → clients.client_id): References the client
-- invoice_date (datetime): Date invoice was issued
-- due_date (datetime): Payment due date
-- status (string): Payment status - one of ["Paid", "Overdue", "Draft"]
-- currency (string): Invoice currency (USD, EUR, etc.)
-- fx_rate_to_usd (float): Exchange rate to convert to USD
-
-## DataFrame: line_items
-Contains 96 individual line items across all invoices.
-
-Columns:
-- line_id (string, PRIMARY KEY): Unique identifier (format: L001, L002, etc.)
-- invoice_id (string, FOREIGN KEY → invoices.invoice_id): References the invoice
-- service_name (string): Service provided. Available services:
-  * Court Appearance
-  * M&A Advisory
-  * Tax Planning
-  * IT Security Assessment
-  * Training Session
-  * Custom Reporting
-  * Contract Review
-  * Regulatory Compliance Audit
-- quantity (integer): Number of units of service
-- unit_price (float): Price per unit in invoice currency
-- tax_rate (float): Tax rate as decimal (e.g., 0.2 = 20%, 0.1 = 10%)
-
-## DataFrame: merged
+from collections.abc import Collection, Mapping, Sequence
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ColumnSchema:
+    """Description of a single DataFrame column."""
+
+    name: str
+    description: str
+    # Keys and labels are kept whenever their table is, so joins still work
+    essential: bool = False
+
+
+@dataclass(frozen=True)
+class TableSchema:
+    """Description of a DataFrame exposed to generated code."""
+
+    name: str
+    summary: str
+    columns: tuple[ColumnSchema, ...]
+
+
+TABLE_SCHEMAS: dict[str, TableSchema] = {
+    "clients": TableSchema(
+        name="clients",
+        summary="Contains information about 20 business clients.",
+        columns=(
+            ColumnSchema(
+                "client_id",
+                "client_id (string, PRIMARY KEY): Unique identifier "
+                "(format: C001, C002, etc.)",
+                essential=True,
+            ),
+            ColumnSchema(
+                "client_name", "client_name (string): Company name", essential=True
+            ),
+            ColumnSchema(
+                "industry",
+                "industry (string): Business sector (Manufacturing, Legal, "
+                "Financial Services, Retail, Logistics, etc.)",
+            ),
+            ColumnSchema(
+                "country",
+                "country (string): Client's country location "
+                "(USA, UK, Germany, Canada, etc.)",
+            ),
+        ),
+    ),
+    "invoices": TableSchema(
+        name="invoices",
+        summary="Contains 40 invoices issued to clients.",
+        columns=(
+            ColumnSchema(
+                "invoice_id",
+                "invoice_id (string, PRIMARY KEY): Unique identifier "
+                "(format: I1001, I1002, etc.)",
+                essential=True,
+            ),
+            ColumnSchema(
+                "client_id",
+                "client_id (string, FOREIGN KEY → clients.client_id): "
+                "References the client",
+                essential=True,
+            ),
+            ColumnSchema(
+                "invoice_date", "invoice_date (datetime): Date invoice was issued"
+            ),
+            ColumnSchema("due_date", "due_date (datetime): Payment due date"),
+            ColumnSchema(
+                "status",
+                'status (string): Payment status - one of ["Paid", "Overdue", "Draft"]',
+            ),
+            ColumnSchema(
+                "currency", "currency (string): Invoice currency (USD, EUR, etc.)"
+            ),
+            ColumnSchema(
+                "fx_rate_to_usd",
+                "fx_rate_to_usd (float): Exchange rate to convert to USD",
+            ),
+        ),
+    ),
+    "line_items": TableSchema(
+        name="line_items",
+        summary="Contains 96 individual line items across all invoices.",
+        columns=(
+            ColumnSchema(
+                "line_id",
+                "line_id (string, PRIMARY KEY): Unique identifier "
+                "(format: L001, L002, etc.)",
+                essential=True,
+            ),
+            ColumnSchema(
+                "invoice_id",
+                "invoice_id (string, FOREIGN KEY → invoices.invoice_id): "
+                "References the invoice",
+                essential=True,
+            ),
+            ColumnSchema(
+                "service_name",
+                "service_name (string): Service provided. Available services:\n"
+                "  * Court Appearance\n"
+                "  * M&A Advisory\n"
+                "  * Tax Planning\n"
+                "  * IT Security Assessment\n"
+                "  * Training Session\n"
+                "  * Custom Reporting\n"
+                "  * Contract Review\n"
+                "  * Regulatory Compliance Audit",
+            ),
+            ColumnSchema(
+                "quantity", "quantity (integer): Number of units of service"
+            ),
+            ColumnSchema(
+                "unit_price", "unit_price (float): Price per unit in invoice currency"
+            ),
+            ColumnSchema(
+                "tax_rate",
+                "tax_rate (float): Tax rate as decimal (e.g., 0.2 = 20%, 0.1 = 10%)",
+            ),
+        ),
+    ),
+}
+
+MERGED_SCHEMA = """## DataFrame: merged
 A pre-joined DataFrame containing all columns from clients, invoices, and line_items.
-Also includes a pre-computed column:
-- line_total (float): quantity × unit_price × (1 + tax_rate)
+Also includes pre-computed columns:
+- line_total (float): quantity x unit_price x (1 + tax_rate), in invoice currency
+- line_total_usd (float): line_total x fx_rate_to_usd
+"""
 
-## Relationships
+AGGREGATES_SCHEMA = """## Revenue Aggregates
+Pre-computed from merged; each has one row per group and year, with:
+- year (int): Year of invoice_date
+- total (float): Sum of line_total (with tax, invoice currency)
+- total_usd (float): Sum of line_total_usd
+- invoice_count (int), line_count (int): Number of invoices and line items
+
+DataFrames:
+- revenue_by_client: client_id, client_name, industry, country, year + totals
+- revenue_by_country: country, year + totals, client_count
+- revenue_by_service: service_name, year + totals, quantity
+- revenue_by_month: year, month (datetime, first day of month) + totals
+"""
+
+RELATIONSHIPS = """## Relationships
 - clients (1) → (Many) invoices (join on client_id)
 - invoices (1) → (Many) line_items (join on invoice_id)
+"""
 
-## Important Calculation Rules
+CALCULATION_RULES = """## Important Calculation Rules
 1. Line Item Total (with tax): quantity * unit_price * (1 + tax_rate)
 2. Invoice Total: Sum of all line_total for that invoice_id
 3. Client Total: Sum of all line_total for that client_id
 """
 
-CODE_GENERATION_SYSTEM_PROMPT = f"""You are a pandas code generator. Given a user question about invoice data, generate Python code that queries the data and stores the result in a variable called `result`.
+# Rules that only matter for some questions; they travel with the schema
+MONEY_RULE = (
+    "For calculations involving money, ALWAYS include tax using: "
+    "quantity * unit_price * (1 + tax_rate)"
+)
+AGGREGATE_RULE = (
+    "For revenue totals per client, country, service or month (optionally "
+    "filtered by year), read the revenue_by_* aggregates instead of grouping "
+    "merged; use merged for other filters (status, date ranges, services of "
+    "one client). Use the *_usd columns only when amounts in USD are asked for"
+)
+JOIN_RULE = "Use the `merged` DataFrame when you need data from multiple tables"
+DATE_RULE = "For date filtering, invoice_date is already a datetime type"
+QUERY_RULES = (MONEY_RULE, AGGREGATE_RULE, JOIN_RULE, DATE_RULE)
+
+
+def render_schema(
+    columns: Mapping[str, Collection[str]] | None = None,
+    *,
+    calculation_rules: bool = True,
+) -> str:
+    """Render the schema description, optionally pruned.
+
+    Args:
+        columns: Columns to describe per table; ``"merged"`` and
+            ``"aggregates"`` select the pre-joined DataFrame and the revenue
+            aggregates (their values are ignored). None describes every table
+            and column.
+        calculation_rules: Whether to include the money calculation rules.
+
+    Returns:
+        Markdown schema description.
+    """
+    derived = ["merged", "aggregates"]
+    if columns is None:
+        tables = [*TABLE_SCHEMAS, *derived]
+        header = (
+            "You have access to three related pandas DataFrames containing "
+            "business invoice data:"
+        )
+    else:
+        tables = [name for name in [*TABLE_SCHEMAS, *derived] if name in columns]
+        header = (
+            "You have access to these related pandas DataFrames containing "
+            "business invoice data (only the parts relevant to the question "
+            "are described):"
+        )
+
+    sections = [f"\n# Database Schema\n\n{header}\n"]
+    for name in tables:
+        if name == "merged":
+            sections.append(MERGED_SCHEMA)
+            continue
+        if name == "aggregates":
+            sections.append(AGGREGATES_SCHEMA)
+            continue
+        table = TABLE_SCHEMAS[name]
+        wanted = None if columns is None else columns[name]
+        lines = [
+            f"- {column.description}"
+            for column in table.columns
+            if wanted is None or column.name in wanted
+        ]
+        sections.append(
+            f"## DataFrame: {name}\n{table.summary}\n\nColumns:\n"
+            + "\n".join(lines)
+            + "\n"
+        )
+    if len(tables) > 1:
+        sections.append(RELATIONSHIPS)
+    if calculation_rules:
+        sections.append(CALCULATION_RULES)
+    return "\n".join(sections)
+
+
+def render_query_rules(rules: Sequence[str]) -> str:
+    """Render question-specific query rules as a numbered list."""
+    if not rules:
+        return ""
+    lines = [f"{number}. {rule}" for number, rule in enumerate(rules, start=1)]
+    return "## Query Rules\n" + "\n".join(lines) + "\n"
+
+
+SCHEMA_DESCRIPTION = render_schema()
+
+# Schema and rules used when the question is not pruned
+FULL_SCHEMA_CONTEXT = SCHEMA_DESCRIPTION + "\n" + render_query_rules(QUERY_RULES)
+
+# Used instead of the full schema when a question matches no table or column
+# but the session has earlier results: it is most likely a follow-up on them
+FOLLOW_UP_SCHEMA_CONTEXT = """
+# Database Schema
+
+This looks like a follow-up question: answer it from the results of earlier turns described below. The invoice data DataFrames (clients, invoices, line_items, merged, aggregates) remain available if those results lack what the question needs.
+"""
 
-{SCHEMA_DESCRIPTION}
+CODE_GENERATION_SYSTEM_PROMPT = """You are a pandas code generator. Given a user question about invoice data, generate Python code that queries the data and stores the result in a variable called `result`. The schema of the relevant DataFrames and any question-specific query rules are given with the question.
 
 ## Available Variables
 You have access to these pandas DataFrames:
 - clients: Client information
 - invoices: Invoice records
 - line_items: Line items for invoices
-- merged: Pre-joined table with line_total column
+- merged: Pre-joined table with line_total and line_total_usd columns
+- revenue_by_client, revenue_by_country, revenue_by_service, revenue_by_month:
+  Pre-computed revenue totals per group and year
+
+## Lookup Helpers
+Indexed lookups, much faster than filtering whole tables:
+- get_client(client) -> Series: clients row for a client_id or client name (case-insensitive)
+- get_invoice(invoice_id) -> Series: invoices row
+- invoices_for_client(client, start=None, end=None) -> DataFrame: a client's invoices by invoice_date, optionally within start..end (inclusive)
+- invoices_between(start, end) -> DataFrame: invoices with invoice_date within start..end (inclusive)
+- line_items_for_invoice(invoice_id) -> DataFrame: an invoice's line items with line_total and line_total_usd
+Dates are 'YYYY-MM-DD' strings or Timestamps. Unknown ids or names raise KeyError.
 
 ## Rules
 1. ONLY output Python code, no explanations
@@ -79,11 +287,10 @@ You have access to these pandas DataFrames:
    - A DataFrame (for listing/table results)
    - A dict (for single values or aggregated results)
    - A scalar value (for counts, sums, etc.)
-5. For calculations involving money, ALWAYS include tax using: quantity * unit_price * (1 + tax_rate)
-6. Use the `merged` DataFrame when you need data from multiple tables
-7. For date filtering, invoice_date is already a datetime type
-8. Do NOT use print statements
-9. Do NOT import any modules (pandas is available as pd)
+5. Follow the query rules given with the question
+6. Use the lookup helpers for a single client or invoice and for invoice date ranges
+7. Do NOT use print statements
+8. Do NOT import any modules (pandas is available as pd)
 
 ## Examples
 
@@ -99,18 +306,158 @@ result = clients[clients['country'] == 'UK'][['client_name', 'country']]
 
 Question: "For each client, compute the total amount billed in 2024"
 ```python
-totals = merged.groupby('client_name')['line_total'].sum().reset_index()
-totals.columns = ['client_name', 'total_billed']
+totals = revenue_by_client[revenue_by_client['year'] == 2024]
+totals = totals[['client_name', 'total']].rename(columns={'total': 'total_billed'})
 result = totals.sort_values('total_billed', ascending=False)
 ```
 
 Question: "Which client has the highest total billed amount in 2024?"
 ```python
-totals = merged.groupby('client_name')['line_total'].sum()
-result = {{'client': totals.idxmax(), 'total': totals.max()}}
+totals = revenue_by_client[revenue_by_client['year'] == 2024]
+top = totals.loc[totals['total'].idxmax()]
+result = {'client': top['client_name'], 'total': top['total']}
+```
+
+Question: "Show all invoices issued to Bright Legal in February 2024"
+```python
+result = invoices_for_client('Bright Legal', '2024-02-01', '2024-02-29')
+```
+
+Question: "What is the total of invoice I1001?"
+```python
+result = line_items_for_invoice('I1001')['line_total'].sum()
 ```
 """
 
+ANSWER_TEMPLATE_INSTRUCTIONS = """
+## Answer Template
+After the code block, also output a short answer template in a separate
+```answer block. The template is filled in from `result` without another LLM
+call, so it must not contain any numbers or names of its own. Placeholders:
+- {value}: the scalar `result` (use a format spec for numbers, e.g. {value:,.2f})
+- {<key>}: a value of a dict `result`, e.g. {total:,.2f}
+- {table}: a DataFrame/Series `result` rendered as a table
+- {row_count}: number of rows of a DataFrame/Series `result`
+Write "$" before monetary placeholders only when the values are in USD.
+
+Example:
+```python
+totals = revenue_by_client[revenue_by_client['year'] == 2024]
+top = totals.loc[totals['total'].idxmax()]
+result = {'client': top['client_name'], 'total': top['total']}
+```
+```answer
+The client with the highest total billed amount is {client}, with {total:,.2f} in total (including tax).
+```
+"""
+
+CODE_GENERATION_WITH_TEMPLATE_SYSTEM_PROMPT = (
+    CODE_GENERATION_SYSTEM_PROMPT.replace(
+        "1. ONLY output Python code, no explanations",
+        "1. ONLY output the Python code block and the answer template, "
+        "no explanations",
+    )
+    + ANSWER_TEMPLATE_INSTRUCTIONS
+)
+
+SQL_GENERATION_SYSTEM_PROMPT = """You are a DuckDB SQL generator. Given a user question about invoice data, generate one SQL SELECT query that answers it. The schema of the relevant tables and any question-specific query rules are given with the question; every DataFrame described there is a SQL table of the same name with the same columns.
+
+## Available Tables
+- clients: Client information
+- invoices: Invoice records
+- line_items: Line items for invoices
+- merged: Pre-joined table with line_total and line_total_usd columns
+- revenue_by_client, revenue_by_country, revenue_by_service, revenue_by_month:
+  Pre-computed revenue totals per group and year
+
+## Rules
+1. ONLY output SQL, no explanations
+2. Output exactly one SELECT statement (WITH clauses are fine); no DDL, DML, PRAGMA or file access
+3. The query result is the answer:
+   - Several rows (for listing/table results)
+   - A single row with named columns (for several values)
+   - A single row and column (for counts, sums, etc.)
+4. Follow the query rules given with the question
+5. Alias computed columns with descriptive snake_case names
+6. Use DuckDB functions for dates, e.g. year(invoice_date), invoice_date BETWEEN DATE '2024-02-01' AND DATE '2024-02-29'
+
+## Examples
+
+Question: "List all clients with their industries"
+```sql
+SELECT client_name, industry FROM clients
+```
+
+Question: "Which clients are based in the UK?"
+```sql
+SELECT client_name, country FROM clients WHERE country = 'UK'
+```
+
+Question: "For each client, compute the total amount billed in 2024"
+```sql
+SELECT client_name, total AS total_billed
+FROM revenue_by_client
+WHERE year = 2024
+ORDER BY total_billed DESC
+```
+
+Question: "Which client has the highest total billed amount in 2024?"
+```sql
+SELECT client_name AS client, total
+FROM revenue_by_client
+WHERE year = 2024
+ORDER BY total DESC
+LIMIT 1
+```
+
+Question: "Show all invoices issued to Bright Legal in February 2024"
+```sql
+SELECT i.*
+FROM invoices i JOIN clients c USING (client_id)
+WHERE c.client_name = 'Bright Legal'
+  AND i.invoice_date BETWEEN DATE '2024-02-01' AND DATE '2024-02-29'
+ORDER BY i.invoice_date
+```
+
+Question: "What is the total of invoice I1001?"
+```sql
+SELECT sum(line_total) AS total FROM merged WHERE invoice_id = 'I1001'
+```
+"""
+
+SQL_ANSWER_TEMPLATE_INSTRUCTIONS = """
+## Answer Template
+After the SQL block, also output a short answer template in a separate
+```answer block. The template is filled in from the query result without
+another LLM call, so it must not contain any numbers or names of its own.
+Placeholders:
+- {value}: a single-row, single-column result (use a format spec for numbers, e.g. {value:,.2f})
+- {<column>}: a column of a single-row result, e.g. {total:,.2f}
+- {table}: a multi-row result rendered as a table
+- {row_count}: number of rows of a multi-row result
+Write "$" before monetary placeholders only when the values are in USD.
+
+Example:
+```sql
+SELECT client_name AS client, total
+FROM revenue_by_client
+WHERE year = 2024
+ORDER BY total DESC
+LIMIT 1
+```
+```answer
+The client with the highest total billed amount is {client}, with {total:,.2f} in total (including tax).
+```
+"""
+
+SQL_GENERATION_WITH_TEMPLATE_SYSTEM_PROMPT = (
+    SQL_GENERATION_SYSTEM_PROMPT.replace(
+        "1. ONLY output SQL, no explanations",
+        "1. ONLY output the SQL block and the answer template, no explanations",
+    )
+    + SQL_ANSWER_TEMPLATE_INSTRUCTIONS
+)
+
 RESPONSE_FORMATTING_SYSTEM_PROMPT = """You are a helpful assistant that formats data query results into clear, natural language responses.
 
 ## Rules
@@ -129,22 +476,175 @@ RESPONSE_FORMATTING_SYSTEM_PROMPT = """You are a helpful assistant that formats
 """
 
 
-def get_code_generation_prompt(question: str) -> str:
+def render_examples(examples: Sequence[tuple[str, str]], language: str) -> str:
+    """Render solved (question, code) pairs as few-shot examples.
+
+    Args:
+        examples: Similar questions with the code that answered them.
+        language: Fence language of the code, "python" or "sql".
+
+    Returns:
+        Markdown section, or an empty string if there are no examples.
+    """
+    if not examples:
+        return ""
+    blocks = "\n\n".join(
+        f'Question: "{question}"\n```{language}\n{code}\n```'
+        for question, code in examples
+    )
+    return f"""
+## Similar Answered Questions
+This code answered similar questions correctly; adapt it where it fits.
+
+{blocks}
+"""
+
+
+def render_earlier_results(
+    results: Sequence[tuple[str, str, str]], language: str
+) -> str:
+    """Render the stored results of a session's earlier turns.
+
+    Args:
+        results: ``(name, question, description)`` of each stored result.
+        language: Language of the generated code, "python" or "sql".
+
+    Returns:
+        Markdown section, or an empty string if there are no results.
+    """
+    if not results:
+        return ""
+    kind = "tables" if language == "sql" else "DataFrames"
+    lines = "\n".join(
+        f'- `{name}` (from "{question}"): {description}'
+        for name, question, description in results
+    )
+    return f"""
+## Results of Earlier Turns
+These results of earlier questions in this conversation are available as {kind} by name. For a follow-up question, filter or aggregate them instead of querying the full data again.
+
+{lines}
+"""
+
+
+def get_code_generation_prompt(
+    question: str,
+    *,
+    with_answer_template: bool = False,
+    schema: str | None = None,
+    examples: Sequence[tuple[str, str]] = (),
+    earlier_results: Sequence[tuple[str, str, str]] = (),
+) -> str:
     """Build the prompt for code generation.
 
+    Everything question-specific lives here rather than in the system prompt,
+    which keeps the system prompt a cacheable prefix.
+
     Args:
         question: The user's natural language question.
+        with_answer_template: Whether to also ask for an answer template.
+        schema: Schema and query rules relevant to the question. Defaults to
+            the full schema with every rule.
+        examples: Similar answered (question, code) pairs to show.
+        earlier_results: ``(name, question, description)`` of the session's
+            stored results of earlier turns.
 
     Returns:
         The complete prompt for the LLM.
     """
-    return f"""Generate pandas code to answer this question:
+    if schema is None:
+        schema = FULL_SCHEMA_CONTEXT
+    schema = (
+        schema.lstrip()
+        + render_earlier_results(earlier_results, "python")
+        + render_examples(examples, "python")
+    )
+    if with_answer_template:
+        return f"""{schema}
+Generate pandas code to answer this question:
+
+Question: {question}
+
+Remember: Store your result in a variable called `result`. Output the Python code block followed by the ```answer template block, no explanations."""
+
+    return f"""{schema}
+Generate pandas code to answer this question:
 
 Question: {question}
 
 Remember: Store your result in a variable called `result`. Only output Python code, no explanations."""
 
 
+def get_sql_generation_prompt(
+    question: str,
+    *,
+    with_answer_template: bool = False,
+    schema: str | None = None,
+    examples: Sequence[tuple[str, str]] = (),
+    earlier_results: Sequence[tuple[str, str, str]] = (),
+) -> str:
+    """Build the prompt for SQL generation.
+
+    Args:
+        question: The user's natural language question.
+        with_answer_template: Whether to also ask for an answer template.
+        schema: Schema and query rules relevant to the question. Defaults to
+            the full schema with every rule.
+        examples: Similar answered (question, SQL) pairs to show.
+        earlier_results: ``(name, question, description)`` of the session's
+            stored results of earlier turns.
+
+    Returns:
+        The complete prompt for the LLM.
+    """
+    if schema is None:
+        schema = FULL_SCHEMA_CONTEXT
+    schema = (
+        schema.lstrip()
+        + render_earlier_results(earlier_results, "sql")
+        + render_examples(examples, "sql")
+    )
+    if with_answer_template:
+        return f"""{schema}
+Generate a DuckDB SQL query to answer this question:
+
+Question: {question}
+
+Remember: Output one SELECT statement in a ```sql block followed by the ```answer template block, no explanations."""
+
+    return f"""{schema}
+Generate a DuckDB SQL query to answer this question:
+
+Question: {question}
+
+Remember: Output one SELECT statement only, no explanations."""
+
+
+def get_code_repair_prompt(error: str, *, with_answer_template: bool = False) -> str:
+    """Build the follow-up turn asking to fix code that failed to execute.
+
+    It is sent after the original prompt and the failing code, so it only
+    needs the error.
+
+    Args:
+        error: Error reported by the execution.
+        with_answer_template: Whether to also ask for an answer template.
+
+    Returns:
+        The follow-up prompt for the LLM.
+    """
+    if with_answer_template:
+        return f"""Running that code failed with:
+{error}
+
+Fix the code. Output the corrected code block, then the ```answer template block."""
+
+    return f"""Running that code failed with:
+{error}
+
+Fix the code. Only output the corrected code block, no explanations."""
+
+
 def get_response_formatting_prompt(question: str, data_result: str) -> str:
     """Build the prompt for formatting the response.
 
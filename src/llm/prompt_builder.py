@@ -0,0 +1,334 @@
+"""Question-aware schema pruning for code generation prompts.
+
+Most questions touch one or two tables and a handful of columns, yet the full
+schema and every rule used to be sent with each of them. The builder matches
+the question against table and column vocabulary and against the categorical
+values actually present in the loaded DataFrames ("UK", "Acme Corp",
+"Overdue"), and describes only what matched. Questions that match nothing get
+the full schema.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import NamedTuple
+
+import pandas as pd
+
+from src.llm.prompt import (
+    AGGREGATE_RULE,
+    DATE_RULE,
+    FOLLOW_UP_SCHEMA_CONTEXT,
+    JOIN_RULE,
+    MONEY_RULE,
+    TABLE_SCHEMAS,
+    render_query_rules,
+    render_schema,
+)
+
+# Columns with more distinct values than this are not indexed for matching
+MAX_INDEXED_VALUES = 200
+
+# Words that point at a table as a whole
+TABLE_KEYWORDS: dict[str, frozenset[str]] = {
+    "clients": frozenset({"client", "customer", "company", "companies"}),
+    "invoices": frozenset({"invoice", "bill"}),
+    "line_items": frozenset({"line", "item"}),
+}
+
+# Words that point at a column, in addition to the parts of its name
+COLUMN_KEYWORDS: dict[tuple[str, str], frozenset[str]] = {
+    ("clients", "industry"): frozenset({"industry", "sector"}),
+    ("clients", "country"): frozenset(
+        {"country", "based", "located", "location", "where", "europe", "european"}
+    ),
+    ("invoices", "invoice_date"): frozenset(
+        {
+            "date",
+            "day",
+            "week",
+            "month",
+            "quarter",
+            "year",
+            "issued",
+            "when",
+            "recent",
+            "latest",
+            "earliest",
+        }
+    ),
+    ("invoices", "due_date"): frozenset({"due", "late"}),
+    ("invoices", "status"): frozenset(
+        {"status", "paid", "unpaid", "overdue", "draft", "outstanding"}
+    ),
+    ("invoices", "currency"): frozenset(
+        {"currency", "usd", "eur", "gbp", "convert", "converted", "exchange", "fx"}
+    ),
+    ("invoices", "fx_rate_to_usd"): frozenset(
+        {"usd", "convert", "converted", "exchange", "fx"}
+    ),
+    ("line_items", "service_name"): frozenset({"service", "offering"}),
+    ("line_items", "quantity"): frozenset({"quantity", "unit", "hour", "volume"}),
+    ("line_items", "unit_price"): frozenset({"price", "rate", "pricing"}),
+    ("line_items", "tax_rate"): frozenset({"tax", "vat"}),
+}
+
+# Words implying a monetary calculation over line items
+MONEY_KEYWORDS = frozenset(
+    {
+        "revenue",
+        "billed",
+        "billing",
+        "amount",
+        "total",
+        "spend",
+        "spent",
+        "sale",
+        "value",
+        "cost",
+        "earn",
+        "earned",
+        "income",
+        "money",
+        "much",
+        "pay",
+    }
+)
+
+# Column name parts too generic to identify a column on their own; table
+# words are ignored as well so "invoices" selects the whole table
+_IGNORED_NAME_PARTS = frozenset({"id", "to", "name"}).union(*TABLE_KEYWORDS.values())
+
+# Shorter values (single letters, codes) are not matched against questions
+MIN_VALUE_LENGTH = 2
+
+# "may" is left out; it is far more often the verb
+_MONTHS = frozenset(
+    {
+        "january",
+        "february",
+        "march",
+        "april",
+        "june",
+        "july",
+        "august",
+        "september",
+        "october",
+        "november",
+        "december",
+        "jan",
+        "feb",
+        "mar",
+        "apr",
+        "jun",
+        "jul",
+        "aug",
+        "sep",
+        "sept",
+        "oct",
+        "nov",
+        "dec",
+    }
+)
+_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+_WORD = re.compile(r"[a-z0-9&]+")
+
+
+def _normalize(word: str) -> str:
+    """Reduce a word to a stem shared by its singular and plural forms.
+
+    A light suffix stripper in the spirit of the Porter stemmer: plural
+    endings are removed ("statuses" and "status" both give "status",
+    "companies" gives "company") and so is a final silent "e", so that
+    "prices" and "price" meet at "pric". Stems are only compared with each
+    other, never shown.
+    """
+    if len(word) <= len("bus"):
+        return word
+    if word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif word.endswith(("sses", "shes", "ches", "xes", "zes", "uses")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    if word.endswith("e") and len(word) > len("date"):
+        word = word[:-1]
+    return word
+
+
+def _normalize_all(words: frozenset[str]) -> frozenset[str]:
+    """Normalize every word of a keyword set."""
+    return frozenset(_normalize(word) for word in words)
+
+
+class ValueMatcher(NamedTuple):
+    """Whole-phrase matcher for one value of a categorical column."""
+
+    # Matches the lower-cased value in lower-cased text
+    pattern: re.Pattern[str]
+    table: str
+    column: str
+    # The value as stored in the table
+    value: str
+
+
+def index_values(dataframes: dict[str, pd.DataFrame]) -> list[ValueMatcher]:
+    """Build whole-phrase matchers for low-cardinality string values.
+
+    Args:
+        dataframes: Loaded DataFrames, keyed by table name.
+
+    Returns:
+        One matcher per distinct value of every string column described in
+        the schema with at most ``MAX_INDEXED_VALUES`` values.
+    """
+    matchers = []
+    for name, table in TABLE_SCHEMAS.items():
+        frame = dataframes.get(name)
+        if frame is None:
+            continue
+        for column in table.columns:
+            if column.name not in frame.columns:
+                continue
+            series = frame[column.name]
+            if series.dtype.kind not in "OU" and not isinstance(
+                series.dtype, pd.StringDtype
+            ):
+                continue
+            values = series.dropna().unique()
+            if len(values) > MAX_INDEXED_VALUES:
+                continue
+            for value in values:
+                text = str(value).strip().lower()
+                if len(text) < MIN_VALUE_LENGTH:
+                    continue
+                pattern = re.compile(rf"(?<![a-z0-9]){re.escape(text)}(?![a-z0-9])")
+                matchers.append(ValueMatcher(pattern, name, column.name, str(value)))
+    return matchers
+
+
+@dataclass(frozen=True)
+class SchemaSelection:
+    """Tables, columns and rules selected for a question."""
+
+    # Columns to describe per table; "merged" and "aggregates" map to an
+    # empty tuple
+    columns: dict[str, tuple[str, ...]]
+    rules: tuple[str, ...]
+    # False when nothing matched and the full schema is used
+    pruned: bool
+
+    def render(self) -> str:
+        """Render the selection as schema plus query rules."""
+        if not self.pruned:
+            schema = render_schema()
+        else:
+            schema = render_schema(
+                self.columns, calculation_rules=MONEY_RULE in self.rules
+            )
+        return schema + "\n" + render_query_rules(self.rules)
+
+
+class PromptBuilder:
+    """Selects the schema parts a question needs."""
+
+    def __init__(self, dataframes: dict[str, pd.DataFrame] | None = None) -> None:
+        """Index the vocabulary used to match questions.
+
+        Args:
+            dataframes: Loaded DataFrames whose categorical values are matched
+                against questions. If None, only names and keywords are used.
+        """
+        self._table_keywords = {
+            table: _normalize_all(words) for table, words in TABLE_KEYWORDS.items()
+        }
+        self._column_keywords: dict[tuple[str, str], frozenset[str]] = {}
+        for table in TABLE_SCHEMAS.values():
+            for column in table.columns:
+                parts = frozenset(column.name.split("_")) - _IGNORED_NAME_PARTS
+                extra = COLUMN_KEYWORDS.get((table.name, column.name), frozenset())
+                self._column_keywords[table.name, column.name] = _normalize_all(
+                    parts | extra
+                )
+        self._money_keywords = _normalize_all(MONEY_KEYWORDS)
+        self._values = index_values(dataframes or {})
+
+    def select(self, question: str) -> SchemaSelection:
+        """Select the tables, columns and rules a question needs.
+
+        Args:
+            question: The user's natural language question.
+
+        Returns:
+            SchemaSelection for the question.
+        """
+        text = question.lower()
+        words = {_normalize(word) for word in _WORD.findall(text)}
+
+        whole_tables = {
+            table
+            for table, keywords in self._table_keywords.items()
+            if words & keywords
+        }
+        matched: dict[str, set[str]] = {}
+        for (table, column), keywords in self._column_keywords.items():
+            if words & keywords:
+                matched.setdefault(table, set()).add(column)
+        for matcher in self._values:
+            if matcher.pattern.search(text):
+                matched.setdefault(matcher.table, set()).add(matcher.column)
+        if _YEAR.search(text) or words & _MONTHS:
+            matched.setdefault("invoices", set()).add("invoice_date")
+
+        money = bool(words & self._money_keywords)
+        if money:
+            matched.setdefault("line_items", set()).update(
+                ("quantity", "unit_price", "tax_rate")
+            )
+
+        tables = whole_tables | set(matched)
+        if not tables:
+            return SchemaSelection(
+                columns={},
+                rules=(MONEY_RULE, AGGREGATE_RULE, JOIN_RULE, DATE_RULE),
+                pruned=False,
+            )
+
+        columns: dict[str, tuple[str, ...]] = {}
+        for name, schema in TABLE_SCHEMAS.items():
+            if name not in tables:
+                continue
+            wanted = matched.get(name)
+            # A table named without any of its columns is described in full
+            columns[name] = tuple(
+                column.name
+                for column in schema.columns
+                if wanted is None or column.essential or column.name in wanted
+            )
+
+        rules = [MONEY_RULE, AGGREGATE_RULE] if money else []
+        if len(columns) > 1 or money:
+            # line_total only exists on the pre-joined frame
+            columns["merged"] = ()
+            rules.append(JOIN_RULE)
+        if money:
+            columns["aggregates"] = ()
+        if {"invoice_date", "due_date"} & set(columns.get("invoices", ())):
+            rules.append(DATE_RULE)
+        return SchemaSelection(columns=columns, rules=tuple(rules), pruned=True)
+
+    def schema_for(self, question: str, *, follow_up: bool = False) -> str:
+        """Render the schema and query rules relevant to a question.
+
+        Args:
+            question: The user's natural language question.
+            follow_up: Whether earlier results of the session are available.
+                A question matching nothing then gets a short note pointing
+                at them instead of the full schema.
+
+        Returns:
+            Markdown schema description followed by the query rules.
+        """
+        selection = self.select(question)
+        if follow_up and not selection.pruned:
+            return FOLLOW_UP_SCHEMA_CONTEXT
+        return selection.render()
@@ -0,0 +1,485 @@
+"""Pooled, rate-limited, retrying transport for OpenAI API calls.
+
+Every request goes through three gates before it is sent:
+
+1. A cool-down set by the last ``429`` that carried ``Retry-After``.
+2. Token buckets sized to the model's requests-per-minute and
+   tokens-per-minute limits. Each request reserves its estimated tokens
+   (prompt plus ``max_completion_tokens``, as the provider counts them); the
+   estimate is settled against the reported usage afterwards.
+3. An adaptive concurrency limit: it grows by one request per window of
+   successes and halves on every ``429`` (additive increase, multiplicative
+   decrease), staying between 1 and ``max_concurrency``.
+
+Failed requests that are worth retrying (rate limits, timeouts, connection
+errors and 5xx) are retried with exponential backoff and full jitter, or after
+the server's ``Retry-After`` when it sends one. The SDK's own retries are
+disabled so they do not multiply. Connections come from one keep-alive pool per
+client.
+"""
+
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterable, Iterator
+from dataclasses import dataclass
+
+import httpx
+import openai
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from src.config.settings import EnvironmentConfig
+
+# Characters per prompt token when estimating a request's size
+CHARS_PER_TOKEN = 4
+
+# Status codes worth retrying besides 5xx
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429})
+RATE_LIMITED = 429
+SERVER_ERROR = 500
+# Error code of a 429 caused by an exhausted quota rather than the rate limit
+QUOTA_EXHAUSTED = "insufficient_quota"
+
+
+@dataclass
+class CallStats:
+    """What the transport did for one API call."""
+
+    # Seconds spent waiting for the rate limits, concurrency slots and
+    # backoff before the request that succeeded was sent
+    queue_seconds: float = 0.0
+    # Attempts that failed and were retried
+    retries: int = 0
+    # Retries caused by the provider's rate limit (429)
+    throttled: int = 0
+
+
+class TokenBucket:
+    """Thread-safe token bucket handing out reservations.
+
+    A reservation takes its tokens immediately, even if that drives the level
+    below zero, and returns how long the caller must wait until the tokens
+    would have been available. Callers are served in reservation order and no
+    lock is held while they wait.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        """Initialize a full bucket.
+
+        Args:
+            per_minute: Refill rate; also the capacity (one minute's burst).
+        """
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take tokens and return the seconds to wait before using them."""
+        with self._lock:
+            self._refill()
+            # A request larger than the bucket waits for a full bucket
+            self._level -= min(amount, self.capacity)
+            return max(0.0, -self._level / self.rate)
+
+    def refund(self, amount: float) -> None:
+        """Return reserved tokens that were not used."""
+        with self._lock:
+            self._refill()
+            self._level = min(self.capacity, self._level + amount)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(
+            self.capacity, self._level + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+
+# A coroutine waiting for a slot: its event loop and the future waking it
+_AsyncWaiter = tuple[asyncio.AbstractEventLoop, asyncio.Future[None]]
+
+
+class AdaptiveLimiter:
+    """Concurrency limit adjusted by additive increase, multiplicative decrease.
+
+    Usable from threads and from event loops at the same time: threads wait
+    on a condition variable, coroutines on futures woken through their loop.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1) -> None:
+        """Initialize at the maximum limit.
+
+        Args:
+            max_limit: Highest number of requests in flight.
+            min_limit: Lowest limit reached by repeated decreases.
+        """
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self._limit = float(max_limit)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._async_waiters: list[_AsyncWaiter] = []
+
+    @property
+    def limit(self) -> int:
+        """Current number of requests allowed in flight."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """Requests currently holding a slot."""
+        return self._in_flight
+
+    def acquire(self) -> None:
+        """Block until a slot is free and take it."""
+        with self._condition:
+            while not self._try_acquire():
+                self._condition.wait()
+
+    async def acquire_async(self) -> None:
+        """Wait (without blocking the loop) until a slot is free and take it."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._try_acquire():
+                    return
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await waiter[1]
+            finally:
+                with self._condition:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def release(self, *, throttled: bool = False) -> None:
+        """Free a slot and adapt the limit to the request's outcome.
+
+        Args:
+            throttled: Whether the provider rate-limited the request.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self._limit = max(self.min_limit, self._limit / 2)
+            else:
+                # +1 after a full window of successes
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # The waiter's loop was closed; nobody is waiting any more
+                continue
+
+    def _try_acquire(self) -> bool:
+        if self._in_flight >= int(self._limit):
+            return False
+        self._in_flight += 1
+        return True
+
+
+def _wake(future: asyncio.Future[None]) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def retry_after_seconds(error: BaseException) -> float | None:
+    """Return the delay the server asked for in an error response, if any.
+
+    Reads ``retry-after-ms`` and ``retry-after`` (seconds or an HTTP date).
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed request may succeed when sent again."""
+    if isinstance(error, openai.APIConnectionError):
+        # Includes timeouts
+        return True
+    if not isinstance(error, openai.APIStatusError):
+        return False
+    if error.code == QUOTA_EXHAUSTED:
+        # Also a 429, but waiting does not help
+        return False
+    return (
+        error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= SERVER_ERROR
+    )
+
+
+def is_throttled(error: BaseException) -> bool:
+    """Whether the provider rejected a request for exceeding its rate limit."""
+    return (
+        isinstance(error, openai.APIStatusError) and error.status_code == RATE_LIMITED
+    )
+
+
+def estimate_tokens(messages: list[dict[str, str]], max_completion_tokens: int) -> int:
+    """Tokens a request counts against the TPM limit before it runs."""
+    prompt_chars = sum(len(message["content"]) for message in messages)
+    return prompt_chars // CHARS_PER_TOKEN + max_completion_tokens
+
+
+class Transport:
+    """Sends OpenAI API calls through rate limits, concurrency control and retries."""
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        *,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        max_concurrency: int = 16,
+        max_retries: int = 5,
+        backoff_base_seconds: float = 0.5,
+        backoff_max_seconds: float = 30.0,
+        pool_connections: int = 20,
+        keepalive_seconds: float = 30.0,
+        timeout_seconds: float = 120.0,
+        http_transport: httpx.BaseTransport | None = None,
+        async_http_transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        """Initialize the transport and its connection pools.
+
+        Args:
+            api_key: OpenAI API key. If None, uses OPENAI_API_KEY env var.
+            requests_per_minute: Request rate limit; 0 disables it.
+            tokens_per_minute: Token rate limit; 0 disables it.
+            max_concurrency: Ceiling of the adaptive concurrency limit.
+            max_retries: Retries per call before its error is raised.
+            backoff_base_seconds: Backoff ceiling for the first retry; it
+                doubles with every further retry.
+            backoff_max_seconds: Largest backoff ceiling.
+            pool_connections: Keep-alive connections held per client.
+            keepalive_seconds: Idle time before a pooled connection is closed.
+            timeout_seconds: Timeout per request attempt.
+            http_transport: Sends the synchronous client's HTTP requests
+                instead of the pooled network transport (e.g. a recorded
+                stand-in).
+            async_http_transport: The same for the async client.
+        """
+        limits = httpx.Limits(
+            max_connections=pool_connections,
+            max_keepalive_connections=pool_connections,
+            keepalive_expiry=keepalive_seconds,
+        )
+        self.client = OpenAI(
+            api_key=api_key,
+            max_retries=0,
+            timeout=timeout_seconds,
+            http_client=DefaultHttpxClient(limits=limits, transport=http_transport),
+        )
+        self.async_client = AsyncOpenAI(
+            api_key=api_key,
+            max_retries=0,
+            timeout=timeout_seconds,
+            http_client=DefaultAsyncHttpxClient(
+                limits=limits, transport=async_http_transport
+            ),
+        )
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        # Monotonic time before which no request is sent (set by Retry-After)
+        self._cooldown_until = 0.0
+
+    @classmethod
+    def from_settings(
+        cls,
+        settings: EnvironmentConfig,
+        api_key: str | None = None,
+        *,
+        http_transport: httpx.BaseTransport | None = None,
+        async_http_transport: httpx.AsyncBaseTransport | None = None,
+    ) -> "Transport":
+        """Create a transport configured by the ``LLM_*`` settings.
+
+        Args:
+            settings: Application settings.
+            api_key: OpenAI API key. If None, uses OPENAI_API_KEY env var.
+            http_transport: See :meth:`__init__`.
+            async_http_transport: See :meth:`__init__`.
+
+        Returns:
+            The transport.
+        """
+        return cls(
+            api_key,
+            requests_per_minute=settings.llm_rpm_limit,
+            tokens_per_minute=settings.llm_tpm_limit,
+            max_concurrency=settings.llm_max_concurrency,
+            max_retries=settings.llm_max_retries,
+            backoff_base_seconds=settings.llm_backoff_base_seconds,
+            backoff_max_seconds=settings.llm_backoff_max_seconds,
+            pool_connections=settings.llm_pool_connections,
+            keepalive_seconds=settings.llm_keepalive_seconds,
+            timeout_seconds=settings.llm_timeout_seconds,
+            http_transport=http_transport,
+            async_http_transport=async_http_transport,
+        )
+
+    def call[T](self, request: Callable[[], T], tokens: int, stats: CallStats) -> T:
+        """Send a request, waiting for capacity and retrying failures.
+
+        Args:
+            request: Sends the request once.
+            tokens: Estimated tokens (see :func:`estimate_tokens`).
+            stats: Filled in with the queueing delay and retries.
+
+        Returns:
+            The request's result.
+
+        Raises:
+            openai.OpenAIError: The last error once retries are exhausted, or
+                the first error that is not worth retrying.
+        """
+        while True:
+            time.sleep(self._admission_delay(tokens, stats))
+            started = time.perf_counter()
+            self.limiter.acquire()
+            stats.queue_seconds += time.perf_counter() - started
+            throttled = False
+            try:
+                return request()
+            except openai.OpenAIError as e:
+                throttled = is_throttled(e)
+                delay = self._on_failure(e, tokens, stats)
+            finally:
+                # Also on errors the transport does not handle (and on
+                # KeyboardInterrupt), so the slot is never lost
+                self.limiter.release(throttled=throttled)
+            time.sleep(delay)
+            stats.queue_seconds += delay
+
+    async def call_async[T](
+        self, request: Callable[[], Awaitable[T]], tokens: int, stats: CallStats
+    ) -> T:
+        """Async variant of :meth:`call`."""
+        while True:
+            await asyncio.sleep(self._admission_delay(tokens, stats))
+            started = time.perf_counter()
+            await self.limiter.acquire_async()
+            stats.queue_seconds += time.perf_counter() - started
+            throttled = False
+            try:
+                return await request()
+            except openai.OpenAIError as e:
+                throttled = is_throttled(e)
+                delay = self._on_failure(e, tokens, stats)
+            finally:
+                # Also when the calling task is cancelled
+                self.limiter.release(throttled=throttled)
+            await asyncio.sleep(delay)
+            stats.queue_seconds += delay
+
+    def stream[T](
+        self, request: Callable[[], Iterable[T]], tokens: int, stats: CallStats
+    ) -> Iterator[T]:
+        """Send a streaming request, holding its concurrency slot until the end.
+
+        Only opening the stream is retried; an error after the first chunk is
+        raised to the consumer.
+        """
+        while True:
+            time.sleep(self._admission_delay(tokens, stats))
+            started = time.perf_counter()
+            self.limiter.acquire()
+            stats.queue_seconds += time.perf_counter() - started
+            opened = throttled = False
+            try:
+                chunks = request()
+                opened = True
+            except openai.OpenAIError as e:
+                throttled = is_throttled(e)
+                delay = self._on_failure(e, tokens, stats)
+            finally:
+                # An open stream keeps its slot until it is consumed
+                if not opened:
+                    self.limiter.release(throttled=throttled)
+            if opened:
+                break
+            time.sleep(delay)
+            stats.queue_seconds += delay
+        try:
+            yield from chunks
+        finally:
+            self.limiter.release()
+
+    def settle(self, reserved: int, used: int) -> None:
+        """Refund the part of a token reservation the call did not use."""
+        if self.tokens is not None and used < reserved:
+            self.tokens.refund(reserved - used)
+
+    def _admission_delay(self, tokens: int, stats: CallStats) -> float:
+        """Reserve rate-limit capacity and return the seconds to wait for it."""
+        delay = max(0.0, self._cooldown_until - time.monotonic())
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(tokens))
+        stats.queue_seconds += delay
+        return delay
+
+    def _on_failure(
+        self, error: openai.OpenAIError, tokens: int, stats: CallStats
+    ) -> float:
+        """Return the delay before retrying a failed attempt.
+
+        The caller releases the attempt's concurrency slot.
+
+        Raises:
+            openai.OpenAIError: ``error``, if it is not retried.
+        """
+        throttled = is_throttled(error)
+        # The failed attempt spent no tokens; a retry reserves them again
+        self.settle(tokens, 0)
+        if not is_retryable(error) or stats.retries >= self.max_retries:
+            raise error
+        stats.retries += 1
+        stats.throttled += int(throttled)
+
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            if throttled:
+                # Hold back every request, not just this one
+                self._cooldown_until = max(
+                    self._cooldown_until, time.monotonic() + retry_after
+                )
+            return retry_after
+        ceiling = min(
+            self.backoff_max_seconds,
+            self.backoff_base_seconds * 2 ** (stats.retries - 1),
+        )
+        return random.uniform(0, ceiling)  # noqa: S311 - jitter, not security
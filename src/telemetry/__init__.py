@@ -0,0 +1,28 @@
+"""Request tracing, structured logging and Prometheus-style metrics."""
+
+from src.telemetry.logs import configure_logging
+from src.telemetry.metrics import REGISTRY, Counter, Histogram, Registry
+from src.telemetry.tracing import (
+    Span,
+    Trace,
+    current_trace,
+    format_timings,
+    iter_in_trace,
+    span,
+    start_trace,
+)
+
+__all__ = [
+    "REGISTRY",
+    "Counter",
+    "Histogram",
+    "Registry",
+    "Span",
+    "Trace",
+    "configure_logging",
+    "current_trace",
+    "format_timings",
+    "iter_in_trace",
+    "span",
+    "start_trace",
+]
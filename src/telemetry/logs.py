@@ -0,0 +1,49 @@
+"""structlog configuration for the entry points (UI, HTTP API, benchmark)."""
+
+import logging
+import sys
+
+import structlog
+
+LOG_FORMATS = ("console", "json")
+
+
+def configure_logging(level: str = "INFO", log_format: str = "console") -> None:
+    """Configure structlog to write to stderr.
+
+    Args:
+        level: Lowest level logged, e.g. ``"DEBUG"`` (includes every span)
+            or ``"INFO"`` (one summary line per request).
+        log_format: ``"console"`` for human-readable lines or ``"json"`` for
+            one JSON object per line.
+
+    Raises:
+        ValueError: If the level or format is unknown.
+    """
+    numeric_level = logging.getLevelNamesMapping().get(level.upper())
+    if numeric_level is None:
+        msg = f"Unknown log level: {level!r}"
+        raise ValueError(msg)
+    if log_format not in LOG_FORMATS:
+        msg = f"Unknown log format: {log_format!r} (expected one of {LOG_FORMATS})"
+        raise ValueError(msg)
+    # The console renderer prints tracebacks itself; JSON lines need them
+    # rendered into a field first
+    renderers: list[structlog.typing.Processor] = (
+        [structlog.processors.format_exc_info, structlog.processors.JSONRenderer()]
+        if log_format == "json"
+        else [structlog.dev.ConsoleRenderer()]
+    )
+    structlog.configure(
+        processors=[
+            structlog.contextvars.merge_contextvars,
+            structlog.processors.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso"),
+            *renderers,
+        ],
+        wrapper_class=structlog.make_filtering_bound_logger(numeric_level),
+        logger_factory=structlog.PrintLoggerFactory(sys.stderr),
+        # Sandbox workers forked after the parent logged reconfigure their
+        # inherited loggers
+        cache_logger_on_first_use=False,
+    )
@@ -0,0 +1,259 @@
+"""Prometheus-style counters and histograms.
+
+A small in-process registry rendered in the Prometheus text exposition
+format (served by the HTTP API at ``GET /metrics``). Instruments are
+module-level and shared by every agent in the process.
+"""
+
+import math
+import threading
+from collections.abc import Sequence
+
+# Latency buckets in seconds, from sub-millisecond steps to slow LLM calls
+SECONDS_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# Result size buckets in bytes, 1 KB to 100 MB
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)
+    )
+    return f"{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonically increasing value per label combination."""
+
+    kind = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        """Initialize the counter.
+
+        Args:
+            name: Metric name (``_total`` suffix by convention).
+            documentation: Help text.
+            labelnames: Names of the labels every sample carries.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Add to the counter for the given labels."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Current value for the given labels."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> list[str]:
+        """Sample lines in the text exposition format."""
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = SECONDS_BUCKETS,
+    ) -> None:
+        """Initialize the histogram.
+
+        Args:
+            name: Metric name.
+            documentation: Help text.
+            labelnames: Names of the labels every sample carries.
+            buckets: Upper bounds of the buckets, ascending; ``+Inf`` is
+                added.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = (*sorted(buckets), math.inf)
+        # Per label combination: bucket counts, sum, count
+        self._series: dict[LabelValues, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record a value for the given labels."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts, totals = self._series.setdefault(
+                key, ([0] * len(self.buckets), [0.0, 0.0])
+            )
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            totals[0] += value
+            totals[1] += 1
+
+    def count(self, **labels: str) -> int:
+        """Number of observations for the given labels."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return 0 if series is None else int(series[1][1])
+
+    def render(self) -> list[str]:
+        """Sample lines in the text exposition format."""
+        with self._lock:
+            series = sorted(
+                (key, (list(counts), list(totals)))
+                for key, (counts, totals) in self._series.items()
+            )
+        lines = []
+        bucket_labels = (*self.labelnames, "le")
+        for key, (counts, (total, count)) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts, strict=True):
+                cumulative += bucket_count
+                labels = _format_labels(bucket_labels, (*key, _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {_format_value(count)}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._lock = threading.Lock()
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        """Create and register a counter."""
+        metric = Counter(name, documentation, labelnames)
+        self._register(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = SECONDS_BUCKETS,
+    ) -> Histogram:
+        """Create and register a histogram."""
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._register(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: Counter | Histogram) -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                msg = f"Metric already registered: {metric.name}"
+                raise ValueError(msg)
+            self._metrics[metric.name] = metric
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    "invoice_chat_requests_total",
+    "Questions handled, by outcome (answered, failed, error).",
+    ("outcome",),
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "invoice_chat_request_seconds", "Time to answer a question."
+)
+SPAN_SECONDS = REGISTRY.histogram(
+    "invoice_chat_span_seconds", "Time spent per pipeline step.", ("span",)
+)
+LLM_CALLS = REGISTRY.counter(
+    "invoice_chat_llm_calls_total",
+    "LLM completions, by purpose and source (api, cache, reused).",
+    ("purpose", "source"),
+)
+LLM_TOKENS = REGISTRY.counter(
+    "invoice_chat_llm_tokens_total",
+    "Tokens billed by the API, by purpose and kind (prompt, completion, "
+    "cached_prompt).",
+    ("purpose", "kind"),
+)
+LLM_RETRIES = REGISTRY.counter(
+    "invoice_chat_llm_retries_total", "Retried LLM API attempts.", ("purpose",)
+)
+EXECUTIONS = REGISTRY.counter(
+    "invoice_chat_executions_total",
+    "Code executions, by outcome (success, error, memo).",
+    ("outcome",),
+)
+CANDIDATE_RUNS = REGISTRY.counter(
+    "invoice_chat_candidate_runs_total",
+    "Speculative candidate runs, by outcome (first: the first candidate was "
+    "accepted, rescued: it failed and another one was accepted, switched: "
+    "another one was accepted first or by majority, failed).",
+    ("outcome",),
+)
+RESULT_BYTES = REGISTRY.histogram(
+    "invoice_chat_result_bytes",
+    "Approximate size of successful execution results.",
+    buckets=BYTES_BUCKETS,
+)
@@ -0,0 +1,201 @@
+"""Per-request traces made of timed spans, logged with structlog.
+
+Every question gets a :class:`Trace` with a random ID, active in a context
+variable while it is answered. Streams activate it only while producing each
+event (:func:`iter_in_trace`), so it does not leak into the consumer. The
+steps on the request path (prompt build, each LLM call, compile, exec, result
+encoding) run in :func:`span`, which times the step and records its
+attributes (token counts, cache hits, result sizes). Each span is logged
+with the trace ID, added to the active trace and observed in the span
+duration histogram. Spans outside a trace are still logged and measured.
+
+When the request finishes, the trace logs one summary line and yields the
+per-step timing breakdown attached to the response.
+"""
+
+import contextvars
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any
+
+import structlog
+
+from src.telemetry.metrics import REQUEST_SECONDS, REQUESTS, SPAN_SECONDS
+
+logger = structlog.get_logger(__name__)
+
+# Span attributes summed into a trace's token usage
+USAGE_ATTRIBUTES = ("prompt_tokens", "completion_tokens", "cached_prompt_tokens")
+
+_current: contextvars.ContextVar["Trace | None"] = contextvars.ContextVar(
+    "trace", default=None
+)
+
+
+@dataclass
+class Span:
+    """One timed step of a request."""
+
+    name: str
+    seconds: float
+    attributes: dict[str, Any]
+
+
+class Trace:
+    """The spans of one request."""
+
+    def __init__(self) -> None:
+        """Start a trace with a fresh ID."""
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.spans: list[Span] = []
+        self.finished = False
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        """Record a finished span."""
+        with self._lock:
+            self.spans.append(span)
+
+    def timings(self) -> dict[str, float]:
+        """Seconds per step name (repeated steps are summed), and the total."""
+        timings: dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                timings[span.name] = timings.get(span.name, 0.0) + span.seconds
+        timings["total"] = time.perf_counter() - self._start
+        return timings
+
+    def usage(self) -> dict[str, int]:
+        """Tokens used by the request's LLM calls."""
+        with self._lock:
+            return {
+                name: sum(int(span.attributes.get(name, 0)) for span in self.spans)
+                for name in USAGE_ATTRIBUTES
+            }
+
+    def finish(self, outcome: str, **attributes: Any) -> None:  # noqa: ANN401
+        """Log the request summary and update the request metrics (once).
+
+        Args:
+            outcome: ``"answered"``, ``"failed"`` (the code did not run) or
+                ``"error"`` (an exception was raised).
+            **attributes: Extra fields for the summary log line.
+        """
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+        timings = self.timings()
+        REQUESTS.inc(outcome=outcome)
+        REQUEST_SECONDS.observe(timings["total"])
+        logger.info(
+            "request",
+            trace_id=self.trace_id,
+            outcome=outcome,
+            timings_ms={name: round(s * 1000, 1) for name, s in timings.items()},
+            **self.usage(),
+            **attributes,
+        )
+
+
+def current_trace() -> Trace | None:
+    """The trace of the request being answered in this context, if any."""
+    return _current.get()
+
+
+@contextmanager
+def start_trace(*, activate: bool = True) -> Iterator[Trace]:
+    """Answer a request under a new trace.
+
+    The trace is finished with outcome ``"error"`` if the block raises, and
+    ``"incomplete"`` if it exits (e.g. an abandoned stream) without calling
+    :meth:`Trace.finish`.
+
+    Args:
+        activate: Make the trace current for the whole block. Generators
+            pass ``False`` and produce their items with :func:`iter_in_trace`,
+            as a context variable set across a ``yield`` would stay set in
+            the consumer.
+
+    Yields:
+        The new trace.
+    """
+    trace = Trace()
+    token = _current.set(trace) if activate else None
+    try:
+        yield trace
+    except Exception as e:
+        trace.finish("error", error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        trace.finish("incomplete")
+        if token is not None:
+            _current.reset(token)
+
+
+def iter_in_trace[T](trace: Trace, items: Iterator[T]) -> Iterator[T]:
+    """Iterate over ``items`` with ``trace`` current only while each is produced.
+
+    Args:
+        trace: Trace of the request the items belong to.
+        items: Iterator whose steps record spans, e.g. a stream of events.
+
+    Yields:
+        The items, with the caller's trace restored before each one.
+    """
+    while True:
+        token = _current.set(trace)
+        try:
+            item = next(items)
+        except StopIteration:
+            return
+        finally:
+            _current.reset(token)
+        yield item
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[dict[str, Any]]:  # noqa: ANN401
+    """Time one step of the current request.
+
+    Args:
+        name: Step name, e.g. ``"llm.generate"`` or ``"exec"``.
+        **attributes: Initial attributes.
+
+    Yields:
+        The span's attributes, to be filled in by the step.
+    """
+    trace = _current.get()
+    attributes = dict(attributes)
+    start = time.perf_counter()
+    try:
+        yield attributes
+    except Exception as e:
+        attributes["error"] = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        SPAN_SECONDS.observe(seconds, span=name)
+        if trace is not None:
+            trace.add(Span(name, seconds, attributes))
+        logger.debug(
+            "span",
+            trace_id=trace.trace_id if trace is not None else None,
+            span=name,
+            duration_ms=round(seconds * 1000, 3),
+            **attributes,
+        )
+
+
+def format_timings(timings: dict[str, float]) -> str:
+    """Render a timing breakdown compactly, e.g. ``llm.generate 1.20 s · ...``."""
+
+    def duration(seconds: float) -> str:
+        return f"{seconds:.2f} s" if seconds >= 1 else f"{seconds * 1000:.0f} ms"
+
+    return " · ".join(f"{name} {duration(s)}" for name, s in timings.items())
@@ -1,6 +1,16 @@
 """Tools package for code execution."""
 
-from src.tools.code_executor import CodeExecutor, ExecutionResult
-
-__all__ = ["CodeExecutor", "ExecutionResult"]
+from src.tools.code_executor import CodeExecutor, ExecutionResult, PandasEngine
+from src.tools.duckdb_engine import DuckDBEngine
+from src.tools.engine import ExecutionEngine
+from src.tools.sandbox import SandboxLimits, SandboxPool
 
+__all__ = [
+    "CodeExecutor",
+    "DuckDBEngine",
+    "ExecutionEngine",
+    "ExecutionResult",
+    "PandasEngine",
+    "SandboxLimits",
+    "SandboxPool",
+]
@@ -1,11 +1,42 @@
-"""Safe code executor for pandas queries."""
+"""Safe code executor for generated queries."""
 
-from dataclasses import dataclass
-from typing import Any
+import ast
+import contextvars
+import hashlib
+import numbers
+import sys
+import threading
+from collections import Counter, OrderedDict
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+from types import CodeType
+from typing import TYPE_CHECKING, Any
 
 import pandas as pd
 
-MAX_RESULT_ROWS = 50
+from src.dataloaders.indexes import TableIndexes
+from src.telemetry.metrics import CANDIDATE_RUNS, EXECUTIONS, RESULT_BYTES
+from src.telemetry.tracing import span
+from src.tools.code_optimizer import DEFAULT_MAX_COST, CostReport, optimize
+from src.tools.engine import ExecutionEngine
+from src.tools.lookup import LOOKUP_HELPER_TABLES, build_lookup_helpers
+from src.tools.result_encoder import RESULT_TOKEN_BUDGET, encode_result
+
+if TYPE_CHECKING:
+    from src.tools.sandbox import SandboxPool
+
+# Memory budget for memoized execution results
+MEMO_MAX_BYTES = 256 * 1024 * 1024
+# Number of compiled code objects kept around
+COMPILE_CACHE_SIZE = 256
+# Attribute/function names whose result changes between runs; code calling
+# them is never memoized
+NON_DETERMINISTIC_NAMES = frozenset({"now", "today", "utcnow", "sample", "random"})
+# How CodeExecutor.execute_candidates picks among successful candidates
+ACCEPT_POLICIES = ("first", "majority")
+# Decimals floats are rounded to before results are compared
+FINGERPRINT_DECIMALS = 6
 
 
 @dataclass
@@ -16,34 +47,268 @@ class ExecutionResult:
     result: Any
     error: str | None = None
     result_type: str = ""
+    # Whether the result was served from the execution memo
+    cached: bool = False
+    # Vectorizing rewrites applied to the code before it ran
+    rewrites: tuple[str, ...] = ()
 
-    def to_string(self) -> str:
-        """Convert result to string for LLM consumption."""
+    def to_string(self, max_tokens: int = RESULT_TOKEN_BUDGET) -> str:
+        """Convert result to a compact string for LLM consumption.
+
+        Args:
+            max_tokens: Approximate token budget; large results are summarized
+                from all rows instead of being cut off.
+        """
         if not self.success:
             return f"Error: {self.error}"
+        return encode_result(self.result, max_tokens)
 
-        if isinstance(self.result, pd.DataFrame):
-            if len(self.result) == 0:
-                return "No results found (empty DataFrame)"
-            # Limit output for very large results
-            if len(self.result) > MAX_RESULT_ROWS:
-                return (
-                    f"DataFrame with {len(self.result)} rows. "
-                    f"First {MAX_RESULT_ROWS} rows:\n{self.result.head(MAX_RESULT_ROWS).to_string()}"
-                )
-            return self.result.to_string()
 
-        if isinstance(self.result, pd.Series):
-            return self.result.to_string()
+@dataclass
+class CandidateRun:
+    """Outcome of running alternative programs for one question."""
 
-        if isinstance(self.result, dict):
-            return str(self.result)
+    # Index of the accepted candidate; the first one if every candidate failed
+    chosen: int
+    # The accepted candidate's result
+    result: ExecutionResult
+    # Result per candidate; None for candidates still running when the first
+    # success was accepted
+    results: list[ExecutionResult | None]
+    # Successful candidates whose result agrees with the accepted one
+    # (including it); only counted by the "majority" policy
+    agreeing: int = 0
 
-        return str(self.result)
 
+@dataclass(frozen=True)
+class CompiledCode:
+    """Compiled generated code together with its static analysis."""
+
+    # Hash of the normalized code, insensitive to formatting and comments
+    code_hash: str
+    # Python code object; None for engines that do not run Python
+    code_object: CodeType | None
+    # DataFrame names the code reads
+    dependencies: frozenset[str]
+    deterministic: bool
+    # Source that actually runs (after vectorizing rewrites)
+    source: str
+    cost: CostReport
+
+
+def compile_code(code: str, table_rows: dict[str, int]) -> CompiledCode:
+    """Parse, analyze, optimize and compile generated code.
+
+    Args:
+        code: Python source to compile.
+        table_rows: Row count of every DataFrame available to the code, used
+            for cost estimation.
+
+    Returns:
+        CompiledCode for the source.
+
+    Raises:
+        SyntaxError: If the code does not parse.
+    """
+    tree = ast.parse(code, "<generated>", "exec")
+    code_hash = hashlib.sha256(ast.dump(tree).encode("utf-8")).hexdigest()
+
+    dependencies: set[str] = set()
+    deterministic = True
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in table_rows:
+            dependencies.add(node.id)
+        elif isinstance(node, ast.Name) and node.id in LOOKUP_HELPER_TABLES:
+            # Helpers read tables on the code's behalf
+            dependencies.update(LOOKUP_HELPER_TABLES[node.id])
+        elif isinstance(node, ast.Attribute) and node.attr in NON_DETERMINISTIC_NAMES:
+            deterministic = False
+
+    optimized, cost = optimize(tree, table_rows)
+    return CompiledCode(
+        code_hash=code_hash,
+        code_object=compile(optimized, "<generated>", "exec"),
+        dependencies=frozenset(dependencies),
+        deterministic=deterministic,
+        source=ast.unparse(optimized) if cost.rewrites else code,
+        cost=cost,
+    )
 
-class CodeExecutor:
-    """Executes pandas code in a sandboxed environment."""
+
+def copy_on_write_enabled() -> bool:
+    """Whether pandas Copy-on-Write is in effect (always from pandas 3)."""
+    if int(pd.__version__.split(".", maxsplit=1)[0]) >= 3:  # noqa: PLR2004
+        return True
+    return pd.options.mode.copy_on_write is True
+
+
+def enable_copy_on_write() -> None:
+    """Turn on pandas Copy-on-Write, which keeps :func:`private_views` cheap.
+
+    The option is process-wide, so entry points call this once at startup
+    rather than toggling it around each run while other threads may be
+    executing code.
+    """
+    if not copy_on_write_enabled():
+        pd.options.mode.copy_on_write = True
+
+
+def private_views(
+    dataframes: Mapping[str, pd.DataFrame],
+) -> dict[str, pd.DataFrame]:
+    """Give one run its own copies of the shared DataFrames.
+
+    Under Copy-on-Write (see :func:`enable_copy_on_write`) these are zero-copy
+    views sharing their arrays with the originals: writing to a view
+    (assigning columns, ``.loc`` updates, ``inplace=True``) copies just the
+    data it touches, and NumPy arrays taken from a view are read-only, so
+    nothing a run does is visible to other runs. Without it (pandas 2 used as
+    a library, without the entry points), the frames are copied deeply.
+
+    Args:
+        dataframes: Shared DataFrames by name.
+
+    Returns:
+        Dict mapping the same names to private copies.
+    """
+    deep = not copy_on_write_enabled()
+    return {name: frame.copy(deep=deep) for name, frame in dataframes.items()}
+
+
+def estimate_size(value: Any) -> int:  # noqa: ANN401
+    """Estimate the memory footprint of an execution result in bytes."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, list | tuple | set):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def result_fingerprint(value: Any) -> str:  # noqa: ANN401
+    """Fingerprint a result so that equivalent results of different code match.
+
+    Labels and order are ignored: a Series, the same data as a DataFrame with
+    its index as a column, renamed or reordered columns and sorted rows all
+    compare equal. Floats are rounded to ``FINGERPRINT_DECIMALS``.
+    """
+    if isinstance(value, dict):
+        try:
+            value = pd.Series(value)
+        except (TypeError, ValueError):
+            return hashlib.sha256(repr(value).encode("utf-8")).hexdigest()
+    if isinstance(value, pd.Series):
+        value = value.to_frame()
+    if isinstance(value, pd.DataFrame):
+        frame = value if isinstance(value.index, pd.RangeIndex) else value.reset_index()
+        columns: list[tuple[int, pd.Series]] = []
+        for position in range(frame.shape[1]):
+            column = frame.iloc[:, position].reset_index(drop=True)
+            if pd.api.types.is_float_dtype(column):
+                column = column.round(FINGERPRINT_DECIMALS)
+            try:
+                hashes = pd.util.hash_pandas_object(column, index=False)
+            except TypeError:  # unhashable cells, e.g. lists
+                column = column.astype(str)
+                hashes = pd.util.hash_pandas_object(column, index=False)
+            # A row-order-insensitive key puts the columns in a canonical order
+            columns.append((int(hashes.to_numpy().sum()), column))
+        digest = hashlib.sha256(repr(frame.shape).encode("utf-8"))
+        if columns:
+            columns.sort(key=lambda keyed: keyed[0])
+            canonical = pd.concat(
+                [column for _, column in columns], axis=1, ignore_index=True
+            )
+            # Hashing whole rows keeps which values belong together; sorting
+            # the row hashes ignores row order
+            rows = pd.util.hash_pandas_object(canonical, index=False).sort_values()
+            digest.update(rows.to_numpy().tobytes())
+        return digest.hexdigest()
+    if isinstance(value, bool):
+        text = repr(value)
+    elif isinstance(value, numbers.Real):
+        text = repr(round(float(value), FINGERPRINT_DECIMALS))
+    else:
+        text = repr(value)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+MemoKey = tuple[str, tuple[tuple[str, int], ...]]
+
+
+class ResultMemo:
+    """LRU memo of execution results bounded by an approximate byte budget."""
+
+    def __init__(self, max_bytes: int = MEMO_MAX_BYTES) -> None:
+        """Initialize an empty memo.
+
+        Args:
+            max_bytes: Approximate upper bound for memoized result sizes.
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: OrderedDict[MemoKey, tuple[ExecutionResult, int]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of memoized results."""
+        return len(self._entries)
+
+    def get(self, key: MemoKey) -> ExecutionResult | None:
+        """Return a memoized result and mark it as recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(
+        self, key: MemoKey, result: ExecutionResult, size: int | None = None
+    ) -> None:
+        """Memoize a result, evicting least recently used entries if needed.
+
+        Args:
+            key: Memo key of the code that produced the result.
+            result: Successful execution result.
+            size: The result's :func:`estimate_size`, if already known.
+        """
+        if size is None:
+            size = estimate_size(result.result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def invalidate(self, table: str) -> None:
+        """Drop every entry whose code reads the given table."""
+        with self._lock:
+            stale = [
+                key
+                for key in self._entries
+                if any(name == table for name, _ in key[1])
+            ]
+            for key in stale:
+                self.total_bytes -= self._entries.pop(key)[1]
+
+
+class PandasEngine(ExecutionEngine):
+    """Runs generated pandas code, in-process or in a sandbox pool."""
+
+    language = "python"
 
     # Allowed built-in functions for safety
     ALLOWED_BUILTINS = {
@@ -72,38 +337,92 @@ class CodeExecutor:
         "None": None,
     }
 
-    def __init__(self, dataframes: dict[str, pd.DataFrame]) -> None:
-        """Initialize executor with dataframes.
+    def __init__(
+        self,
+        dataframes: dict[str, pd.DataFrame],
+        sandbox: "SandboxPool | None" = None,
+        indexes: TableIndexes | None = None,
+    ) -> None:
+        """Initialize the engine.
 
         Args:
             dataframes: Dict mapping names to DataFrames.
+            sandbox: Worker pool to run code in. If None, code runs in this
+                process.
+            indexes: Indexes over the DataFrames backing the lookup helpers.
+                If None, they are built from the DataFrames when possible.
         """
-        self.dataframes = dataframes
+        self.sandbox = sandbox
+        # DataFrames and the helpers over them, swapped as one reference so a
+        # run never mixes tables of two data versions
+        self._scope = (dataframes, self._build_helpers(dataframes, indexes))
 
-    def execute(self, code: str) -> ExecutionResult:
-        """Execute pandas code safely.
+    @property
+    def dataframes(self) -> dict[str, pd.DataFrame]:
+        """DataFrames exposed to the code."""
+        return self._scope[0]
 
-        Args:
-            code: Python code to execute.
+    @property
+    def helpers(self) -> dict[str, Any]:
+        """Lookup helpers exposed to the code."""
+        return self._scope[1]
 
-        Returns:
-            ExecutionResult with the outcome.
+    def compile(self, code: str, table_rows: dict[str, int]) -> CompiledCode:
+        """Parse, analyze, optimize and compile pandas code."""
+        return compile_code(code, table_rows)
+
+    def run(
+        self,
+        compiled: CompiledCode,
+        tables: Mapping[str, pd.DataFrame] | None = None,
+    ) -> ExecutionResult:
+        """Run compiled code in the sandbox if there is one, else in-process."""
+        if self.sandbox is not None:
+            # The worker runs the already-optimized source
+            return self.sandbox.run(compiled.source, tables)
+        return self._run_in_process(compiled, tables or {})
+
+    def update_dataframes(
+        self,
+        dataframes: dict[str, pd.DataFrame],
+        changed: set[str],
+        indexes: TableIndexes | None = None,
+    ) -> None:
+        """Switch to new DataFrames and rebuild the lookup helpers.
+
+        Runs already in progress finish on the previous DataFrames.
         """
+        self._scope = (dataframes, self._build_helpers(dataframes, indexes))
+        if self.sandbox is not None and changed:
+            self.sandbox.reload(dataframes)
+
+    def close(self) -> None:
+        """Stop the sandbox workers."""
+        if self.sandbox is not None:
+            self.sandbox.close()
+
+    def _run_in_process(
+        self, compiled: CompiledCode, tables: Mapping[str, pd.DataFrame]
+    ) -> ExecutionResult:
+        """Execute compiled code in this process with a restricted scope."""
+        if compiled.code_object is None:
+            msg = "Only Python code runs in process"
+            raise TypeError(msg)
+        dataframes, helpers = self._scope
         # Build execution context with limited scope
         exec_globals: dict[str, Any] = {
             "__builtins__": self.ALLOWED_BUILTINS,
             "pd": pd,
+            **helpers,
         }
 
-        # Add dataframes to context
-        exec_locals: dict[str, Any] = dict(self.dataframes)
+        # Add dataframes to context as private views, so column assignments
+        # and inplace=True calls never reach the tables other runs see
+        exec_locals: dict[str, Any] = private_views({**dataframes, **tables})
 
         try:
-            # Validate syntax before execution for clearer error messages
-            compile(code, "<generated>", "exec")
-
             # Execute the code
-            exec(code, exec_globals, exec_locals)  # noqa: S102
+            exec(compiled.code_object, exec_globals, exec_locals)  # noqa: S102
 
             # Get the result variable
             if "result" not in exec_locals:
@@ -128,3 +447,321 @@ class CodeExecutor:
                 error=f"{type(e).__name__}: {e!s}",
             )
 
+    @staticmethod
+    def _build_helpers(
+        dataframes: dict[str, pd.DataFrame], indexes: TableIndexes | None
+    ) -> dict[str, Any]:
+        """Build the lookup helpers, or none if the indexed tables are missing."""
+        if indexes is None:
+            indexes = TableIndexes.build(dataframes)
+        if indexes is None:
+            return {}
+        return build_lookup_helpers(dataframes, indexes)
+
+
+class CodeExecutor:
+    """Executes generated code through an engine, with cost checks and memo."""
+
+    def __init__(
+        self,
+        dataframes: dict[str, pd.DataFrame],
+        memo_max_bytes: int = MEMO_MAX_BYTES,
+        sandbox: "SandboxPool | None" = None,
+        max_cost: float | None = DEFAULT_MAX_COST,
+        indexes: TableIndexes | None = None,
+        *,
+        engine: ExecutionEngine | None = None,
+    ) -> None:
+        """Initialize executor with dataframes.
+
+        Args:
+            dataframes: Dict mapping names to DataFrames.
+            memo_max_bytes: Memory budget for memoized results. 0 disables
+                memoization.
+            sandbox: Worker pool for the default pandas engine. If None, code
+                runs in this process.
+            max_cost: Code whose estimated cost exceeds this is refused
+                before running. None disables the check.
+            indexes: Indexes for the default pandas engine's lookup helpers.
+            engine: Engine running the code. Defaults to a PandasEngine over
+                the DataFrames.
+        """
+        self.dataframes = dataframes
+        self.engine = engine or PandasEngine(
+            dataframes, sandbox=sandbox, indexes=indexes
+        )
+        self.max_cost = max_cost
+        # Bumped whenever a DataFrame is replaced; part of every memo key
+        self.versions: dict[str, int] = dict.fromkeys(dataframes, 0)
+        self.memo = ResultMemo(memo_max_bytes)
+        # Keyed by code and the row counts of the run's extra tables
+        self._compiled: OrderedDict[
+            tuple[str, tuple[tuple[str, int], ...]], CompiledCode
+        ] = OrderedDict()
+        self._compiled_lock = threading.Lock()
+        self._update_lock = threading.Lock()
+
+    @property
+    def language(self) -> str:
+        """Language of the code the engine runs ("python" or "sql")."""
+        return self.engine.language
+
+    def update_dataframes(
+        self,
+        dataframes: dict[str, pd.DataFrame],
+        indexes: TableIndexes | None = None,
+    ) -> None:
+        """Replace the available DataFrames.
+
+        Only tables whose object actually changed get a new version, so
+        memoized results that depend solely on untouched tables stay valid.
+        Executions already running finish on the previous DataFrames; the
+        engine switches before the versions do, so a result computed from
+        old data is never memoized under the new versions.
+
+        Args:
+            dataframes: Dict mapping names to the new DataFrames.
+            indexes: Indexes over the new DataFrames for the engine's lookup
+                helpers. If None, the engine builds them when it needs them.
+        """
+        with self._update_lock:
+            changed = {
+                name
+                for name in set(self.dataframes) | set(dataframes)
+                if self.dataframes.get(name) is not dataframes.get(name)
+            }
+            self.dataframes = dict(dataframes)
+            # Cost estimates depend on table sizes
+            with self._compiled_lock:
+                self._compiled.clear()
+            self.engine.update_dataframes(self.dataframes, changed, indexes)
+            versions = dict(self.versions)
+            for name in changed:
+                versions[name] = versions.get(name, 0) + 1
+            self.versions = versions
+            for name in changed:
+                self.memo.invalidate(name)
+
+    def execute(
+        self, code: str, tables: Mapping[str, pd.DataFrame] | None = None
+    ) -> ExecutionResult:
+        """Execute generated code safely.
+
+        Args:
+            code: Code to execute, in the engine's language.
+            tables: Extra DataFrames available to this run only, by name
+                (e.g. a chat session's earlier results). Results of code
+                reading them are never memoized.
+
+        Returns:
+            ExecutionResult with the outcome.
+        """
+        tables = tables or {}
+        with span("compile", engine=self.engine.language) as attributes:
+            try:
+                # Parse and compile once; syntax errors surface as failed results
+                compiled = self._compile(code, tables)
+            except SyntaxError as e:
+                attributes["error"] = type(e).__name__
+                EXECUTIONS.inc(outcome="error")
+                return ExecutionResult(
+                    success=False,
+                    result=None,
+                    error=f"{type(e).__name__}: {e!s}",
+                )
+            attributes["cost"] = compiled.cost.cost
+
+        if self.max_cost is not None and compiled.cost.cost > self.max_cost:
+            explanation = compiled.cost.explain(self.max_cost)
+            EXECUTIONS.inc(outcome="error")
+            return ExecutionResult(
+                success=False,
+                result=None,
+                error=f"CostLimitExceededError: {explanation}",
+            )
+
+        used = {name: tables[name] for name in compiled.dependencies & set(tables)}
+        memo_key = None if used else self._memo_key(compiled)
+        if memo_key is not None and (hit := self.memo.get(memo_key)) is not None:
+            EXECUTIONS.inc(outcome="memo")
+            return replace(hit, cached=True)
+
+        with span("exec", engine=self.engine.language) as attributes:
+            execution_result = replace(
+                self.engine.run(compiled, used), rewrites=tuple(compiled.cost.rewrites)
+            )
+            attributes["success"] = execution_result.success
+            if execution_result.success:
+                size = estimate_size(execution_result.result)
+                attributes["result_type"] = type(execution_result.result).__name__
+                attributes["result_bytes"] = size
+                RESULT_BYTES.observe(size)
+
+        EXECUTIONS.inc(outcome="success" if execution_result.success else "error")
+        if memo_key is not None and execution_result.success:
+            self.memo.put(memo_key, execution_result, size)
+        return execution_result
+
+    def execute_candidates(
+        self,
+        codes: Sequence[str],
+        tables: Mapping[str, pd.DataFrame] | None = None,
+        *,
+        accept: str = "first",
+    ) -> CandidateRun:
+        """Execute alternative programs for one question in parallel.
+
+        A single candidate simply runs, and identical candidates run once.
+        With ``accept="first"`` the first candidate to succeed is accepted
+        without waiting for the others; runs already started finish in the
+        background. With ``"majority"`` every candidate runs and the earliest
+        one whose result agrees with the most others (see
+        :func:`result_fingerprint`) is accepted.
+
+        Args:
+            codes: Candidate programs in the engine's language.
+            tables: Extra DataFrames available to the runs (see
+                :meth:`execute`).
+            accept: ``"first"`` or ``"majority"``.
+
+        Returns:
+            CandidateRun with the accepted candidate and every result.
+
+        Raises:
+            ValueError: If there are no candidates or the policy is unknown.
+        """
+        if accept not in ACCEPT_POLICIES:
+            msg = f"Unknown accept policy: {accept!r} (expected {ACCEPT_POLICIES})"
+            raise ValueError(msg)
+        if not codes:
+            msg = "No candidates to execute"
+            raise ValueError(msg)
+        if len(codes) == 1:
+            result = self.execute(codes[0], tables)
+            return CandidateRun(chosen=0, result=result, results=[result])
+        first_of: dict[str, int] = {}
+        for index, code in enumerate(codes):
+            first_of.setdefault(code, index)
+        with span("candidates", count=len(codes), accept=accept) as attributes:
+            runs, accepted = self._run_candidates(
+                {index: codes[index] for index in first_of.values()}, tables, accept
+            )
+            results = [runs.get(first_of[code]) for code in codes]
+            succeeded = [
+                index
+                for index, result in enumerate(results)
+                if result is not None and result.success
+            ]
+            agreeing = 0
+            if accept == "majority" and succeeded:
+                fingerprints = {
+                    index: result_fingerprint(runs[first_of[codes[index]]].result)
+                    for index in succeeded
+                }
+                votes = Counter(fingerprints.values())
+                agreeing = max(votes.values())
+                accepted = next(
+                    index
+                    for index in succeeded
+                    if votes[fingerprints[index]] == agreeing
+                )
+            # Every candidate ran if none succeeded
+            chosen = accepted if accepted is not None else 0
+            attributes.update(
+                chosen=chosen, succeeded=len(succeeded), agreeing=agreeing
+            )
+
+        if not succeeded:
+            outcome = "failed"
+        elif codes[chosen] == codes[0]:
+            outcome = "first"
+        elif results[0] is not None and not results[0].success:
+            outcome = "rescued"
+        else:
+            outcome = "switched"
+        CANDIDATE_RUNS.inc(outcome=outcome)
+        return CandidateRun(
+            chosen=chosen,
+            result=runs[first_of[codes[chosen]]],
+            results=results,
+            agreeing=agreeing,
+        )
+
+    def close(self) -> None:
+        """Release the engine's resources."""
+        self.engine.close()
+
+    def _run_candidates(
+        self,
+        codes: dict[int, str],
+        tables: Mapping[str, pd.DataFrame] | None,
+        accept: str,
+    ) -> tuple[dict[int, ExecutionResult], int | None]:
+        """Run distinct candidates concurrently.
+
+        Returns:
+            Results by candidate index, and the index of the first candidate
+            that succeeded (None if none did).
+        """
+        if len(codes) == 1:
+            ((index, code),) = codes.items()
+            result = self.execute(code, tables)
+            return {index: result}, index if result.success else None
+
+        results: dict[int, ExecutionResult] = {}
+        accepted = None
+        pool = ThreadPoolExecutor(len(codes), thread_name_prefix="candidate")
+        try:
+            # Each run gets a copy of the context so its spans join the trace
+            futures = {
+                pool.submit(
+                    contextvars.copy_context().run, self.execute, code, tables
+                ): index
+                for index, code in codes.items()
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                if results[index].success and accepted is None:
+                    accepted = index
+                    if accept == "first":
+                        break
+        finally:
+            # Runs already started finish in the background; results dropped
+            pool.shutdown(wait=False, cancel_futures=True)
+        return results, accepted
+
+    def _compile(
+        self, code: str, tables: Mapping[str, pd.DataFrame]
+    ) -> CompiledCode:
+        """Return the compiled form of the code, reusing earlier compilations.
+
+        The extra tables are part of the cache key: they decide which names
+        are dependencies and how much the code costs.
+        """
+        extra_rows = tuple(sorted((name, len(df)) for name, df in tables.items()))
+        key = (code, extra_rows)
+        with self._compiled_lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+                return compiled
+
+        table_rows = {name: len(df) for name, df in self.dataframes.items()}
+        table_rows.update(extra_rows)
+        compiled = self.engine.compile(code, table_rows)
+        with self._compiled_lock:
+            self._compiled[key] = compiled
+            if len(self._compiled) > COMPILE_CACHE_SIZE:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def _memo_key(self, compiled: CompiledCode) -> MemoKey | None:
+        """Build the memo key for compiled code, or None if not memoizable."""
+        if not compiled.deterministic or self.memo.max_bytes <= 0:
+            return None
+        versions = self.versions
+        stamps = tuple(
+            (name, versions.get(name, 0)) for name in sorted(compiled.dependencies)
+        )
+        return compiled.code_hash, stamps
@@ -0,0 +1,431 @@
+"""Static cost analysis and vectorizing rewrites for generated pandas code.
+
+Generated code regularly contains row-wise patterns (``iterrows``,
+``apply(lambda row: ..., axis=1)``, Python loops over groups) and cross
+merges. They are harmless on small tables but orders of magnitude
+slower than vectorized pandas once the data grows. This pass runs on the AST
+before execution: it rewrites the patterns it can prove equivalent, estimates
+the cost of what is left from the actual table sizes, and explains the
+expensive parts so a plan over budget can be refused with actionable feedback.
+"""
+
+import ast
+import copy
+from collections import Counter
+from dataclasses import dataclass, field
+
+# Relative cost of running Python code once per row, in units of one
+# vectorized operation over a single row
+PYTHON_ROW_COST = 1_000
+# Default cost limit; roughly ten seconds of work
+DEFAULT_MAX_COST = 1e9
+
+_ROW_ITERATORS = frozenset({"iterrows", "itertuples"})
+# Methods whose result is (usually) much smaller than their input
+_REDUCING_METHODS = frozenset(
+    {
+        "agg",
+        "aggregate",
+        "count",
+        "describe",
+        "first",
+        "head",
+        "idxmax",
+        "idxmin",
+        "last",
+        "max",
+        "mean",
+        "median",
+        "min",
+        "nlargest",
+        "nsmallest",
+        "nunique",
+        "pivot_table",
+        "size",
+        "sum",
+        "tail",
+        "unique",
+        "value_counts",
+    }
+)
+# Operators whose element-wise pandas form matches Python row-wise results
+_VECTOR_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div)
+
+
+@dataclass
+class CostReport:
+    """Outcome of the analysis pass."""
+
+    # Estimated cost in units of single-row vectorized operations
+    cost: float = 0.0
+    # Expensive patterns left in the code, with line numbers
+    findings: list[str] = field(default_factory=list)
+    # Rewrites applied to the code
+    rewrites: list[str] = field(default_factory=list)
+
+    def explain(self, max_cost: float) -> str:
+        """Describe why the plan exceeds the cost limit."""
+        lines = [
+            f"estimated cost {self.cost:.3g} exceeds the limit of {max_cost:.3g}.",
+        ]
+        if self.findings:
+            lines.append("Expensive patterns:")
+            lines.extend(f"- {finding}" for finding in self.findings)
+        lines.append(
+            "Rewrite the code with vectorized column operations, groupby "
+            "aggregations and merges on explicit keys."
+        )
+        return "\n".join(lines)
+
+
+def optimize(
+    tree: ast.Module, table_rows: dict[str, int]
+) -> tuple[ast.Module, CostReport]:
+    """Rewrite known anti-patterns and estimate the cost of the result.
+
+    Args:
+        tree: Parsed generated code. Not modified.
+        table_rows: Row count of every DataFrame available to the code.
+
+    Returns:
+        Tuple of (rewritten tree, cost report).
+    """
+    report = CostReport()
+    rewritten = _Vectorizer(report, _name_reads(tree)).visit(copy.deepcopy(tree))
+    ast.fix_missing_locations(rewritten)
+    _CostEstimator(table_rows, report).visit(rewritten)
+    return rewritten, report
+
+
+def _name_reads(node: ast.AST) -> Counter[str]:
+    """Count the reads of every variable name within a tree."""
+    return Counter(
+        child.id
+        for child in ast.walk(node)
+        if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load)
+    )
+
+
+def _root_name(node: ast.expr) -> str | None:
+    """Return the variable a chained expression starts from, if any."""
+    while True:
+        if isinstance(node, ast.Name):
+            return node.id
+        if isinstance(node, ast.Attribute | ast.Subscript):
+            node = node.value
+        elif isinstance(node, ast.Call):
+            node = node.func
+        else:
+            return None
+
+
+def _column_ref(node: ast.expr, row: str) -> str | None:
+    """Return the column name for ``row['col']``, else None.
+
+    Attribute access (``row.col``) is not treated as a column: names such as
+    ``row.name`` resolve to Series attributes, not columns.
+    """
+    if not (
+        isinstance(node, ast.Subscript)
+        and isinstance(node.value, ast.Name)
+        and node.value.id == row
+    ):
+        return None
+    if isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+        return node.slice.value
+    return None
+
+
+def _is_vectorizable(node: ast.expr, row: str) -> bool:
+    """Whether a row-wise expression has an identical column-wise form.
+
+    Only +, -, *, /, single comparisons and numeric constants over row
+    columns qualify, and at least one column must be referenced. (Division by
+    zero yields inf/NaN instead of raising, which is the only difference.)
+    """
+    columns = 0
+
+    def check(expr: ast.expr) -> bool:
+        nonlocal columns
+        if _column_ref(expr, row) is not None:
+            columns += 1
+            return True
+        if isinstance(expr, ast.Constant):
+            return isinstance(expr.value, int | float) and not isinstance(
+                expr.value, bool
+            )
+        if isinstance(expr, ast.BinOp):
+            return isinstance(expr.op, _VECTOR_OPS) and check(expr.left) and check(
+                expr.right
+            )
+        if isinstance(expr, ast.UnaryOp):
+            return isinstance(expr.op, ast.USub | ast.UAdd) and check(expr.operand)
+        if isinstance(expr, ast.Compare):
+            return (
+                len(expr.ops) == 1
+                and not isinstance(expr.ops[0], ast.Is | ast.IsNot | ast.In | ast.NotIn)
+                and check(expr.left)
+                and check(expr.comparators[0])
+            )
+        return False
+
+    return check(node) and columns > 0
+
+
+class _ColumnSubstituter(ast.NodeTransformer):
+    """Replace ``row['col']`` with ``frame['col']``."""
+
+    def __init__(self, row: str, frame: str) -> None:
+        self.row = row
+        self.frame = frame
+
+    def visit_Subscript(self, node: ast.Subscript) -> ast.expr:
+        column = _column_ref(node, self.row)
+        if column is None:
+            return self.generic_visit(node)  # type: ignore[return-value]
+        return ast.copy_location(
+            ast.Subscript(
+                value=ast.Name(id=self.frame, ctx=ast.Load()),
+                slice=ast.Constant(value=column),
+                ctx=ast.Load(),
+            ),
+            node,
+        )
+
+
+def _vectorize(expr: ast.expr, row: str, frame: str) -> ast.expr:
+    """Turn a row-wise expression into its column-wise equivalent."""
+    substituter = _ColumnSubstituter(row, frame)
+    return substituter.visit(copy.deepcopy(expr))  # type: ignore[no-any-return]
+
+
+class _Vectorizer(ast.NodeTransformer):
+    """Rewrite row-wise anti-patterns that have an exact vectorized form."""
+
+    def __init__(self, report: CostReport, reads: Counter[str]) -> None:
+        self.report = report
+        # Reads of each name anywhere in the original code
+        self.reads = reads
+
+    def visit_Call(self, node: ast.Call) -> ast.expr:
+        """``df.apply(lambda row: <arithmetic>, axis=1)`` → column arithmetic."""
+        self.generic_visit(node)
+        func = node.func
+        if not (
+            isinstance(func, ast.Attribute)
+            and func.attr == "apply"
+            and isinstance(func.value, ast.Name)
+            and len(node.args) == 1
+            and isinstance(node.args[0], ast.Lambda)
+            and any(
+                kw.arg == "axis"
+                and isinstance(kw.value, ast.Constant)
+                and kw.value.value in {1, "columns"}
+                for kw in node.keywords
+            )
+            and all(kw.arg == "axis" for kw in node.keywords)
+        ):
+            return node
+
+        lam = node.args[0]
+        params = lam.args
+        if (
+            len(params.args) != 1
+            or params.vararg
+            or params.kwarg
+            or params.kwonlyargs
+            or params.defaults
+        ):
+            return node
+        row = params.args[0].arg
+        if not _is_vectorizable(lam.body, row):
+            return node
+
+        self.report.rewrites.append(
+            f"line {node.lineno}: {func.value.id}.apply(lambda {row}: ..., axis=1) "
+            "replaced with vectorized column arithmetic"
+        )
+        return ast.copy_location(_vectorize(lam.body, row, func.value.id), node)
+
+    def visit_For(self, node: ast.For) -> ast.stmt:
+        """Accumulating loops over ``iterrows`` → a vectorized ``.sum()``.
+
+        Matches ``for _, row in df.iterrows(): total += <arithmetic of row>``.
+        """
+        reads_in_loop = _name_reads(node)
+        self.generic_visit(node)
+        it = node.iter
+        if not (
+            isinstance(it, ast.Call)
+            and isinstance(it.func, ast.Attribute)
+            and it.func.attr == "iterrows"
+            and isinstance(it.func.value, ast.Name)
+            and not it.args
+            and not node.orelse
+            and len(node.body) == 1
+            and isinstance(node.target, ast.Tuple)
+            and len(node.target.elts) == 2  # noqa: PLR2004
+            and isinstance(node.target.elts[1], ast.Name)
+        ):
+            return node
+
+        statement = node.body[0]
+        if not (
+            isinstance(statement, ast.AugAssign)
+            and isinstance(statement.op, ast.Add)
+            and isinstance(statement.target, ast.Name)
+        ):
+            return node
+
+        frame = it.func.value.id
+        row = node.target.elts[1].id
+        index = node.target.elts[0]
+        # The loop variables must not leak into code after the loop: the
+        # rewrite no longer binds them
+        if isinstance(index, ast.Name) and index.id != "_":
+            return node
+        targets = [row, index.id] if isinstance(index, ast.Name) else [row]
+        if any(self.reads[name] > reads_in_loop[name] for name in targets):
+            return node
+        if not _is_vectorizable(statement.value, row):
+            return node
+
+        self.report.rewrites.append(
+            f"line {node.lineno}: accumulating loop over {frame}.iterrows() "
+            "replaced with a vectorized sum"
+        )
+        # skipna=False keeps Python's NaN propagation
+        summed = ast.Call(
+            func=ast.Attribute(
+                value=_vectorize(statement.value, row, frame),
+                attr="sum",
+                ctx=ast.Load(),
+            ),
+            args=[],
+            keywords=[ast.keyword(arg="skipna", value=ast.Constant(value=False))],
+        )
+        return ast.copy_location(
+            ast.AugAssign(target=statement.target, op=ast.Add(), value=summed), node
+        )
+
+
+class _CostEstimator(ast.NodeVisitor):
+    """Estimate execution cost from table sizes and record expensive patterns."""
+
+    def __init__(self, table_rows: dict[str, int], report: CostReport) -> None:
+        # Estimated rows per variable; derived frames inherit their source's
+        # size as an upper bound
+        self.rows = dict(table_rows)
+        self.report = report
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        self.generic_visit(node)
+        size = self._rows_of(node.value)
+        for target in node.targets:
+            if isinstance(target, ast.Name) and size is not None:
+                self.rows[target.id] = size
+
+    def visit_Name(self, node: ast.Name) -> None:
+        # Every use of a frame is at least one vectorized pass over it
+        if isinstance(node.ctx, ast.Load) and node.id in self.rows:
+            self.report.cost += self.rows[node.id]
+
+    def visit_For(self, node: ast.For) -> None:
+        self.generic_visit(node)
+        it = node.iter
+        if isinstance(it, ast.Call) and isinstance(it.func, ast.Attribute):
+            size = self._rows_of(it.func.value)
+            if size is None:
+                return
+            if it.func.attr in _ROW_ITERATORS:
+                self._flag(
+                    node,
+                    size * PYTHON_ROW_COST,
+                    f"{it.func.attr}() over ~{size:,} rows runs Python code per "
+                    "row; use vectorized column operations instead",
+                )
+                return
+            if it.func.attr == "groupby":
+                self._flag(
+                    node,
+                    size * PYTHON_ROW_COST,
+                    "Python loop over groupby() groups; use "
+                    "groupby(...).agg(...) / transform(...) instead",
+                )
+                return
+        size = self._rows_of(it)
+        if size is None:
+            return
+        self._flag(
+            node,
+            size * PYTHON_ROW_COST,
+            f"Python loop over ~{size:,} values; use vectorized operations instead",
+        )
+
+    def visit_Call(self, node: ast.Call) -> None:
+        self.generic_visit(node)
+        func = node.func
+        if not isinstance(func, ast.Attribute):
+            return
+        args = list(node.args)
+        if isinstance(func.value, ast.Name) and func.value.id == "pd" and args:
+            # pd.merge(left, right, ...) is the same as left.merge(right, ...)
+            size = self._rows_of(args.pop(0))
+        else:
+            size = self._rows_of(func.value)
+        if size is None:
+            return
+
+        if func.attr == "apply" and any(
+            kw.arg == "axis"
+            and isinstance(kw.value, ast.Constant)
+            and kw.value.value in {1, "columns"}
+            for kw in node.keywords
+        ):
+            self._flag(
+                node,
+                size * PYTHON_ROW_COST,
+                f"row-wise apply(axis=1) over ~{size:,} rows calls Python per row; "
+                "use column arithmetic, np.where or merges instead",
+            )
+        elif func.attr == "merge" and args:
+            other = self._rows_of(args[0]) or 0
+            how = next(
+                (
+                    kw.value.value
+                    for kw in node.keywords
+                    if kw.arg == "how" and isinstance(kw.value, ast.Constant)
+                ),
+                None,
+            )
+            # Without keys pandas joins on the common columns; only a cross
+            # merge is guaranteed to produce every pair of rows
+            if how == "cross":
+                self._flag(
+                    node,
+                    size * other,
+                    f"cross merge of ~{size:,} x ~{other:,} rows produces their "
+                    "product; merge on explicit keys with on=...",
+                )
+
+    def _rows_of(self, node: ast.expr) -> int | None:
+        """Estimated rows of the frame an expression derives from.
+
+        Returns None for non-frame expressions and for reductions, whose size
+        is unknown but usually small.
+        """
+        current = node
+        while isinstance(current, ast.Attribute | ast.Subscript | ast.Call):
+            if (
+                isinstance(current, ast.Call)
+                and isinstance(current.func, ast.Attribute)
+                and current.func.attr in _REDUCING_METHODS
+            ):
+                return None
+            current = current.func if isinstance(current, ast.Call) else current.value
+        root = _root_name(node)
+        return self.rows.get(root) if root is not None else None
+
+    def _flag(self, node: ast.AST, cost: float, message: str) -> None:
+        self.report.cost += cost
+        self.report.findings.append(f"line {getattr(node, 'lineno', '?')}: {message}")
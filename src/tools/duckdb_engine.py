@@ -0,0 +1,278 @@
+"""DuckDB SQL execution engine.
+
+Generated SQL runs on DuckDB's vectorized, multi-threaded executor over the
+same tables the pandas engine sees: DataFrames are scanned in place (no copy),
+and tables whose snapshot Parquet file holds the loaded data (see
+:class:`~src.dataloaders.snapshot.SnapshotFile`) are read from disk with
+projection and filter pushdown instead of from memory.
+
+DuckDB runs in this process rather than in the sandbox pool. It is confined
+instead: only single SELECT statements are accepted, file access is limited to
+the directories of those Parquet files, the configuration is locked, and every
+query gets a thread budget, a memory limit, a wall-clock deadline and a
+result-size cap.
+"""
+
+import hashlib
+import re
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import pandas as pd
+import pyarrow as pa
+
+from src.tools.code_executor import CompiledCode, ExecutionResult
+from src.tools.code_optimizer import CostReport
+from src.tools.engine import ExecutionEngine
+
+if TYPE_CHECKING:
+    import duckdb
+
+    from src.dataloaders.indexes import TableIndexes
+    from src.dataloaders.snapshot import SnapshotFile
+
+# Rows fetched per Arrow batch while checking the result-size cap
+FETCH_BATCH_ROWS = 8192
+
+# SQL functions whose result changes between runs; queries using them are
+# never memoized
+_NON_DETERMINISTIC = re.compile(
+    r"\b(random|uuid|gen_random_uuid|setseed|now|today|current_date|"
+    r"current_time|current_timestamp|get_current_time|get_current_timestamp)\b",
+    re.IGNORECASE,
+)
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def _import_duckdb() -> Any:  # noqa: ANN401
+    """Import duckdb, explaining how to install it when it is missing."""
+    try:
+        import duckdb  # noqa: PLC0415
+    except ImportError as e:
+        msg = (
+            "The DuckDB execution engine requires the 'duckdb' package; "
+            "install it with `pip install rag-invoice-chat[duckdb]`."
+        )
+        raise ImportError(msg) from e
+    return duckdb
+
+
+class DuckDBEngine(ExecutionEngine):
+    """Runs generated SQL on DuckDB over the loaded tables."""
+
+    language = "sql"
+
+    def __init__(
+        self,
+        dataframes: dict[str, pd.DataFrame],
+        parquet_files: Mapping[str, "SnapshotFile"] | None = None,
+        *,
+        threads: int | None = None,
+        memory_limit: str | None = None,
+        timeout_seconds: float = 30.0,
+        max_result_bytes: int = 64 * 1024**2,
+    ) -> None:
+        """Initialize the engine.
+
+        Args:
+            dataframes: Dict mapping table names to DataFrames.
+            parquet_files: Parquet files to read instead of the in-memory
+                frames, by table, as the load that produced the DataFrames
+                read or wrote them (``DataContext.snapshot_files``). A file
+                replaced since is not used. None keeps every table in memory.
+            threads: Worker threads per query. None uses DuckDB's default
+                (one per core).
+            memory_limit: DuckDB memory limit, e.g. "2GB". None uses DuckDB's
+                default (80% of RAM).
+            timeout_seconds: Wall-clock limit per query.
+            max_result_bytes: Largest result (in Arrow bytes) a query may
+                return.
+
+        Raises:
+            ImportError: If duckdb is not installed.
+        """
+        self._duckdb = _import_duckdb()
+        self.dataframes = dataframes
+        self.timeout_seconds = timeout_seconds
+        self.max_result_bytes = max_result_bytes
+        # Files on disk hold the loaded data only while nothing replaced them
+        paths = {
+            name: file.path.resolve()
+            for name, file in (parquet_files or {}).items()
+            if name in dataframes and file.is_current()
+        }
+        self.parquet_dirs: list[Path] = sorted({path.parent for path in paths.values()})
+        self._lock = threading.Lock()
+        self._connection = self._connect(threads, memory_limit)
+        # Tables read from Parquet; everything else is scanned from memory
+        self._parquet_tables: set[str] = set()
+        for name, path in paths.items():
+            literal = str(path).replace("'", "''")
+            self._connection.execute(
+                f'CREATE VIEW "{name}" AS '  # noqa: S608
+                f"SELECT * FROM read_parquet('{literal}')"
+            )
+            self._parquet_tables.add(name)
+
+    def compile(self, code: str, table_rows: dict[str, int]) -> CompiledCode:
+        """Validate the SQL and extract its dependencies.
+
+        DuckDB plans the query itself, so no cost estimate is made; runaway
+        queries are bounded by the memory limit and the deadline instead.
+
+        Raises:
+            SyntaxError: If the code is not exactly one SELECT statement.
+        """
+        try:
+            statements = self._duckdb.extract_statements(code)
+        except self._duckdb.Error as e:
+            raise SyntaxError(str(e)) from e
+        if len(statements) != 1:
+            msg = f"expected one SQL statement, got {len(statements)}"
+            raise SyntaxError(msg)
+        if statements[0].type != self._duckdb.StatementType.SELECT:
+            msg = f"only SELECT queries are allowed, got {statements[0].type.name}"
+            raise SyntaxError(msg)
+
+        source = code.strip().rstrip(";").strip()
+        # Formatting does not change the result, so it does not change the key
+        normalized = " ".join(source.split())
+        words = {word.lower() for word in _IDENTIFIER.findall(source)}
+        return CompiledCode(
+            code_hash=hashlib.sha256(normalized.encode()).hexdigest(),
+            code_object=None,
+            dependencies=frozenset(name for name in table_rows if name in words),
+            deterministic=_NON_DETERMINISTIC.search(source) is None,
+            source=source,
+            cost=CostReport(),
+        )
+
+    def run(
+        self,
+        compiled: CompiledCode,
+        tables: Mapping[str, pd.DataFrame] | None = None,
+    ) -> ExecutionResult:
+        """Run the query on its own cursor under the deadline and size cap."""
+        with self._lock:
+            dataframes = {**self.dataframes, **(tables or {})}
+            in_memory = [
+                name
+                for name in compiled.dependencies
+                if name not in self._parquet_tables
+            ]
+            cursor = self._connection.cursor()
+        # Registered frames are local to the cursor, so concurrent queries
+        # never see each other's tables
+        for name in in_memory:
+            cursor.register(name, dataframes[name])
+
+        timer = threading.Timer(self.timeout_seconds, cursor.interrupt)
+        timer.start()
+        try:
+            reader = cursor.execute(compiled.source).fetch_record_batch(
+                FETCH_BATCH_ROWS
+            )
+            batches = []
+            size = 0
+            for batch in reader:
+                size += batch.nbytes
+                if size > self.max_result_bytes:
+                    return ExecutionResult(
+                        success=False,
+                        result=None,
+                        error=(
+                            f"ResultTooLargeError: result exceeds "
+                            f"{self.max_result_bytes} bytes. "
+                            "Aggregate or filter the data further."
+                        ),
+                    )
+                batches.append(batch)
+            frame = pa.Table.from_batches(batches, schema=reader.schema).to_pandas()
+        except self._duckdb.InterruptException:
+            return ExecutionResult(
+                success=False,
+                result=None,
+                error=(
+                    "TimeoutError: query exceeded the "
+                    f"{self.timeout_seconds:g}s time limit."
+                ),
+            )
+        except self._duckdb.Error as e:
+            return ExecutionResult(
+                success=False,
+                result=None,
+                error=f"{type(e).__name__}: {e!s}",
+            )
+        finally:
+            timer.cancel()
+            cursor.close()
+
+        result = self._shape(frame)
+        return ExecutionResult(
+            success=True,
+            result=result,
+            result_type=type(result).__name__,
+        )
+
+    def update_dataframes(
+        self,
+        dataframes: dict[str, pd.DataFrame],
+        changed: set[str],
+        indexes: "TableIndexes | None" = None,  # noqa: ARG002
+    ) -> None:
+        """Switch to new DataFrames.
+
+        Changed tables are served from memory from now on: their Parquet
+        files describe the old data.
+        """
+        with self._lock:
+            self.dataframes = dataframes
+            for name in changed & self._parquet_tables:
+                self._connection.execute(f'DROP VIEW "{name}"')
+                self._parquet_tables.discard(name)
+
+    def close(self) -> None:
+        """Close the DuckDB connection."""
+        self._connection.close()
+
+    def _connect(
+        self, threads: int | None, memory_limit: str | None
+    ) -> "duckdb.DuckDBPyConnection":
+        """Open an in-memory database confined to the Parquet directory."""
+        config: dict[str, Any] = {
+            "autoinstall_known_extensions": False,
+            "autoload_known_extensions": False,
+            # Never resolve unknown table names to Python variables
+            "python_enable_replacements": False,
+        }
+        if threads is not None:
+            config["threads"] = threads
+        if memory_limit is not None:
+            config["memory_limit"] = memory_limit
+        connection: duckdb.DuckDBPyConnection = self._duckdb.connect(
+            ":memory:", config=config
+        )
+        allowed = [str(directory) for directory in self.parquet_dirs]
+        connection.execute("SET allowed_directories = ?", [allowed])
+        connection.execute("SET enable_external_access = false")
+        connection.execute("SET lock_configuration = true")
+        return connection
+
+    @staticmethod
+    def _shape(frame: pd.DataFrame) -> Any:  # noqa: ANN401
+        """Turn a query result into the result shapes of the pandas engine.
+
+        A single value becomes a scalar and a single row a dict keyed by
+        column; anything else stays a DataFrame.
+        """
+        if frame.shape == (1, 1):
+            value = frame.iat[0, 0]
+            return value.item() if hasattr(value, "item") else value
+        if len(frame) == 1:
+            return {
+                column: value.item() if hasattr(value, "item") else value
+                for column, value in frame.iloc[0].items()
+            }
+        return frame
@@ -0,0 +1,72 @@
+"""Execution engine interface behind :class:`CodeExecutor`.
+
+An engine turns generated code into a :class:`CompiledCode` (static analysis
+included) and runs it against the loaded tables. ``CodeExecutor`` keeps the
+engine-independent parts: the cost gate, result memoization and table
+versions.
+"""
+
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, ClassVar
+
+import pandas as pd
+
+if TYPE_CHECKING:
+    from src.dataloaders.indexes import TableIndexes
+    from src.tools.code_executor import CompiledCode, ExecutionResult
+
+
+class ExecutionEngine(ABC):
+    """Runs generated queries against the loaded tables."""
+
+    # Language of the generated code the engine runs ("python" or "sql")
+    language: ClassVar[str]
+
+    @abstractmethod
+    def compile(self, code: str, table_rows: dict[str, int]) -> "CompiledCode":
+        """Parse and analyze generated code.
+
+        Args:
+            code: Generated source.
+            table_rows: Row count of every table available to the code.
+
+        Returns:
+            CompiledCode for the source.
+
+        Raises:
+            SyntaxError: If the code does not parse.
+        """
+
+    @abstractmethod
+    def run(
+        self,
+        compiled: "CompiledCode",
+        tables: Mapping[str, pd.DataFrame] | None = None,
+    ) -> "ExecutionResult":
+        """Run compiled code and capture its result or error.
+
+        Args:
+            compiled: Code compiled by :meth:`compile`.
+            tables: Extra DataFrames the code reads besides the loaded
+                tables, available to this run only.
+        """
+
+    @abstractmethod
+    def update_dataframes(
+        self,
+        dataframes: dict[str, pd.DataFrame],
+        changed: set[str],
+        indexes: "TableIndexes | None" = None,
+    ) -> None:
+        """Switch to new DataFrames.
+
+        Args:
+            dataframes: All DataFrames, keyed by table name.
+            changed: Names of the tables that actually changed.
+            indexes: Indexes over the new DataFrames, for engines that use
+                them. If None, such engines build their own.
+        """
+
+    def close(self) -> None:  # noqa: B027
+        """Release resources held by the engine."""
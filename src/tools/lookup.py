@@ -0,0 +1,128 @@
+"""Lookup helpers exposed to generated code.
+
+Built on :class:`TableIndexes`, so fetching one client or invoice, its line
+items, or the invoices of a date range is a hash lookup or a binary search
+instead of a boolean mask over a whole table.
+"""
+
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from src.dataloaders.indexes import TableIndexes
+
+# Helper name -> tables whose contents its result depends on
+LOOKUP_HELPER_TABLES: dict[str, tuple[str, ...]] = {
+    "get_client": ("clients",),
+    "get_invoice": ("invoices",),
+    "invoices_for_client": ("clients", "invoices"),
+    "invoices_between": ("invoices",),
+    "line_items_for_invoice": ("invoices", "merged"),
+}
+
+_NO_ROWS = np.empty(0, dtype=np.intp)
+
+# Columns returned by line_items_for_invoice
+LINE_ITEM_COLUMNS = (
+    "line_id",
+    "invoice_id",
+    "service_name",
+    "quantity",
+    "unit_price",
+    "tax_rate",
+    "line_total",
+    "line_total_usd",
+)
+
+
+def build_lookup_helpers(
+    dataframes: dict[str, pd.DataFrame], indexes: TableIndexes
+) -> dict[str, Callable[..., Any]]:
+    """Build the lookup helper functions for a set of DataFrames.
+
+    Args:
+        dataframes: DataFrames the indexes were built from.
+        indexes: Indexes over those DataFrames.
+
+    Returns:
+        Dict mapping helper names to functions.
+    """
+    clients = dataframes["clients"]
+    invoices = dataframes["invoices"]
+    merged = dataframes["merged"]
+
+    def resolve_client(client: str) -> str:
+        """Return the client_id for a client_id or (case-insensitive) name."""
+        key = str(client).strip()
+        if key in indexes.client_by_id:
+            return key
+        client_id = indexes.client_id_by_name.get(key.lower())
+        if client_id is None:
+            msg = f"Unknown client: {client!r}"
+            raise KeyError(msg)
+        return client_id
+
+    def date_slice(ranks: np.ndarray, start: Any, end: Any) -> np.ndarray:  # noqa: ANN401
+        """Keep the sorted date ranks whose date is within start..end."""
+        dates = indexes.sorted_invoice_dates[ranks]
+        lo = 0 if start is None else np.searchsorted(dates, _to_datetime64(start))
+        hi = (
+            len(dates)
+            if end is None
+            else np.searchsorted(dates, _to_datetime64(end), side="right")
+        )
+        return ranks[lo : max(lo, hi)]
+
+    def get_client(client: str) -> pd.Series:
+        """Return the clients row for a client_id or client name."""
+        return clients.iloc[indexes.client_by_id[resolve_client(client)]]
+
+    def get_invoice(invoice_id: str) -> pd.Series:
+        """Return the invoices row for an invoice_id."""
+        position = indexes.invoice_by_id.get(str(invoice_id).strip())
+        if position is None:
+            msg = f"Unknown invoice: {invoice_id!r}"
+            raise KeyError(msg)
+        return invoices.iloc[position]
+
+    def invoices_for_client(
+        client: str,
+        start: Any = None,  # noqa: ANN401
+        end: Any = None,  # noqa: ANN401
+    ) -> pd.DataFrame:
+        """Return a client's invoices by date, optionally within a date range."""
+        rows = indexes.invoices_by_client.get(resolve_client(client), _NO_ROWS)
+        ranks = date_slice(np.sort(indexes.invoice_date_rank[rows]), start, end)
+        found: pd.DataFrame = invoices.iloc[indexes.invoice_date_order[ranks]]
+        return found.reset_index(drop=True)
+
+    def invoices_between(start: Any = None, end: Any = None) -> pd.DataFrame:  # noqa: ANN401
+        """Return invoices with invoice_date between start and end, inclusive."""
+        ranks = date_slice(np.arange(len(invoices)), start, end)
+        found: pd.DataFrame = invoices.iloc[indexes.invoice_date_order[ranks]]
+        return found.reset_index(drop=True)
+
+    def line_items_for_invoice(invoice_id: str) -> pd.DataFrame:
+        """Return an invoice's line items including line_total."""
+        key = str(invoice_id).strip()
+        if key not in indexes.invoice_by_id:
+            msg = f"Unknown invoice: {invoice_id!r}"
+            raise KeyError(msg)
+        rows = indexes.merged_by_invoice.get(key, _NO_ROWS)
+        columns = [c for c in LINE_ITEM_COLUMNS if c in merged.columns]
+        return merged.iloc[rows][columns].reset_index(drop=True)
+
+    return {
+        "get_client": get_client,
+        "get_invoice": get_invoice,
+        "invoices_for_client": invoices_for_client,
+        "invoices_between": invoices_between,
+        "line_items_for_invoice": line_items_for_invoice,
+    }
+
+
+def _to_datetime64(value: Any) -> np.datetime64:  # noqa: ANN401
+    """Convert a date-like value to the dtype of the sorted date index."""
+    return pd.Timestamp(value).as_unit("ns").to_datetime64()
@@ -0,0 +1,291 @@
+"""Compact, token-budgeted encoding of execution results for the LLM.
+
+``DataFrame.to_string()`` pads every cell to the column width, which makes wide
+results expensive to send to the formatting call, and cutting a long result to
+its first rows throws away what the answer may depend on. Results are encoded
+in escalating steps until they fit the budget:
+
+1. Dense CSV.
+2. CSV with constant columns pulled out and repeated strings replaced by short
+   codes listed in a column dictionary.
+3. A summary computed over the full result: per-column statistics, group
+   totals, the top rows by the main measure and as many leading rows as fit.
+"""
+
+import math
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+# Rough characters-per-token ratio used to estimate prompt size
+CHARS_PER_TOKEN = 4
+# Default token budget for an encoded result
+RESULT_TOKEN_BUDGET = 2000
+
+# String columns with at most this many distinct values get a dictionary
+DICTIONARY_MAX_VALUES = 32
+# Distinct values listed per categorical column in a summary
+SUMMARY_TOP_VALUES = 5
+# Groups listed per categorical column in a summary
+SUMMARY_MAX_GROUPS = 10
+# Columns with more distinct values than this get no group totals
+SUMMARY_MAX_CARDINALITY = 100
+# Rows listed by the main measure in a summary
+SUMMARY_TOP_K = 10
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a string."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def encode_result(result: Any, max_tokens: int = RESULT_TOKEN_BUDGET) -> str:  # noqa: ANN401
+    """Encode an execution result as compact text within a token budget.
+
+    Args:
+        result: Value of the ``result`` variable produced by generated code.
+        max_tokens: Approximate token budget for the encoded text.
+
+    Returns:
+        Text representation of the result for the LLM.
+    """
+    if isinstance(result, pd.Series):
+        result = _series_to_frame(result)
+    if isinstance(result, pd.DataFrame):
+        return _encode_frame(result, max_tokens)
+    if isinstance(result, dict):
+        return _encode_dict(result, max_tokens)
+    return _truncate(str(_plain(result)), max_tokens)
+
+
+def _encode_dict(result: dict[Any, Any], max_tokens: int) -> str:
+    """Encode a dict, giving nested frames an equal share of the budget."""
+    nested = [v for v in result.values() if isinstance(v, pd.DataFrame | pd.Series)]
+    if not nested:
+        return _truncate(str({k: _plain(v) for k, v in result.items()}), max_tokens)
+
+    share = max(max_tokens // len(nested), 1)
+    parts = []
+    for key, value in result.items():
+        if isinstance(value, pd.DataFrame | pd.Series):
+            parts.append(f"{key}:\n{encode_result(value, share)}")
+        else:
+            parts.append(f"{key}: {_plain(value)}")
+    return "\n\n".join(parts)
+
+
+def _encode_frame(frame: pd.DataFrame, max_tokens: int) -> str:
+    """Encode a DataFrame, escalating to more compact forms as needed."""
+    if frame.empty:
+        return "No results found (empty DataFrame)"
+
+    try:
+        frame = _prepare(frame)
+        plain = _to_csv(frame)
+    except (TypeError, ValueError):
+        return _truncate(frame.to_string(), max_tokens)
+    if estimate_tokens(plain) <= max_tokens:
+        return plain
+
+    shape = f"{len(frame)} rows x {len(frame.columns)} columns"
+    try:
+        constants, varying = _split_constants(frame)
+    except TypeError:
+        # Unhashable cells (lists, dicts) rule out the compact forms
+        return _truncate(plain, max_tokens)
+    dictionaries, coded = _dictionary_encode(varying)
+    compact = "\n".join([f"Result: {shape}", *constants, *dictionaries, _to_csv(coded)])
+    if estimate_tokens(compact) <= max_tokens:
+        return compact
+
+    return _summarize(frame, shape, constants, max_tokens)
+
+
+def _summarize(
+    frame: pd.DataFrame, shape: str, constants: list[str], max_tokens: int
+) -> str:
+    """Summarize a large frame from all of its rows within the budget."""
+    budget = max_tokens * CHARS_PER_TOKEN
+    sections = [
+        f"Result: {shape}. Too large to list in full; the statistics and "
+        "totals below cover ALL rows.",
+        *constants,
+    ]
+
+    def add(section: str) -> bool:
+        if len("\n\n".join([*sections, section])) > budget:
+            return False
+        sections.append(section)
+        return True
+
+    add("Column statistics:\n" + "\n".join(_column_stats(frame)))
+
+    measure = _main_measure(frame)
+    if measure is not None:
+        for column in _group_columns(frame):
+            groups = frame.groupby(column, sort=False, observed=True)[measure].agg(
+                ["sum", "count"]
+            )
+            groups = groups.sort_values("sum", ascending=False)
+            listed = groups.head(SUMMARY_MAX_GROUPS).reset_index()
+            more = len(groups) - len(listed)
+            note = f" ({more} more groups)" if more > 0 else ""
+            add(f"{measure} by {column}{note}:\n{_to_csv(listed)}")
+
+        top = frame.nlargest(SUMMARY_TOP_K, measure)
+        _add_rows(add, f"Top rows by {measure}", top)
+
+    _add_rows(add, "First rows", frame)
+    return "\n\n".join(sections)
+
+
+def _add_rows(add: Callable[[str], bool], title: str, frame: pd.DataFrame) -> None:
+    """Add as many leading rows of a frame as fit, halving on overflow."""
+    rows = min(len(frame), SUMMARY_TOP_K)
+    while rows > 0:
+        if add(f"{title} ({rows} of {len(frame)}):\n{_to_csv(frame.head(rows))}"):
+            return
+        rows //= 2
+
+
+def _column_stats(frame: pd.DataFrame) -> list[str]:
+    """Describe each column in one line."""
+    lines = []
+    for column in frame.columns:
+        series = frame[column]
+        if pd.api.types.is_bool_dtype(series):
+            lines.append(f"- {column}: {int(series.sum())} true of {series.count()}")
+        elif pd.api.types.is_numeric_dtype(series):
+            lines.append(
+                f"- {column}: sum={_fmt(series.sum())}, mean={_fmt(series.mean())}, "
+                f"min={_fmt(series.min())}, max={_fmt(series.max())}, "
+                f"missing={series.isna().sum()}"
+            )
+        else:
+            counts = series.value_counts()
+            if len(counts) == len(series):
+                lines.append(f"- {column}: all {len(counts)} values distinct")
+                continue
+            top = ", ".join(
+                f"{value} ({count})"
+                for value, count in counts.head(SUMMARY_TOP_VALUES).items()
+            )
+            lines.append(f"- {column}: {len(counts)} distinct; most common: {top}")
+    return lines
+
+
+def _main_measure(frame: pd.DataFrame) -> str | None:
+    """Pick the numeric column most likely to hold the answer's measure."""
+    numeric = [
+        column
+        for column in frame.columns
+        if pd.api.types.is_numeric_dtype(frame[column])
+        and not pd.api.types.is_bool_dtype(frame[column])
+        and not str(column).endswith("_id")
+    ]
+    # Aggregated columns are usually appended last
+    return numeric[-1] if numeric else None
+
+
+def _group_columns(frame: pd.DataFrame) -> list[str]:
+    """Categorical columns worth reporting group totals for."""
+    return [
+        column
+        for column in frame.columns
+        if not pd.api.types.is_numeric_dtype(frame[column])
+        and not str(column).endswith("_id")
+        and 1 < frame[column].nunique() <= min(SUMMARY_MAX_CARDINALITY, len(frame) - 1)
+    ]
+
+
+def _split_constants(frame: pd.DataFrame) -> tuple[list[str], pd.DataFrame]:
+    """Pull out columns holding a single value in every row."""
+    constant = [
+        column
+        for column in frame.columns
+        if frame[column].nunique(dropna=False) == 1 and len(frame.columns) > 1
+    ]
+    lines = [
+        f"{column} = {_plain(frame[column].iloc[0])} (all rows)" for column in constant
+    ]
+    return lines, frame.drop(columns=constant)
+
+
+def _dictionary_encode(frame: pd.DataFrame) -> tuple[list[str], pd.DataFrame]:
+    """Replace repeated strings with short codes and describe the codes."""
+    lines = []
+    coded = frame.copy()
+    for column in frame.columns:
+        series = frame[column]
+        if pd.api.types.is_numeric_dtype(series):
+            continue
+        values = series.dropna().unique()
+        if not 0 < len(values) <= DICTIONARY_MAX_VALUES or len(values) >= len(series):
+            continue
+        mapping = {value: f"{column[:1]}{i}" for i, value in enumerate(values)}
+        saved = sum(len(str(v)) for v in series.dropna()) - sum(
+            len(mapping[v]) for v in series.dropna()
+        )
+        legend = f"{column} codes: " + "; ".join(
+            f"{code}={value}" for value, code in mapping.items()
+        )
+        if saved <= len(legend):
+            continue
+        coded[column] = series.map(mapping)
+        lines.append(legend)
+    return lines, coded
+
+
+def _prepare(frame: pd.DataFrame) -> pd.DataFrame:
+    """Make a meaningful index a column and shorten datetimes to dates."""
+    unnamed = all(name is None for name in frame.index.names)
+    if unnamed and pd.api.types.is_integer_dtype(frame.index):
+        # Row positions left over from filtering carry no information
+        frame = frame.reset_index(drop=True)
+    else:
+        frame = frame.reset_index()
+    frame = frame.copy()
+    frame.columns = [str(column) for column in frame.columns]
+    for column in frame.columns:
+        series = frame[column]
+        if (
+            pd.api.types.is_datetime64_any_dtype(series)
+            and (series.dropna() == series.dropna().dt.normalize()).all()
+        ):
+            frame[column] = series.dt.strftime("%Y-%m-%d")
+    return frame
+
+
+def _series_to_frame(series: pd.Series) -> pd.DataFrame:
+    """Turn a Series into a frame with its index as a column."""
+    # Rows taken out of a frame are named after their (integer) row label
+    name = series.name if isinstance(series.name, str) else "value"
+    return series.rename(name).to_frame()
+
+
+def _to_csv(frame: pd.DataFrame) -> str:
+    """Dense CSV without padding or the default index."""
+    return frame.to_csv(index=False, float_format="%.10g").strip()
+
+
+def _fmt(value: Any) -> str:  # noqa: ANN401
+    """Format a statistic compactly."""
+    value = _plain(value)
+    if isinstance(value, float):
+        return f"{value:.10g}"
+    return str(value)
+
+
+def _plain(value: Any) -> Any:  # noqa: ANN401
+    """Convert numpy scalars to Python scalars so they print cleanly."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Cut text to the budget, noting how much was dropped."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... (truncated, {len(text)} characters in total)"
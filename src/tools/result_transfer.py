@@ -0,0 +1,208 @@
+"""Data-only encoding of execution results sent back by sandbox workers.
+
+A worker runs untrusted code, so whatever it sends must not be able to run
+code in the parent. Pickle can (any object may name a callable to invoke on
+load), so results travel in formats that only describe data:
+
+- DataFrames and Series as Arrow IPC streams (the index is kept; column
+  labels travel separately, so duplicate and non-string labels survive),
+- NumPy arrays in the ``.npy`` format without pickled objects,
+- scalars, strings, lists, tuples, sets and dicts as JSON, with tags for the
+  types JSON lacks (NumPy scalars, timestamps, non-string dict keys).
+
+A payload is a 4-byte header length, the JSON header, then the binary blobs
+the header refers to.
+"""
+
+import datetime
+import io
+import json
+import struct
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from src.tools.code_executor import ExecutionResult
+
+_HEADER_LENGTH = struct.Struct(">I")
+# Key marking a tagged (non-JSON) value
+_TAG = "__t"
+
+
+class TransferError(ValueError):
+    """A result cannot be encoded, or a payload is malformed."""
+
+
+def dump_result(result: ExecutionResult) -> bytes:
+    """Encode an execution result.
+
+    Raises:
+        TransferError: If the result holds an object of an unsupported type.
+    """
+    blobs: list[bytes] = []
+    header = {
+        "success": result.success,
+        "error": result.error,
+        "result_type": result.result_type,
+        "cached": result.cached,
+        "rewrites": list(result.rewrites),
+        "result": _encode(result.result, blobs),
+        "blobs": [len(blob) for blob in blobs],
+    }
+    try:
+        encoded = json.dumps(header).encode("utf-8")
+    except (TypeError, ValueError) as e:
+        raise TransferError(str(e)) from e
+    return b"".join([_HEADER_LENGTH.pack(len(encoded)), encoded, *blobs])
+
+
+def load_result(payload: bytes) -> ExecutionResult:
+    """Decode a payload written by :func:`dump_result`.
+
+    Raises:
+        TransferError: If the payload is malformed.
+    """
+    try:
+        (length,) = _HEADER_LENGTH.unpack_from(payload)
+        offset = _HEADER_LENGTH.size + length
+        header = json.loads(payload[_HEADER_LENGTH.size : offset])
+        blobs = []
+        for size in header["blobs"]:
+            blobs.append(payload[offset : offset + size])
+            offset += size
+        return ExecutionResult(
+            success=bool(header["success"]),
+            result=_decode(header["result"], blobs),
+            error=header["error"],
+            result_type=str(header["result_type"]),
+            cached=bool(header["cached"]),
+            rewrites=tuple(header["rewrites"]),
+        )
+    except (struct.error, KeyError, IndexError, TypeError, ValueError) as e:
+        msg = f"malformed result payload: {type(e).__name__}: {e}"
+        raise TransferError(msg) from e
+
+
+def _encode(value: Any, blobs: list[bytes]) -> Any:  # noqa: ANN401, PLR0911
+    """Convert a value to JSON-compatible data, appending binary parts."""
+    if value is None or isinstance(value, bool | int | float | str):
+        return value
+    # NaT is a datetime subclass instance without an ISO form
+    if value is pd.NaT:
+        return {_TAG: "nat"}
+    if isinstance(value, pd.DataFrame):
+        return {_TAG: "frame", **_encode_frame(value, blobs)}
+    if isinstance(value, pd.Series):
+        frame = value.to_frame()
+        return {_TAG: "series", "name": _encode(value.name, blobs)} | (
+            _encode_frame(frame, blobs)
+        )
+    if isinstance(value, pd.Index):
+        return {_TAG: "index", "values": _encode(value.to_series(), blobs)}
+    if isinstance(value, np.ndarray):
+        buffer = io.BytesIO()
+        np.save(buffer, value, allow_pickle=False)
+        blobs.append(buffer.getvalue())
+        return {_TAG: "array", "blob": len(blobs) - 1}
+    if isinstance(value, pd.Timestamp | datetime.datetime | datetime.date):
+        kind = "timestamp" if isinstance(value, pd.Timestamp) else type(value).__name__
+        return {_TAG: kind, "iso": value.isoformat()}
+    if isinstance(value, pd.Timedelta | datetime.timedelta):
+        return {_TAG: "timedelta", "ns": pd.Timedelta(value).value}
+    if isinstance(value, np.generic):
+        return {_TAG: "numpy", "dtype": value.dtype.str, "value": value.item()}
+    if isinstance(value, list):
+        return [_encode(item, blobs) for item in value]
+    if isinstance(value, tuple | set | frozenset):
+        items = [_encode(item, blobs) for item in value]
+        return {_TAG: type(value).__name__, "items": items}
+    if isinstance(value, dict):
+        items = [[_encode(k, blobs), _encode(v, blobs)] for k, v in value.items()]
+        return {_TAG: "dict", "items": items}
+    msg = f"cannot transfer a result of type {type(value).__name__}"
+    raise TransferError(msg)
+
+
+def _encode_frame(frame: pd.DataFrame, blobs: list[bytes]) -> dict[str, Any]:
+    """Store a frame as an Arrow IPC blob; labels are returned as JSON."""
+    labels = [_encode(label, blobs) for label in frame.columns]
+    positional = frame.set_axis([str(i) for i in range(frame.shape[1])], axis=1)
+    try:
+        table = pa.Table.from_pandas(positional, preserve_index=True)
+    except (pa.ArrowException, TypeError, ValueError):
+        # Object columns mixing types (e.g. numbers and text) are sent as text
+        mixed = positional.select_dtypes(include="object").columns
+        positional = positional.astype(dict.fromkeys(mixed, str)).where(
+            positional.notna(), None
+        )
+        try:
+            table = pa.Table.from_pandas(positional, preserve_index=True)
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            msg = f"cannot transfer the result frame: {e}"
+            raise TransferError(msg) from e
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    blobs.append(sink.getvalue().to_pybytes())
+    return {"blob": len(blobs) - 1, "columns": labels}
+
+
+# Decoders for tagged values that hold no nested values or blobs
+_SCALAR_DECODERS: dict[str, Callable[[dict[str, Any]], Any]] = {
+    "nat": lambda _: pd.NaT,
+    "timestamp": lambda value: pd.Timestamp(value["iso"]),
+    "datetime": lambda value: datetime.datetime.fromisoformat(value["iso"]),
+    "date": lambda value: datetime.date.fromisoformat(value["iso"]),
+    "timedelta": lambda value: pd.Timedelta(value["ns"], unit="ns"),
+    "numpy": lambda value: np.dtype(value["dtype"]).type(value["value"]),
+}
+
+
+def _decode(value: Any, blobs: list[bytes]) -> Any:  # noqa: ANN401, PLR0911
+    """Rebuild a value encoded by :func:`_encode`."""
+    if isinstance(value, list):
+        return [_decode(item, blobs) for item in value]
+    if not isinstance(value, dict):
+        return value
+    tag = value[_TAG]
+    if tag in _SCALAR_DECODERS:
+        return _SCALAR_DECODERS[tag](value)
+    if tag in ("frame", "series"):
+        frame = _decode_frame(value, blobs)
+        if tag == "frame":
+            return frame
+        return frame.iloc[:, 0].rename(_decode(value["name"], blobs))
+    if tag == "index":
+        return pd.Index(_decode(value["values"], blobs))
+    if tag == "array":
+        return np.load(io.BytesIO(blobs[value["blob"]]), allow_pickle=False)
+    items = [_decode(item, blobs) for item in value["items"]]
+    if tag == "dict":
+        return {_hashable(k): v for k, v in items}
+    if tag == "tuple":
+        return tuple(items)
+    if tag in ("set", "frozenset"):
+        members = {_hashable(item) for item in items}
+        return members if tag == "set" else frozenset(members)
+    msg = f"unknown tag {tag!r}"
+    raise ValueError(msg)
+
+
+def _decode_frame(value: dict[str, Any], blobs: list[bytes]) -> pd.DataFrame:
+    """Read an Arrow IPC blob back into a frame with its original labels."""
+    with pa.ipc.open_stream(blobs[value["blob"]]) as reader:
+        frame: pd.DataFrame = reader.read_all().to_pandas()
+    labels = [_hashable(_decode(label, blobs)) for label in value["columns"]]
+    if labels and all(isinstance(label, tuple) for label in labels):
+        return frame.set_axis(pd.MultiIndex.from_tuples(labels), axis=1)
+    return frame.set_axis(pd.Index(labels, dtype=object), axis=1)
+
+
+def _hashable(value: Any) -> Any:  # noqa: ANN401
+    """Turn decoded lists (JSON arrays) back into hashable tuples."""
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    return value
@@ -0,0 +1,304 @@
+"""Process-pool sandbox for running generated code outside the server process.
+
+Generated pandas code is untrusted: an accidental cartesian merge or an endless
+loop would otherwise freeze the process serving every user. The pool keeps a
+few warm worker processes that already hold the DataFrames. Each run gets a
+wall-clock deadline, a CPU-time limit, an RSS limit and a result-size cap; a
+worker that breaks any of them is killed and replaced.
+
+Workers are started from a fork server (or spawned where there is none) rather
+than forked from the threaded server, and send results back in a data-only
+format (``result_transfer``) so that a compromised worker cannot run code in
+the parent when its result is decoded.
+"""
+
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from multiprocessing.context import ForkServerContext, SpawnContext
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from types import FrameType
+
+import pandas as pd
+
+from src.telemetry.logs import configure_logging
+from src.tools.code_executor import (
+    CodeExecutor,
+    ExecutionResult,
+    enable_copy_on_write,
+)
+from src.tools.result_transfer import TransferError, dump_result, load_result
+
+# Interval at which the parent checks a running worker's deadline and RSS
+POLL_INTERVAL_SECONDS = 0.05
+
+
+@dataclass(frozen=True)
+class SandboxLimits:
+    """Resource limits applied to every sandboxed run."""
+
+    timeout_seconds: float = 30.0
+    cpu_seconds: float = 30.0
+    max_rss_bytes: int = 2 * 1024**3
+    max_result_bytes: int = 64 * 1024**2
+
+
+class CpuLimitExceededError(BaseException):
+    """Raised inside a worker when a run exceeds its CPU-time budget.
+
+    Derives from BaseException so ``except Exception`` in generated code (or
+    in the executor) cannot swallow it.
+    """
+
+
+def _raise_cpu_limit(signum: int, frame: FrameType | None) -> None:  # noqa: ARG001
+    """SIGPROF handler used to enforce the per-run CPU budget."""
+    msg = "execution exceeded its CPU time limit"
+    raise CpuLimitExceededError(msg)
+
+
+def _worker_main(
+    conn: Connection,
+    dataframes: dict[str, pd.DataFrame],
+    limits: SandboxLimits,
+) -> None:
+    """Serve execution requests until the connection closes.
+
+    Args:
+        conn: Pipe end receiving (code, extra tables) pairs and sending
+            encoded results.
+        dataframes: DataFrames exposed to the code.
+        limits: Resource limits for each run.
+    """
+    # The parent handles Ctrl+C; a worker must not die mid-run because of it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    has_cpu_timer = hasattr(signal, "setitimer")
+    if has_cpu_timer:
+        signal.signal(signal.SIGPROF, _raise_cpu_limit)
+
+    # The parent's exec span covers the whole run; per-span debug lines from
+    # the worker would only duplicate it
+    configure_logging("WARNING")
+    # Workers do not inherit the parent's pandas options
+    enable_copy_on_write()
+
+    # Memoization and cost checks live in the parent; the worker only executes
+    executor = CodeExecutor(dataframes, memo_max_bytes=0, max_cost=None)
+    while True:
+        try:
+            code, tables = conn.recv()
+        except (EOFError, OSError):
+            return
+
+        try:
+            if has_cpu_timer:
+                signal.setitimer(signal.ITIMER_PROF, limits.cpu_seconds)
+            try:
+                result = executor.execute(code, tables)
+            finally:
+                if has_cpu_timer:
+                    signal.setitimer(signal.ITIMER_PROF, 0)
+        except CpuLimitExceededError as e:
+            result = _failure(f"CpuLimitExceededError: {e!s}")
+
+        try:
+            payload = dump_result(result)
+        except Exception as e:
+            payload = dump_result(
+                _failure(f"Result could not be transferred: {type(e).__name__}: {e}")
+            )
+        if len(payload) > limits.max_result_bytes:
+            payload = dump_result(
+                _failure(
+                    f"ResultTooLargeError: result is {len(payload)} bytes, "
+                    f"limit is {limits.max_result_bytes}. "
+                    "Aggregate or filter the data further."
+                )
+            )
+        conn.send_bytes(payload)
+
+
+def _failure(error: str) -> ExecutionResult:
+    """Build a failed ExecutionResult."""
+    return ExecutionResult(success=False, result=None, error=error)
+
+
+def _read_rss_bytes(pid: int) -> int | None:
+    """Return the resident set size of a process, or None if unavailable."""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text(encoding="ascii")
+    except OSError:
+        return None
+    for line in status.splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) * 1024
+    return None
+
+
+@dataclass
+class _Worker:
+    """A worker process together with its pipe and data generation."""
+
+    process: BaseProcess
+    conn: Connection
+    generation: int
+
+    def kill(self) -> None:
+        """Terminate the process and close the pipe."""
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+
+
+class SandboxPool:
+    """Warm pool of worker processes executing generated code under limits."""
+
+    def __init__(
+        self,
+        dataframes: dict[str, pd.DataFrame],
+        workers: int = 2,
+        limits: SandboxLimits | None = None,
+    ) -> None:
+        """Start the worker processes.
+
+        Args:
+            dataframes: DataFrames exposed to the code in every worker.
+            workers: Number of worker processes (maximum concurrent runs).
+            limits: Resource limits for each run.
+        """
+        self.limits = limits or SandboxLimits()
+        self.size = workers
+        self._dataframes = dataframes
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        # Forking a process with running threads (the HTTP server) can copy
+        # locks held by other threads; a fork server is single-threaded and
+        # already has this module imported, so workers start almost as fast
+        self._context: ForkServerContext | SpawnContext
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload([__name__])
+        else:
+            self._context = multiprocessing.get_context("spawn")
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+
+    def run(
+        self, code: str, tables: Mapping[str, pd.DataFrame] | None = None
+    ) -> ExecutionResult:
+        """Execute code in a worker, enforcing the configured limits.
+
+        Blocks until a worker is free.
+
+        Args:
+            code: Python code to execute.
+            tables: Extra DataFrames for this run, sent along with the code.
+
+        Returns:
+            ExecutionResult from the worker, or a failure describing the limit
+            that was hit.
+        """
+        worker = self._idle.get()
+        try:
+            if worker.generation != self._generation or not worker.process.is_alive():
+                worker.kill()
+                worker = self._spawn()
+            result, healthy = self._run_in(worker, code, dict(tables or {}))
+            if not healthy:
+                worker.kill()
+                worker = self._spawn()
+            return result
+        finally:
+            self._idle.put(worker)
+
+    def reload(self, dataframes: dict[str, pd.DataFrame]) -> None:
+        """Replace the DataFrames; workers are restarted as they become idle.
+
+        Args:
+            dataframes: New DataFrames exposed to the code.
+        """
+        with self._lock:
+            self._dataframes = dataframes
+            self._generation += 1
+
+        # Restart idle workers now; busy ones are replaced before their next run
+        for _ in range(self._idle.qsize()):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker.generation != self._generation:
+                worker.kill()
+                worker = self._spawn()
+            self._idle.put(worker)
+
+    def close(self) -> None:
+        """Stop all idle workers."""
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+    def _spawn(self) -> _Worker:
+        """Start a worker process for the current DataFrames."""
+        with self._lock:
+            dataframes, generation = self._dataframes, self._generation
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, dataframes, self.limits),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(process=process, conn=parent_conn, generation=generation)
+
+    def _run_in(
+        self, worker: _Worker, code: str, tables: dict[str, pd.DataFrame]
+    ) -> tuple[ExecutionResult, bool]:
+        """Send code to a worker and wait for its result under the limits.
+
+        Returns:
+            Tuple of (result, healthy); an unhealthy worker must be replaced.
+        """
+        limits = self.limits
+        deadline = time.monotonic() + limits.timeout_seconds
+        try:
+            worker.conn.send((code, tables))
+            while not worker.conn.poll(POLL_INTERVAL_SECONDS):
+                if not worker.process.is_alive():
+                    return _failure(
+                        "WorkerCrashedError: execution process exited "
+                        f"with code {worker.process.exitcode}"
+                    ), False
+                if time.monotonic() > deadline:
+                    return _failure(
+                        "TimeoutError: execution exceeded the "
+                        f"{limits.timeout_seconds:g}s time limit. "
+                        "Use vectorized pandas operations and avoid loops."
+                    ), False
+                rss = _read_rss_bytes(worker.process.pid or 0)
+                if rss is not None and rss > limits.max_rss_bytes:
+                    return _failure(
+                        f"MemoryError: execution used {rss // 1024**2} MB, limit is "
+                        f"{limits.max_rss_bytes // 1024**2} MB. "
+                        "Avoid merges without keys and large intermediate frames."
+                    ), False
+            payload = worker.conn.recv_bytes()
+        except (EOFError, OSError) as e:
+            return _failure(f"WorkerCrashedError: {type(e).__name__}: {e!s}"), False
+
+        # The worker ran untrusted code, so its payload is decoded as data only
+        try:
+            return load_result(payload), True
+        except TransferError as e:
+            return _failure(f"Result could not be transferred: {e}"), False
@@ -0,0 +1,5 @@
+"""Support code for the Streamlit UI (``app.py``)."""
+
+from src.ui.history import ChatHistory, CompactResult, HistoryMessage, compact_result
+
+__all__ = ["ChatHistory", "CompactResult", "HistoryMessage", "compact_result"]
@@ -0,0 +1,165 @@
+"""Bounded, compact chat history for the Streamlit UI.
+
+Each answer keeps its generated code, its timings and a compact form of its
+result. A DataFrame or Series is stored as zstd-compressed Parquet bytes and
+rendered as a table. Any other result is stored as short text, the way it
+was sent to the LLM. The results of one browser session share a byte
+budget. Beyond it the oldest are dropped; their questions and answers stay.
+"""
+
+import io
+import uuid
+from dataclasses import dataclass, field
+from typing import Literal
+
+import pandas as pd
+import pyarrow as pa
+
+from src.agent.chat_agent import ChatResponse
+from src.tools.code_executor import ExecutionResult
+
+# Compression of stored tabular results
+PARQUET_COMPRESSION: Literal["zstd"] = "zstd"
+# Approximate token budget of a stored non-tabular result
+TEXT_RESULT_TOKENS = 500
+
+
+@dataclass(frozen=True)
+class CompactResult:
+    """An execution result in compact form."""
+
+    # Parquet bytes of a DataFrame or Series result
+    parquet: bytes | None = None
+    # Text of any other result
+    text: str | None = None
+
+    @property
+    def size(self) -> int:
+        """Bytes held by the stored form."""
+        return len(self.parquet or b"") + len((self.text or "").encode("utf-8"))
+
+    def frame(self) -> pd.DataFrame | None:
+        """Decode a tabular result; None if the result is text."""
+        if self.parquet is None:
+            return None
+        return pd.read_parquet(io.BytesIO(self.parquet))
+
+
+def compact_result(result: ExecutionResult) -> CompactResult:
+    """Store a successful execution result compactly.
+
+    Tables that Parquet cannot hold (e.g. columns of mixed types) are stored
+    as text, like non-tabular results.
+    """
+    value = result.result
+    if isinstance(value, pd.Series):
+        value = value.to_frame()
+    if isinstance(value, pd.DataFrame):
+        frame = value.copy(deep=False)
+        # Parquet needs string column names
+        frame.columns = [str(column) for column in frame.columns]
+        buffer = io.BytesIO()
+        try:
+            frame.to_parquet(buffer, compression=PARQUET_COMPRESSION)
+        except (pa.ArrowException, TypeError, ValueError):
+            pass
+        else:
+            return CompactResult(parquet=buffer.getvalue())
+    return CompactResult(text=result.to_string(TEXT_RESULT_TOKENS))
+
+
+@dataclass
+class HistoryMessage:
+    """One chat message; answers carry the details shown under them."""
+
+    role: str
+    content: str
+    # Generated code; None for questions and errors
+    code: str | None = None
+    language: str = "python"
+    success: bool = False
+    error: str | None = None
+    # None if execution failed or the result was dropped to stay within the
+    # byte budget
+    result: CompactResult | None = None
+    time_to_first_token: float | None = None
+    timings: dict[str, float] = field(default_factory=dict)
+    trace_id: str | None = None
+    # Stable across reruns, e.g. to cache the decoded result
+    message_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+
+class ChatHistory:
+    """Messages of one browser session, with results bounded by a byte budget."""
+
+    def __init__(self, max_bytes: int) -> None:
+        """Initialize an empty history.
+
+        Args:
+            max_bytes: Budget for the stored results; the oldest are dropped
+                beyond it.
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.messages: list[HistoryMessage] = []
+
+    def __len__(self) -> int:
+        """Return the number of messages."""
+        return len(self.messages)
+
+    def add(self, role: str, content: str) -> HistoryMessage:
+        """Append a message without details (a question or an error)."""
+        message = HistoryMessage(role=role, content=content)
+        self.messages.append(message)
+        return message
+
+    def add_answer(self, response: ChatResponse, language: str) -> HistoryMessage:
+        """Append an answer with its code and compact result.
+
+        Args:
+            response: The agent's response.
+            language: Language of the generated code, for highlighting.
+
+        Returns:
+            The stored message.
+        """
+        execution = response.execution_result
+        message = HistoryMessage(
+            role="assistant",
+            content=response.answer,
+            code=response.generated_code,
+            language=language,
+            success=execution.success,
+            error=execution.error,
+            result=compact_result(execution) if execution.success else None,
+            time_to_first_token=response.time_to_first_token,
+            timings=response.timings,
+            trace_id=response.trace_id,
+        )
+        self.messages.append(message)
+        if message.result is not None:
+            self.total_bytes += message.result.size
+            self._evict()
+        return message
+
+    def page(self, shown: int) -> tuple[int, list[HistoryMessage]]:
+        """Return the latest messages to render.
+
+        Args:
+            shown: Number of latest messages to show.
+
+        Returns:
+            The number of older messages left out, and the shown messages in
+            order.
+        """
+        hidden = max(len(self.messages) - shown, 0)
+        return hidden, self.messages[hidden:]
+
+    def _evict(self) -> None:
+        """Drop the oldest results until the rest fit the budget."""
+        for message in self.messages:
+            if self.total_bytes <= self.max_bytes:
+                return
+            if message.result is not None:
+                self.total_bytes -= message.result.size
+                message.result = None
@@ -0,0 +1,51 @@
+"""Shared fixtures for the offline tests."""
+
+import shutil
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+import pytest
+
+from src.agent.chat_agent import ChatAgent
+from src.tools.code_executor import enable_copy_on_write
+from tests.fakes import AsyncFakeCompletions, FakeCompletions, Reply
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+
+def pytest_configure() -> None:
+    """Set the process-wide pandas options the entry points set."""
+    enable_copy_on_write()
+
+
+@pytest.fixture
+def make_agent(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[Callable[[Reply], ChatAgent]]:
+    """Build agents over a copy of the sample data, answering from a fake API.
+
+    Generated code runs in process (no sandbox), and the response cache,
+    example index and data refresh are off unless a test turns them on.
+    """
+    data_dir = tmp_path / "data"
+    shutil.copytree(DATA_DIR, data_dir, ignore=shutil.ignore_patterns(".*"))
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("SANDBOX_ENABLED", "false")
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+    monkeypatch.setenv("EXAMPLE_INDEX_ENABLED", "false")
+    monkeypatch.setenv("DATA_REFRESH_INTERVAL_SECONDS", "0")
+    agents: list[ChatAgent] = []
+
+    def build(reply: Reply) -> ChatAgent:
+        agent = ChatAgent(data_dir=data_dir)
+        llm = agent.llm_client
+        monkeypatch.setattr(llm.client.chat, "completions", FakeCompletions(reply))
+        monkeypatch.setattr(
+            llm.async_client.chat, "completions", AsyncFakeCompletions(reply)
+        )
+        agents.append(agent)
+        return agent
+
+    yield build
+    for agent in agents:
+        agent.close()
@@ -0,0 +1,94 @@
+"""Fake OpenAI chat completions for running the agent offline."""
+
+import time
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+# Builds a completion's text (or one text per choice) from the request
+Reply = Callable[[dict[str, Any]], str | list[str]]
+
+
+def is_code_request(request: dict[str, Any]) -> bool:
+    """Whether a completion request asks for generated code."""
+    return "code generator" in request["messages"][0]["content"]
+
+
+def question_of(request: dict[str, Any]) -> str:
+    """The last message of a completion request."""
+    return str(request["messages"][-1]["content"])
+
+
+class FakeCompletions:
+    """Stand-in for ``OpenAI().chat.completions`` answering from a function."""
+
+    def __init__(self, reply: Reply) -> None:
+        """Initialize the fake.
+
+        Args:
+            reply: Builds the completion text for each request.
+        """
+        self.reply = reply
+        # Keyword arguments of every create() call, in order
+        self.requests: list[dict[str, Any]] = []
+
+    def create(self, **kwargs: Any) -> ChatCompletion | Iterator[ChatCompletionChunk]:  # noqa: ANN401
+        """Return a completion, or a chunk stream if ``stream`` is set."""
+        self.requests.append(kwargs)
+        reply = self.reply(kwargs)
+        contents = [reply] if isinstance(reply, str) else reply
+        usage = CompletionUsage(
+            prompt_tokens=100, completion_tokens=10, total_tokens=110
+        )
+        if kwargs.get("stream"):
+            return self._chunks(kwargs["model"], contents[0], usage)
+        return ChatCompletion.model_validate(
+            {
+                "id": "fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": kwargs["model"],
+                "choices": [
+                    {
+                        "index": index,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }
+                    for index, content in enumerate(contents)
+                ],
+                "usage": usage.model_dump(),
+            }
+        )
+
+    @staticmethod
+    def _chunks(
+        model: str, content: str, usage: CompletionUsage
+    ) -> Iterator[ChatCompletionChunk]:
+        base = {
+            "id": "fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+        }
+        for word in content.split(" "):
+            yield ChatCompletionChunk.model_validate(
+                {
+                    **base,
+                    "choices": [{"index": 0, "delta": {"content": f"{word} "}}],
+                }
+            )
+        yield ChatCompletionChunk.model_validate(
+            {**base, "choices": [], "usage": usage.model_dump()}
+        )
+
+
+class AsyncFakeCompletions(FakeCompletions):
+    """Stand-in for ``AsyncOpenAI().chat.completions``."""
+
+    async def create(self, **kwargs: Any) -> ChatCompletion:  # type: ignore[override]  # noqa: ANN401
+        """Return a completion."""
+        completion = super().create(**kwargs)
+        assert isinstance(completion, ChatCompletion)
+        return completion
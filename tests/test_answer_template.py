@@ -0,0 +1,32 @@
+"""Tests for filling answer templates from execution results."""
+
+import pandas as pd
+
+from src.agent.answer_template import fill_answer_template
+from src.tools.code_executor import ExecutionResult
+
+
+def _filled(template: str, result: object) -> str | None:
+    return fill_answer_template(template, ExecutionResult(success=True, result=result))
+
+
+def test_group_labels_are_kept() -> None:
+    """A grouped result names its groups, as a DataFrame or a Series."""
+    line_items = pd.DataFrame({"client": ["Acme", "Beta", "Acme"], "amt": [1, 2, 3]})
+    totals = line_items.groupby("client")[["amt"]].sum().astype(float)
+
+    answer = _filled("Totals by client:\n{table}", totals)
+
+    assert answer is not None
+    assert "| Acme | 4.00 |" in answer
+    assert "| Beta | 2.00 |" in answer
+    assert _filled("{table}", totals["amt"]) == answer.removeprefix(
+        "Totals by client:\n"
+    )
+
+
+def test_clashing_index_name_falls_back_to_the_llm() -> None:
+    """A Series named like its index cannot be tabulated, so it is left out."""
+    amounts = pd.Series([1, 2], index=pd.Index(["a", "b"], name="amt"), name="amt")
+
+    assert _filled("{table}", amounts) is None
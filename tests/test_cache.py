@@ -0,0 +1,138 @@
+"""Tests for the LLM response cache."""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from src.llm import cache as cache_module
+from src.llm.cache import ResponseCache
+
+
+class Clock:
+    """A settable stand-in for ``time.time``."""
+
+    def __init__(self) -> None:
+        """Start at an arbitrary fixed time."""
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        """Return the current fake time."""
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    """Control the time the cache sees."""
+    fake = Clock()
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(time=fake.time))
+    return fake
+
+
+def test_entries_expire(clock: Clock) -> None:
+    """An entry older than the TTL is a miss."""
+    cache = ResponseCache(":memory:", ttl_seconds=60)
+    cache.put("key", {"content": "cached"})
+
+    clock.now += 59
+    assert cache.get("key") == {"content": "cached"}
+    clock.now += 2
+    assert cache.get("key") is None
+
+
+def test_least_recently_used_is_evicted(clock: Clock) -> None:
+    """Beyond ``max_entries``, the entry read longest ago is dropped."""
+    cache = ResponseCache(":memory:", max_entries=2)
+    cache.put("a", {"n": 1})
+    clock.now += 1
+    cache.put("b", {"n": 2})
+    clock.now += 1
+    assert cache.get("a") is not None
+    clock.now += 1
+
+    cache.put("c", {"n": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"n": 1}
+    assert cache.get("c") == {"n": 3}
+
+
+def test_concurrent_misses_compute_once() -> None:
+    """Threads missing the same key share one computation."""
+    cache = ResponseCache(":memory:")
+    callers = 4
+    started = threading.Barrier(callers)
+    release = threading.Event()
+    calls = 0
+
+    def compute() -> dict[str, Any]:
+        nonlocal calls
+        calls += 1
+        release.wait(timeout=5)
+        return {"content": "computed"}
+
+    results: list[tuple[dict[str, Any], bool]] = []
+
+    def ask() -> None:
+        started.wait()
+        results.append(cache.get_or_compute("key", compute))
+
+    threads = [threading.Thread(target=ask) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    # Let every caller reach the cache before the computation finishes
+    threading.Timer(0.2, release.set).start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert calls == 1
+    assert [value for value, _ in results] == [{"content": "computed"}] * callers
+    assert sorted(hit for _, hit in results) == [False] + [True] * (callers - 1)
+
+
+def test_concurrent_async_misses_compute_once() -> None:
+    """Coroutines missing the same key share one computation."""
+    cache = ResponseCache(":memory:")
+    calls = 0
+
+    async def compute() -> dict[str, Any]:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return {"content": "computed"}
+
+    async def scenario() -> list[tuple[dict[str, Any], bool]]:
+        return await asyncio.gather(
+            *(cache.get_or_compute_async("key", compute) for _ in range(4))
+        )
+
+    results = asyncio.run(scenario())
+
+    assert calls == 1
+    assert sorted(hit for _, hit in results) == [False, True, True, True]
+    assert cache.get("key") == {"content": "computed"}
+
+
+def test_cancelled_follower_keeps_the_computation() -> None:
+    """Cancelling a waiting caller does not cancel the shared computation."""
+    cache = ResponseCache(":memory:")
+    computing = asyncio.Event()
+
+    async def compute() -> dict[str, Any]:
+        computing.set()
+        await asyncio.sleep(0.1)
+        return {"content": "computed"}
+
+    async def scenario() -> tuple[dict[str, Any], bool]:
+        leader = asyncio.create_task(cache.get_or_compute_async("key", compute))
+        await computing.wait()
+        follower = asyncio.create_task(cache.get_or_compute_async("key", compute))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(scenario()) == ({"content": "computed"}, False)
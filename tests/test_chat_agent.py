@@ -0,0 +1,98 @@
+"""Tests for the chat agent, against a fake OpenAI API."""
+
+import asyncio
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, cast
+
+import pytest
+
+from src.agent.chat_agent import ChatAgent, StreamStage
+from src.telemetry.tracing import current_trace
+from tests.fakes import FakeCompletions, Reply, is_code_request, question_of
+
+UK_CLIENTS = (
+    "```python\nresult = clients[clients['country'] == 'UK'][['client_name']]\n```"
+)
+
+
+def _reply(request: dict[str, Any]) -> str:
+    if is_code_request(request):
+        return UK_CLIENTS
+    return "There are several clients in the UK."
+
+
+def test_time_to_first_token_only_for_streams(
+    make_agent: Callable[[Reply], ChatAgent],
+) -> None:
+    """Non-streamed answers do not report a time to first token."""
+    agent = make_agent(_reply)
+
+    assert agent.ask("Which clients are in the UK?").time_to_first_token is None
+    response = asyncio.run(agent.ask_async("Which clients are in the UK?"))
+    assert response.time_to_first_token is None
+
+    events = list(agent.ask_stream("Which clients are in the UK?"))
+    done = events[-1]
+    assert done.stage == StreamStage.DONE
+    assert done.data.time_to_first_token is not None
+    assert 0 < done.data.time_to_first_token <= done.data.timings["total"]
+
+
+def test_stream_trace_is_not_current_between_events(
+    make_agent: Callable[[Reply], ChatAgent],
+) -> None:
+    """The consumer of a stream does not see its trace, yet the spans count."""
+    agent = make_agent(_reply)
+
+    events = []
+    for event in agent.ask_stream("Which clients are in the UK?"):
+        assert current_trace() is None
+        events.append(event)
+
+    timings = events[-1].data.timings
+    assert "llm.generate" in timings
+    assert "exec" in timings
+
+
+def test_candidates_do_not_use_up_repairs(
+    make_agent: Callable[[Reply], ChatAgent], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Failed speculative candidates leave the repair budget untouched."""
+    monkeypatch.setenv("SPECULATIVE_CANDIDATES", "3")
+
+    def reply(request: dict[str, Any]) -> str | list[str]:
+        if not is_code_request(request):
+            return "There are several clients in the UK."
+        if "Running that code failed" in question_of(request):
+            return UK_CLIENTS
+        return [f"```python\nresult = clients['missing_{n}']\n```" for n in range(3)]
+
+    agent = make_agent(reply)
+    response = agent.ask_with_retry("Which clients are in the UK?", max_retries=1)
+
+    assert response.execution_result.success
+    assert len(response.attempts) == 4
+
+
+def test_follow_ups_do_not_reuse_stored_code(
+    make_agent: Callable[[Reply], ChatAgent],
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    """Stored standalone code is not reused once a session has results."""
+    monkeypatch.setenv("EXAMPLE_INDEX_ENABLED", "true")
+    monkeypatch.setenv("EXAMPLE_INDEX_PATH", str(tmp_path / "examples.sqlite3"))
+    agent = make_agent(_reply)
+    # make_agent swapped in the fake
+    completions = cast("FakeCompletions", agent.llm_client.client.chat.completions)
+
+    def generated() -> int:
+        return sum(is_code_request(request) for request in completions.requests)
+
+    agent.ask("Which clients are in the UK?", session_id="first")
+    agent.ask("Which clients are in the UK?", session_id="second")
+    assert generated() == 1
+
+    agent.ask("Which clients are in the UK?", session_id="first")
+    assert generated() == 2
@@ -0,0 +1,203 @@
+"""Tests for coalescing identical in-flight questions, through the HTTP API."""
+
+import asyncio
+import threading
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from typing import Any
+
+import pytest
+
+pytest.importorskip("starlette")
+
+import httpx
+from openai.types.chat import ChatCompletion
+
+from src.agent.chat_agent import ChatAgent
+from src.api.server import create_app
+from tests.fakes import AsyncFakeCompletions, Reply, is_code_request
+
+# Longest a test waits for the app to reach a state, in seconds
+WAIT_SECONDS = 5
+
+QUESTION = {"question": "Which clients are in the UK?"}
+
+UK_CLIENTS = (
+    "```python\nresult = clients[clients['country'] == 'UK'][['client_name']]\n```"
+)
+
+
+def _reply(request: dict[str, Any]) -> str:
+    if is_code_request(request):
+        return UK_CLIENTS
+    return "There are several clients in the UK."
+
+
+class GatedCompletions(AsyncFakeCompletions):
+    """Async fake whose completions wait until the test opens a gate."""
+
+    def __init__(self, reply: Reply) -> None:
+        """Initialize with the gate closed."""
+        super().__init__(reply)
+        self.entered = asyncio.Event()
+        self.gate = asyncio.Event()
+
+    async def create(self, **kwargs: Any) -> ChatCompletion:  # type: ignore[override]  # noqa: ANN401
+        """Return a completion once the gate is open."""
+        self.entered.set()
+        await self.gate.wait()
+        return await super().create(**kwargs)
+
+
+@asynccontextmanager
+async def serve(agent: ChatAgent) -> AsyncIterator[httpx.AsyncClient]:
+    """Run the app around an agent and yield a client once it is ready."""
+    app = create_app(agent_factory=lambda: agent)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            await wait_until(client, lambda ready: ready.status_code == 200)
+            yield client
+
+
+async def wait_until(
+    client: httpx.AsyncClient, condition: Callable[[httpx.Response], bool]
+) -> None:
+    """Poll ``/ready`` until its response meets a condition."""
+    for _ in range(WAIT_SECONDS * 100):
+        if condition(await client.get("/ready")):
+            return
+        await asyncio.sleep(0.01)
+    pytest.fail("the app did not reach the expected state")
+
+
+async def wait_for_coalesced(client: httpx.AsyncClient, count: int) -> None:
+    """Wait until ``count`` requests joined a run started by another one."""
+    await wait_until(client, lambda ready: ready.json().get("coalesced", 0) >= count)
+
+
+def sse_events(body: str) -> list[str]:
+    """The event names of a server-sent event stream."""
+    return [
+        line.removeprefix("event: ")
+        for line in body.splitlines()
+        if line.startswith("event: ")
+    ]
+
+
+def test_cancelled_request_does_not_cancel_the_shared_run(
+    make_agent: Callable[[Reply], ChatAgent], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """The request that started a run can go away; the others still get it."""
+    agent = make_agent(_reply)
+    completions = GatedCompletions(_reply)
+    monkeypatch.setattr(agent.llm_client.async_client.chat, "completions", completions)
+
+    async def scenario() -> httpx.Response:
+        async with serve(agent) as client:
+            first = asyncio.create_task(client.post("/ask", json=QUESTION))
+            await completions.entered.wait()
+            second = asyncio.create_task(client.post("/ask", json=QUESTION))
+            await wait_for_coalesced(client, 1)
+
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            completions.gate.set()
+            return await second
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert response.json()["answer"] == "There are several clients in the UK."
+    assert sum(is_code_request(r) for r in completions.requests) == 1
+
+
+def test_failed_run_fails_every_request(
+    make_agent: Callable[[Reply], ChatAgent], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """An error of the shared run is reported to every request waiting on it."""
+
+    def reply(_request: dict[str, Any]) -> str:
+        msg = "upstream unavailable"
+        raise RuntimeError(msg)
+
+    agent = make_agent(reply)
+    completions = GatedCompletions(reply)
+    monkeypatch.setattr(agent.llm_client.async_client.chat, "completions", completions)
+
+    async def scenario() -> list[httpx.Response]:
+        async with serve(agent) as client:
+            first = asyncio.create_task(client.post("/ask", json=QUESTION))
+            await completions.entered.wait()
+            second = asyncio.create_task(client.post("/ask", json=QUESTION))
+            await wait_for_coalesced(client, 1)
+            completions.gate.set()
+            return list(await asyncio.gather(first, second))
+
+    responses = asyncio.run(scenario())
+
+    assert [r.status_code for r in responses] == [502, 502]
+    assert {r.json()["error"] for r in responses} == {
+        "RuntimeError: upstream unavailable"
+    }
+    assert len(completions.requests) == 1
+
+
+def _stream_scenario(
+    make_agent: Callable[[Reply], ChatAgent], *, fail: bool
+) -> list[httpx.Response]:
+    """Stream one question twice, the second request joining mid-answer.
+
+    The answer is held back until the second request has subscribed, so it
+    has missed the code and execution events of the stream.
+    """
+    answering = threading.Event()
+    release = threading.Event()
+
+    def reply(request: dict[str, Any]) -> str:
+        if is_code_request(request):
+            return UK_CLIENTS
+        answering.set()
+        release.wait(timeout=WAIT_SECONDS)
+        if fail:
+            msg = "upstream unavailable"
+            raise RuntimeError(msg)
+        return "There are several clients in the UK."
+
+    agent = make_agent(reply)
+
+    async def scenario() -> list[httpx.Response]:
+        async with serve(agent) as client:
+            first = asyncio.create_task(client.post("/ask/stream", json=QUESTION))
+            await asyncio.to_thread(answering.wait, WAIT_SECONDS)
+            second = asyncio.create_task(client.post("/ask/stream", json=QUESTION))
+            await wait_for_coalesced(client, 1)
+            release.set()
+            return list(await asyncio.gather(first, second))
+
+    return asyncio.run(scenario())
+
+
+def test_late_stream_subscriber_replays_missed_events(
+    make_agent: Callable[[Reply], ChatAgent],
+) -> None:
+    """A request joining a stream late first gets the events it missed."""
+    first, second = _stream_scenario(make_agent, fail=False)
+
+    assert sse_events(first.text)[:2] == ["code_generated", "execution_done"]
+    assert sse_events(first.text)[-1] == "done"
+    assert second.text == first.text
+
+
+def test_stream_error_reaches_every_subscriber(
+    make_agent: Callable[[Reply], ChatAgent],
+) -> None:
+    """A failing stream ends every subscriber's events with the error."""
+    first, second = _stream_scenario(make_agent, fail=True)
+
+    assert sse_events(first.text) == ["code_generated", "execution_done", "error"]
+    assert "RuntimeError: upstream unavailable" in first.text
+    assert second.text == first.text
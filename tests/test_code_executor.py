@@ -0,0 +1,42 @@
+"""Tests for run isolation and execution result fingerprints."""
+
+import pandas as pd
+import pytest
+
+from src.tools.code_executor import CodeExecutor, result_fingerprint
+
+
+def test_fingerprint_ignores_labels_and_order() -> None:
+    """Renamed, reordered and re-indexed copies of a result match."""
+    frame = pd.DataFrame({"client": ["Acme", "Beta"], "total": [10.0, 20.0]})
+    reordered = pd.DataFrame({"sum": [20.0, 10.0], "name": ["Beta", "Acme"]})
+    series = pd.Series([10.0, 20.0], index=pd.Index(["Acme", "Beta"], name="c"))
+
+    assert result_fingerprint(reordered) == result_fingerprint(frame)
+    assert result_fingerprint(series) == result_fingerprint(frame)
+
+
+def test_fingerprint_keeps_rows_together() -> None:
+    """Pairing the same values differently gives a different fingerprint."""
+    frame = pd.DataFrame({"client": ["Acme", "Beta"], "total": [10.0, 20.0]})
+    swapped = pd.DataFrame({"client": ["Acme", "Beta"], "total": [20.0, 10.0]})
+
+    assert result_fingerprint(swapped) != result_fingerprint(frame)
+
+
+@pytest.mark.skipif(
+    int(pd.__version__.split(".", maxsplit=1)[0]) >= 3,
+    reason="Copy-on-Write cannot be turned off",
+)
+def test_runs_are_isolated_without_copy_on_write() -> None:
+    """Writes in generated code never reach the shared frames."""
+    invoices = pd.DataFrame({"a": [1, 2]})
+    executor = CodeExecutor({"invoices": invoices})
+
+    with pd.option_context("mode.copy_on_write", False):  # noqa: FBT003
+        execution = executor.execute(
+            "invoices.loc[0, 'a'] = 99\nresult = int(invoices['a'].sum())"
+        )
+
+    assert execution.result == 101
+    assert invoices["a"].tolist() == [1, 2]
@@ -0,0 +1,91 @@
+"""Tests for the static cost analysis and vectorizing rewrites."""
+
+import ast
+from typing import Any
+
+import pandas as pd
+import pytest
+
+from src.tools.code_optimizer import PYTHON_ROW_COST, optimize
+
+ROWS = {"invoices": 1_000, "clients": 100}
+
+
+def _run(code: str) -> tuple[dict[str, Any], dict[str, Any], list[str]]:
+    """Execute code before and after optimization; return both namespaces."""
+    frame = pd.DataFrame({"qty": [1, 2, 3], "price": [2.0, 0.5, 1.0]})
+    tree, report = optimize(ast.parse(code), ROWS)
+    original: dict[str, Any] = {"invoices": frame.copy()}
+    rewritten: dict[str, Any] = {"invoices": frame.copy()}
+    exec(compile(code, "<original>", "exec"), original)  # noqa: S102
+    exec(compile(tree, "<rewritten>", "exec"), rewritten)  # noqa: S102
+    return original, rewritten, report.rewrites
+
+
+def test_accumulating_loop_is_vectorized() -> None:
+    """A running total over iterrows becomes a column sum with the same value."""
+    code = (
+        "total = 0\n"
+        "for _, row in invoices.iterrows():\n"
+        "    total += row['qty'] * row['price']\n"
+        "result = total"
+    )
+
+    original, rewritten, rewrites = _run(code)
+
+    assert rewrites
+    assert rewritten["result"] == original["result"]
+
+
+@pytest.mark.parametrize("reader", ["result = row['qty']", "result = _"])
+def test_loop_targets_read_after_the_loop_are_kept(reader: str) -> None:
+    """The rewrite is skipped when code after the loop reads a loop variable."""
+    code = (
+        "total = 0\n"
+        "for _, row in invoices.iterrows():\n"
+        "    total += row['qty']\n"
+        f"{reader}"
+    )
+
+    original, rewritten, rewrites = _run(code)
+
+    assert not rewrites
+    assert rewritten["result"] == original["result"]
+
+
+def test_row_wise_apply_is_vectorized() -> None:
+    """Row-wise arithmetic in apply(axis=1) becomes column arithmetic."""
+    code = "result = invoices.apply(lambda r: r['qty'] * r['price'], axis=1)"
+
+    original, rewritten, rewrites = _run(code)
+
+    assert rewrites
+    pd.testing.assert_series_equal(rewritten["result"], original["result"])
+
+
+def test_cross_merge_is_costed_as_a_product() -> None:
+    """Only how="cross" is charged for every pair of rows."""
+    _, report = optimize(
+        ast.parse("result = invoices.merge(clients, how='cross')"), ROWS
+    )
+
+    assert report.cost >= 1_000 * 100
+    assert any("cross merge" in finding for finding in report.findings)
+
+
+def test_keyless_merge_is_not_a_product() -> None:
+    """A merge without keys joins on the common columns, not every pair."""
+    _, report = optimize(ast.parse("result = invoices.merge(clients)"), ROWS)
+
+    assert not report.findings
+    assert report.cost < 1_000 * 100
+
+
+def test_iterrows_loop_is_flagged() -> None:
+    """A loop the rewrite cannot handle is charged per row."""
+    code = "names = []\nfor _, row in invoices.iterrows():\n    names.append(row)"
+
+    _, report = optimize(ast.parse(code), ROWS)
+
+    assert report.cost >= 1_000 * PYTHON_ROW_COST
+    assert report.findings
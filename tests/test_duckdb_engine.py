@@ -0,0 +1,100 @@
+"""Tests for the DuckDB engine's confinement and its use of the snapshot."""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.dataloaders.excel_loader import load_data
+from src.tools.code_executor import CodeExecutor
+from src.tools.duckdb_engine import DuckDBEngine
+from tests.workbooks import append_rows, copy_data
+
+pytest.importorskip("duckdb")
+
+NEW_INVOICE = (
+    "I1041",
+    "C001",
+    "2025-01-05",
+    "2025-02-04",
+    "Pending",
+    "USD",
+    1,
+)
+COUNT_INVOICES = "SELECT count(*) AS n FROM invoices"
+
+
+def _count(executor: CodeExecutor) -> int:
+    execution = executor.execute(COUNT_INVOICES)
+    assert execution.success, execution.error
+    return int(execution.result)
+
+
+@pytest.fixture
+def executor() -> CodeExecutor:
+    """An executor running SQL over one small in-memory table."""
+    invoices = pd.DataFrame({"invoice_id": ["I1", "I2"], "amount": [10.0, 20.0]})
+    dataframes = {"invoices": invoices}
+    return CodeExecutor(dataframes, engine=DuckDBEngine(dataframes))
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "DELETE FROM invoices",
+        "CREATE TABLE copy AS SELECT * FROM invoices",
+        "SELECT 1; SELECT 2",
+        "COPY invoices TO 'out.csv'",
+    ],
+)
+def test_only_one_select_is_accepted(executor: CodeExecutor, code: str) -> None:
+    """Anything but a single SELECT is rejected before it runs."""
+    execution = executor.execute(code)
+
+    assert not execution.success
+    assert "SyntaxError" in (execution.error or "")
+
+
+def test_files_outside_the_snapshot_are_unreadable(
+    executor: CodeExecutor, tmp_path: Path
+) -> None:
+    """Queries cannot read files the engine was not given."""
+    secret = tmp_path / "secret.csv"
+    secret.write_text("a\n1\n", encoding="utf-8")
+
+    execution = executor.execute(f"SELECT * FROM read_csv('{secret}')")  # noqa: S608
+
+    assert not execution.success
+    assert "secret" not in str(execution.result)
+
+
+def test_snapshot_is_used_while_current(tmp_path: Path) -> None:
+    """Snapshot files written by the load serve the query."""
+    context = load_data(copy_data(tmp_path / "data"))
+    dataframes = context.get_dataframes_dict()
+    engine = DuckDBEngine(dataframes, parquet_files=context.snapshot_files)
+
+    assert "invoices" in context.snapshot_files
+    assert _count(CodeExecutor(dataframes, engine=engine)) == len(context.invoices)
+
+
+def test_stale_snapshot_falls_back_to_memory(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Parquet left behind by a failed save is not read."""
+    data_dir = copy_data(tmp_path / "data")
+    load_data(data_dir)
+    append_rows(data_dir / "Invoices.xlsx", [NEW_INVOICE])
+
+    def fail(*_args: object, **_kwargs: object) -> None:
+        msg = "disk full"
+        raise OSError(msg)
+
+    monkeypatch.setattr(pd.DataFrame, "to_parquet", fail)
+    context = load_data(data_dir)
+    dataframes = context.get_dataframes_dict()
+    engine = DuckDBEngine(dataframes, parquet_files=context.snapshot_files)
+
+    assert context.snapshot_files == {}
+    assert len(context.invoices) == 41
+    assert _count(CodeExecutor(dataframes, engine=engine)) == 41
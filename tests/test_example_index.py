@@ -0,0 +1,59 @@
+"""Tests for reusing stored code for questions with other entities."""
+
+import pandas as pd
+import pytest
+
+from src.llm.example_index import ExampleIndex
+
+DECEMBER_WINDOW = (
+    "result = invoices[(invoices['invoice_date'] >= '2024-12-01')"
+    " & (invoices['invoice_date'] < '2025-01-01')]"
+)
+YEAR_FILTER = (
+    "result = merged[(merged['client_name'] == 'Acme Corp')"
+    " & (merged['invoice_date'].dt.year == 2024)]['line_total'].sum()"
+)
+
+
+@pytest.fixture
+def index() -> ExampleIndex:
+    """An in-memory index recognizing two client names."""
+    example_index = ExampleIndex(":memory:", "test")
+    clients = pd.DataFrame({"client_name": ["Acme Corp", "Bright Legal"]})
+    example_index.set_dataframes({"clients": clients})
+    return example_index
+
+
+def test_entities_are_substituted(index: ExampleIndex) -> None:
+    """A question differing only in its entities reuses the stored code."""
+    index.add("Total billed to Acme Corp in 2024?", YEAR_FILTER, None)
+
+    reuse = index.reuse("Total billed to Bright Legal in 2023?")
+
+    assert reuse is not None
+    assert "'Bright Legal'" in reuse.code
+    assert "== 2023" in reuse.code
+    assert "Acme" not in reuse.code
+    assert "2024" not in reuse.code
+
+
+def test_derived_date_bounds_are_not_reused(index: ExampleIndex) -> None:
+    """A window bound not named in the question blocks the year change."""
+    index.add("Invoices issued in December 2024?", DECEMBER_WINDOW, None)
+
+    assert index.reuse("Invoices issued in December 2023?") is None
+    # The same window is still reused as is
+    reuse = index.reuse("Invoices issued in December 2024?")
+    assert reuse is not None
+    assert reuse.code == DECEMBER_WINDOW
+
+
+def test_date_literals_must_come_from_the_question(index: ExampleIndex) -> None:
+    """Only the dates the question mentions may be rewritten."""
+    code = (
+        "result = invoices[(invoices['due_date'] < '2024-12-31')"
+        " & (invoices['invoice_date'] >= '2024-01-01')]"
+    )
+    index.add("Which invoices are overdue as of 2024-12-31?", code, None)
+
+    assert index.reuse("Which invoices are overdue as of 2024-06-30?") is None
@@ -0,0 +1,65 @@
+"""Tests for streaming workbook ingestion."""
+
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+import pytest
+from openpyxl import Workbook
+
+from src.dataloaders.excel_loader import read_excel_streaming
+
+
+def _workbook(path: Path, rows: Sequence[tuple[object, ...]]) -> Path:
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["id", "quantity"])
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+def test_chunks_are_stitched(tmp_path: Path) -> None:
+    """Every row is read back in order, whatever the chunk size."""
+    rows = [(f"L{i}", i) for i in range(7)]
+    path = _workbook(tmp_path / "rows.xlsx", rows)
+
+    table = read_excel_streaming(path, chunk_rows=2)
+
+    assert table["id"].tolist() == [row[0] for row in rows]
+    assert table["quantity"].dtype == np.dtype("int64")
+    assert table["quantity"].tolist() == list(range(7))
+
+
+def test_blank_chunk_keeps_numeric_dtype(tmp_path: Path) -> None:
+    """A chunk with only blanks makes an integer column float, not object."""
+    rows = [("a", 1), ("b", 2), ("c", None), ("d", None), ("e", 5)]
+    path = _workbook(tmp_path / "blanks.xlsx", rows)
+
+    table = read_excel_streaming(path, chunk_rows=2)
+
+    assert table["quantity"].dtype == np.dtype("float64")
+    assert table["quantity"].isna().tolist() == [False, False, True, True, False]
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 10])
+def test_mixed_chunk_widens_every_chunk(tmp_path: Path, chunk_rows: int) -> None:
+    """A chunk that does not fit the inferred dtype widens the whole column."""
+    rows = [("a", 1), ("b", 2), ("c", "n/a")]
+    path = _workbook(tmp_path / "mixed.xlsx", rows)
+
+    table = read_excel_streaming(path, chunk_rows=chunk_rows)
+
+    assert table["quantity"].dtype == np.dtype(object)
+    assert table["quantity"].tolist() == [1, 2, "n/a"]
+
+
+def test_header_only(tmp_path: Path) -> None:
+    """A sheet with no data rows gives an empty frame with the columns."""
+    path = _workbook(tmp_path / "empty.xlsx", [])
+
+    table = read_excel_streaming(path)
+
+    assert table.empty
+    assert table.columns.tolist() == ["id", "quantity"]
@@ -0,0 +1,64 @@
+"""Tests for the table indexes and the lookup helpers built on them."""
+
+import pandas as pd
+import pytest
+
+from src.dataloaders.indexes import TableIndexes
+from src.tools.lookup import build_lookup_helpers
+
+
+@pytest.fixture
+def dataframes() -> dict[str, pd.DataFrame]:
+    """Two clients, three invoices out of date order and their line items."""
+    clients = pd.DataFrame({"client_id": ["C1", "C2"], "client_name": ["Acme", "Beta"]})
+    invoices = pd.DataFrame(
+        {
+            "invoice_id": ["I1", "I2", "I3"],
+            "client_id": ["C1", "C2", "C1"],
+            "invoice_date": pd.to_datetime(["2024-03-01", "2024-01-15", "2024-02-10"]),
+        }
+    )
+    # I2 has no line items: the left merge gives it one row without a line_id
+    merged = pd.DataFrame(
+        {"invoice_id": ["I1", "I1", "I2", "I3"], "line_id": [1, 2, None, 3]}
+    )
+    return {"clients": clients, "invoices": invoices, "merged": merged}
+
+
+def test_missing_date_column_skips_the_indexes(
+    dataframes: dict[str, pd.DataFrame],
+) -> None:
+    """Tables without an indexed column get no indexes instead of a KeyError."""
+    dataframes["invoices"] = dataframes["invoices"].drop(columns="invoice_date")
+
+    assert TableIndexes.build(dataframes) is None
+
+
+def test_lookups_match_pandas(dataframes: dict[str, pd.DataFrame]) -> None:
+    """Indexed lookups return the rows a boolean mask would, by date."""
+    indexes = TableIndexes.build(dataframes)
+    assert indexes is not None
+    helpers = build_lookup_helpers(dataframes, indexes)
+
+    between = helpers["invoices_between"]("2024-02-01", "2024-03-01")
+    for_client = helpers["invoices_for_client"]("acme", end="2024-02-28")
+
+    assert between["invoice_id"].tolist() == ["I3", "I1"]
+    assert for_client["invoice_id"].tolist() == ["I3"]
+    assert helpers["get_client"]("Beta")["client_id"] == "C2"
+    assert helpers["line_items_for_invoice"]("I1")["line_id"].tolist() == [1, 2]
+    assert helpers["line_items_for_invoice"]("I3")["line_id"].tolist() == [3]
+
+
+def test_invoice_without_line_items_has_none(
+    dataframes: dict[str, pd.DataFrame],
+) -> None:
+    """The placeholder row of an invoice without line items is not returned."""
+    indexes = TableIndexes.build(dataframes)
+    assert indexes is not None
+    helpers = build_lookup_helpers(dataframes, indexes)
+
+    line_items = helpers["line_items_for_invoice"]("I2")
+
+    assert line_items.empty
+    assert set(line_items.columns) == {"invoice_id", "line_id"}
@@ -0,0 +1,24 @@
+"""Tests for question-aware schema pruning."""
+
+import pytest
+
+from src.llm.prompt_builder import PromptBuilder
+
+
+@pytest.mark.parametrize(
+    "question",
+    ["What is the status of invoice I-7?", "Break invoices down by statuses"],
+)
+def test_singular_and_plural_select_the_same_column(question: str) -> None:
+    """Both forms of a column word select that column."""
+    selection = PromptBuilder().select(question)
+
+    assert selection.pruned
+    assert "status" in selection.columns["invoices"]
+
+
+def test_plural_table_word_selects_the_table() -> None:
+    """Irregular plurals are reduced to the table keyword."""
+    selection = PromptBuilder().select("List all companies")
+
+    assert set(selection.columns) == {"clients"}
@@ -0,0 +1,123 @@
+"""Tests for the background data refresher."""
+
+import threading
+from collections.abc import Callable
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from src.agent.chat_agent import ChatAgent
+from src.dataloaders import refresh
+from src.dataloaders.excel_loader import DataContext, load_data
+from src.dataloaders.refresh import DataRefresher
+from tests.fakes import Reply
+from tests.workbooks import append_rows, copy_data
+
+# Columns identifying a row of each compared frame
+ROW_KEYS = {
+    "invoices": ["invoice_id"],
+    "line_items": ["line_id"],
+    "merged": ["client_id", "invoice_id", "line_id"],
+}
+
+
+def _invoice(invoice_id: str, client_id: str) -> tuple[object, ...]:
+    return (invoice_id, client_id, "2025-01-05", "2025-02-05", "Pending", "USD", 1)
+
+
+def _line_item(line_id: str, invoice_id: str) -> tuple[object, ...]:
+    return (line_id, invoice_id, "Contract Review", 2, 100, 0.1)
+
+
+def _assert_rebuilt(context: DataContext, data_dir: Path) -> None:
+    """The refreshed tables hold the rows of a load from scratch."""
+    expected = load_data(data_dir, use_snapshot=False)
+    for name, keys in ROW_KEYS.items():
+        pd.testing.assert_frame_equal(
+            getattr(context, name).sort_values(keys, ignore_index=True),
+            getattr(expected, name).sort_values(keys, ignore_index=True),
+        )
+
+
+def test_poll_survives_unexpected_errors(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A refresh failing with any exception is logged and polling goes on."""
+    copy_data(tmp_path)
+    context = load_data(tmp_path, use_snapshot=False)
+    refresher = DataRefresher(tmp_path, context, use_snapshot=False)
+    calls = 0
+    polled_again = threading.Event()
+
+    def refresh() -> None:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            msg = "corrupt workbook"
+            raise RuntimeError(msg)
+        polled_again.set()
+
+    monkeypatch.setattr(refresher, "refresh", refresh)
+    refresher.start(interval_seconds=0.01)
+    try:
+        assert polled_again.wait(timeout=5)
+    finally:
+        refresher.stop()
+
+
+def test_appended_rows_extend_the_tables(
+    make_agent: Callable[[Reply], ChatAgent],
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Appended invoices and line items are merged without a full rebuild."""
+    agent = make_agent(lambda _: "")
+    data_dir = tmp_path / "data"
+
+    def rebuild(*_args: object, **_kwargs: object) -> DataContext:
+        msg = "appended rows rebuilt every frame"
+        raise AssertionError(msg)
+
+    monkeypatch.setattr(refresh, "build_context", rebuild)
+    # A new invoice without line items leaves a placeholder row in merged
+    append_rows(data_dir / "Invoices.xlsx", [_invoice("I1041", "C001")])
+    assert agent.refresh_data()
+    assert agent.data_context.merged["line_id"].isna().sum() == 1
+    _assert_rebuilt(agent.data_context, data_dir)
+
+    # Line items of that (now old) invoice replace the placeholder, next to a
+    # new invoice with its line item and a new line item of an older invoice
+    append_rows(data_dir / "Invoices.xlsx", [_invoice("I1042", "C002")])
+    append_rows(
+        data_dir / "InvoiceLineItems.xlsx",
+        [
+            _line_item("L097", "I1041"),
+            _line_item("L098", "I1042"),
+            _line_item("L099", "I1001"),
+        ],
+    )
+    assert agent.refresh_data()
+    assert agent.data_context.merged["line_id"].notna().all()
+    assert agent.data_context.version == 2
+    _assert_rebuilt(agent.data_context, data_dir)
+
+
+def test_edited_rows_rebuild_the_tables(tmp_path: Path) -> None:
+    """A changed earlier row falls back to rebuilding every frame."""
+    copy_data(tmp_path)
+    refresher = DataRefresher(
+        tmp_path, load_data(tmp_path, use_snapshot=False), use_snapshot=False
+    )
+    workbook_path = tmp_path / "Invoices.xlsx"
+    append_rows(workbook_path, [_invoice("I1041", "C001")])
+    workbook = load_workbook(workbook_path)
+    workbook.worksheets[0]["E2"] = "Disputed"
+    workbook.save(workbook_path)
+
+    context = refresher.refresh()
+
+    assert context is not None
+    assert "Disputed" in context.invoices["status"].tolist()
+    _assert_rebuilt(context, tmp_path)
@@ -0,0 +1,131 @@
+"""Tests for the sandbox pool and the data-only result transfer."""
+
+import datetime
+from collections.abc import Iterator
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.tools.code_executor import ExecutionResult
+from src.tools.result_transfer import TransferError, dump_result, load_result
+from src.tools.sandbox import SandboxLimits, SandboxPool
+
+
+def _round_trip(value: object) -> object:
+    result = ExecutionResult(success=True, result=value, result_type="x")
+    return load_result(dump_result(result)).result
+
+
+def test_frame_round_trip() -> None:
+    """Frames keep their index, dtypes and (duplicate, non-string) labels."""
+    frame = pd.DataFrame(
+        [[1, 2.5, "a", pd.Timestamp("2024-01-31")]],
+        columns=["n", 2, "n", "when"],
+        index=pd.Index([7], name="id"),
+    )
+
+    decoded = _round_trip(frame)
+
+    assert isinstance(decoded, pd.DataFrame)
+    pd.testing.assert_frame_equal(decoded, frame, check_column_type=False)
+    assert list(decoded.columns) == ["n", 2, "n", "when"]
+
+
+def test_mixed_object_column_is_sent_as_text() -> None:
+    """Object columns Arrow cannot type travel as text, keeping missing values."""
+    frame = pd.DataFrame({"v": [1, "a", None]})
+
+    decoded = _round_trip(frame)
+
+    assert isinstance(decoded, pd.DataFrame)
+    assert decoded["v"].tolist()[:2] == ["1", "a"]
+    assert pd.isna(decoded["v"].iloc[2])
+
+
+def test_series_and_scalars_round_trip() -> None:
+    """Series, NumPy values and containers come back with their types."""
+    series = pd.Series([1.0, 2.0], index=["a", "b"], name=("total", 2024))
+    value: dict[Any, Any] = {
+        "series": series,
+        ("k", 1): np.int64(3),
+        "when": pd.Timestamp("2024-12-01"),
+        "day": datetime.date(2024, 12, 1),
+        "span": pd.Timedelta(days=2),
+        "missing": pd.NaT,
+        "items": [1, (2, 3), {4}],
+        "array": np.arange(3),
+    }
+
+    decoded = _round_trip(value)
+
+    assert isinstance(decoded, dict)
+    pd.testing.assert_series_equal(decoded["series"], series)
+    assert decoded[("k", 1)] == 3
+    assert isinstance(decoded[("k", 1)], np.int64)
+    assert decoded["when"] == value["when"]
+    assert decoded["day"] == value["day"]
+    assert decoded["span"] == value["span"]
+    assert decoded["missing"] is pd.NaT
+    assert decoded["items"] == [1, (2, 3), {4}]
+    np.testing.assert_array_equal(decoded["array"], np.arange(3))
+
+
+def test_arbitrary_objects_are_refused() -> None:
+    """Objects with custom reconstruction hooks are never serialized."""
+    called = []
+
+    class Payload:
+        def __reduce__(self) -> tuple[Any, ...]:
+            called.append(True)
+            return (print, ("unreachable",))
+
+    with pytest.raises(TransferError):
+        dump_result(ExecutionResult(success=True, result=[Payload()]))
+    assert not called
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [b"", b"\x00\x00\x00\x05{}", b"\x00\x00\x00\x02[]", b"\x00\x00\xff\xff{"],
+)
+def test_malformed_payload_is_rejected(payload: bytes) -> None:
+    """Truncated or foreign payloads raise TransferError."""
+    with pytest.raises(TransferError):
+        load_result(payload)
+
+
+@pytest.fixture(scope="module")
+def pool() -> Iterator[SandboxPool]:
+    """A one-worker pool over a small table."""
+    frame = pd.DataFrame({"client": ["a", "b", "a"], "amount": [1.0, 2.0, 3.0]})
+    sandbox = SandboxPool({"invoices": frame}, workers=1, limits=SandboxLimits())
+    yield sandbox
+    sandbox.close()
+
+
+def test_pool_returns_frames(pool: SandboxPool) -> None:
+    """A frame computed in a worker arrives intact."""
+    result = pool.run("result = invoices.groupby('client')['amount'].sum()")
+
+    assert result.success, result.error
+    expected = pd.Series([4.0, 2.0], index=pd.Index(["a", "b"], name="client"))
+    pd.testing.assert_series_equal(result.result, expected.rename("amount"))
+
+
+def test_pool_refuses_objects_built_by_the_code(pool: SandboxPool) -> None:
+    """A class made by generated code cannot smuggle a callable to the parent."""
+    code = (
+        "evil = str.__class__('Evil', (), "
+        "{'__reduce__': lambda self: (print, ('owned',))})\n"
+        "result = evil()"
+    )
+
+    result = pool.run(code)
+
+    assert not result.success
+    assert result.error is not None
+    assert "could not be transferred" in result.error
+    # The worker stays usable after the refusal
+    assert pool.run("result = len(invoices)").result == 3
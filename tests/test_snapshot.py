@@ -0,0 +1,100 @@
+"""Tests for the Parquet snapshot cache."""
+
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.dataloaders.snapshot import (
+    SNAPSHOT_TABLES,
+    SOURCE_FILES,
+    SnapshotCache,
+    fingerprint_file,
+)
+
+
+@pytest.fixture
+def data_dir(tmp_path: Path) -> Path:
+    """A data directory with placeholder source files."""
+    for name in SOURCE_FILES:
+        (tmp_path / name).write_bytes(name.encode())
+    return tmp_path
+
+
+def _tables(value: int) -> dict[str, pd.DataFrame]:
+    return {table: pd.DataFrame({"x": [value, value]}) for table in SNAPSHOT_TABLES}
+
+
+def _save(cache: SnapshotCache, data_dir: Path, value: int) -> None:
+    sources = {name: fingerprint_file(data_dir / name) for name in SOURCE_FILES}
+    cache.save(sources, _tables(value))
+
+
+def test_round_trip(data_dir: Path) -> None:
+    """A saved snapshot loads back while the sources are unchanged."""
+    cache = SnapshotCache(data_dir / ".snapshot")
+    _save(cache, data_dir, 1)
+
+    tables = cache.load(data_dir)
+
+    assert tables is not None
+    pd.testing.assert_frame_equal(tables["merged"], _tables(1)["merged"])
+
+
+def test_changed_source_is_stale(data_dir: Path) -> None:
+    """Editing a source file invalidates the snapshot."""
+    cache = SnapshotCache(data_dir / ".snapshot")
+    _save(cache, data_dir, 1)
+
+    (data_dir / SOURCE_FILES[0]).write_bytes(b"edited contents")
+
+    assert cache.load(data_dir) is None
+
+
+def test_touched_source_is_revalidated(data_dir: Path) -> None:
+    """A new mtime with the same contents keeps the snapshot valid."""
+    cache = SnapshotCache(data_dir / ".snapshot")
+    _save(cache, data_dir, 1)
+    source = data_dir / SOURCE_FILES[0]
+    source.write_bytes(source.read_bytes())
+
+    assert cache.load(data_dir) is not None
+    manifest = json.loads(cache.manifest_path.read_text(encoding="utf-8"))
+    assert manifest["sources"][SOURCE_FILES[0]]["mtime_ns"] == (
+        source.stat().st_mtime_ns
+    )
+    assert cache.load(data_dir) is not None
+
+
+@pytest.mark.parametrize(
+    "sources",
+    [
+        None,
+        [],
+        {name: {"size": 1} for name in SOURCE_FILES},
+        {name: {"size": "x", "mtime_ns": 0, "sha256": ""} for name in SOURCE_FILES},
+        {name: {"size": 1, "mtime_ns": 0, "sha": ""} for name in SOURCE_FILES},
+    ],
+)
+def test_malformed_manifest_is_stale(data_dir: Path, sources: object) -> None:
+    """A manifest in an unexpected shape is treated as a stale snapshot."""
+    cache = SnapshotCache(data_dir / ".snapshot")
+    _save(cache, data_dir, 1)
+    manifest = json.loads(cache.manifest_path.read_text(encoding="utf-8"))
+    manifest["sources"] = sources
+    cache.manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+
+    assert cache.load(data_dir) is None
+
+
+def test_tables_from_another_save_are_rejected(data_dir: Path) -> None:
+    """A table replaced after the manifest was written is never mixed in."""
+    cache = SnapshotCache(data_dir / ".snapshot")
+    _save(cache, data_dir, 1)
+    manifest = cache.manifest_path.read_text(encoding="utf-8")
+    # Another process saves, but its manifest is not written yet
+    _save(cache, data_dir, 2)
+    cache.manifest_path.write_text(manifest, encoding="utf-8")
+
+    assert cache.load(data_dir) is None
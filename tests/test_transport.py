@@ -0,0 +1,87 @@
+"""Tests for the transport's concurrency slots."""
+
+import asyncio
+from collections.abc import Generator, Iterator
+
+import pytest
+
+from src.llm.transport import AdaptiveLimiter, CallStats, Transport
+
+
+@pytest.fixture
+def transport() -> Transport:
+    """A transport allowing one request in flight."""
+    return Transport(api_key="test", max_concurrency=1)
+
+
+def _fail() -> None:
+    msg = "not an API error"
+    raise RuntimeError(msg)
+
+
+def test_call_releases_slot_on_unexpected_error(transport: Transport) -> None:
+    """Errors the transport does not retry still free the slot."""
+    with pytest.raises(RuntimeError):
+        transport.call(_fail, tokens=1, stats=CallStats())
+
+    assert transport.limiter.in_flight == 0
+    assert transport.call(lambda: "ok", tokens=1, stats=CallStats()) == "ok"
+
+
+def test_cancelled_call_releases_slot(transport: Transport) -> None:
+    """Cancelling the calling task frees the slot."""
+
+    async def scenario() -> None:
+        started = asyncio.Event()
+
+        async def hang() -> None:
+            started.set()
+            await asyncio.Event().wait()
+
+        task = asyncio.create_task(transport.call_async(hang, 1, CallStats()))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        async def answer() -> str:
+            return "ok"
+
+        reply = await asyncio.wait_for(transport.call_async(answer, 1, CallStats()), 1)
+        assert reply == "ok"
+
+    asyncio.run(scenario())
+    assert transport.limiter.in_flight == 0
+
+
+def test_stream_releases_slot(transport: Transport) -> None:
+    """A stream frees its slot when opening fails or the consumer stops early."""
+
+    def fail_to_open() -> Iterator[int]:
+        msg = "not an API error"
+        raise RuntimeError(msg)
+
+    with pytest.raises(RuntimeError):
+        list(transport.stream(fail_to_open, 1, CallStats()))
+    assert transport.limiter.in_flight == 0
+
+    chunks = transport.stream(lambda: iter(range(3)), 1, CallStats())
+    assert isinstance(chunks, Generator)
+    assert next(chunks) == 0
+    assert transport.limiter.in_flight == 1
+    chunks.close()
+    assert transport.limiter.in_flight == 0
+
+
+def test_limiter_halves_on_throttling() -> None:
+    """A throttled release halves the limit; successes grow it back."""
+    limiter = AdaptiveLimiter(max_limit=8)
+
+    limiter.acquire()
+    limiter.release(throttled=True)
+
+    assert limiter.limit == 4
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 5
@@ -0,0 +1,28 @@
+"""Copies of the sample workbooks for tests that edit them."""
+
+import shutil
+from collections.abc import Sequence
+from pathlib import Path
+
+from openpyxl import load_workbook
+
+from src.dataloaders.snapshot import SOURCE_FILES
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+
+def copy_data(target: Path) -> Path:
+    """Copy the sample workbooks (without their snapshot) into ``target``."""
+    target.mkdir(parents=True, exist_ok=True)
+    for name in SOURCE_FILES:
+        shutil.copy(DATA_DIR / name, target / name)
+    return target
+
+
+def append_rows(path: Path, rows: Sequence[Sequence[object]]) -> None:
+    """Append rows to the first worksheet of a workbook."""
+    workbook = load_workbook(path)
+    sheet = workbook.worksheets[0]
+    for row in rows:
+        sheet.append(list(row))
+    workbook.save(path)